@@ -1,132 +1,172 @@
-def _select_lesson(f, pnl, prob):
-    """Pick an educational lesson based on the dominant feature conditions + outcome."""
-    won = pnl > 0
-    rsi = f.get("rsi", 50)
-    vol = f.get("volatility_20d", 0)
-    stress = f.get("regime_stress", 0)
-    r5 = f.get("return_5d", 0)
-    r20 = f.get("return_20d", 0)
-    ma = f.get("ma_ratio", 1.0)
+import numpy as np
 
-    # Weak signal near threshold
-    if prob < 0.55:
-        if won:
-            return (
-                "This was a marginal signal — the model's probability was barely above the entry threshold. "
-                "Even weak signals can produce winners, but over many trades their expected value is lower. "
-                "High-conviction entries (probability well above threshold) tend to have better risk-adjusted returns."
-            )
-        else:
-            return (
-                "The model's probability was close to the entry threshold, meaning conviction was low. "
-                "Low-conviction entries are statistically more likely to underperform. "
-                "This is why the threshold exists — it filters out noise, but marginal signals still slip through."
-            )
 
+# Lesson texts per entry condition, for winning and losing trades. Conditions
+# are checked in _lesson_category's order; the first match wins.
+LESSONS = {
+    # Weak signal near threshold
+    "weak_signal": {
+        "won": (
+            "This was a marginal signal — the model's probability was barely above the entry threshold. "
+            "Even weak signals can produce winners, but over many trades their expected value is lower. "
+            "High-conviction entries (probability well above threshold) tend to have better risk-adjusted returns."
+        ),
+        "lost": (
+            "The model's probability was close to the entry threshold, meaning conviction was low. "
+            "Low-conviction entries are statistically more likely to underperform. "
+            "This is why the threshold exists — it filters out noise, but marginal signals still slip through."
+        ),
+    },
     # Overbought RSI
-    if rsi > 70:
-        if won:
-            return (
-                "RSI was in overbought territory, yet the trade was profitable. "
-                "This shows that momentum can persist longer than expected — 'overbought' doesn't mean 'sell immediately.' "
-                "Strong trends often stay overbought for extended periods before reversing."
-            )
-        else:
-            return (
-                "RSI was elevated into overbought territory, and the trade lost money. "
-                "When RSI is high, the risk of mean reversion increases — prices that have risen sharply "
-                "are more likely to pull back. This is a classic example of why overbought signals are warnings, not guarantees."
-            )
-
+    "overbought": {
+        "won": (
+            "RSI was in overbought territory, yet the trade was profitable. "
+            "This shows that momentum can persist longer than expected — 'overbought' doesn't mean 'sell immediately.' "
+            "Strong trends often stay overbought for extended periods before reversing."
+        ),
+        "lost": (
+            "RSI was elevated into overbought territory, and the trade lost money. "
+            "When RSI is high, the risk of mean reversion increases — prices that have risen sharply "
+            "are more likely to pull back. This is a classic example of why overbought signals are warnings, not guarantees."
+        ),
+    },
     # Oversold RSI
-    if rsi < 30:
-        if won:
-            return (
-                "RSI was in oversold territory, and the subsequent bounce made this trade profitable. "
-                "Oversold conditions can present opportunities when they coincide with a bullish model signal, "
-                "as the market may be due for a recovery."
-            )
-        else:
-            return (
-                "Despite oversold RSI conditions, the trade lost money. "
-                "Oversold markets can continue falling — this is called 'catching a falling knife.' "
-                "Oversold is a necessary but not sufficient condition for a reversal."
-            )
-
+    "oversold": {
+        "won": (
+            "RSI was in oversold territory, and the subsequent bounce made this trade profitable. "
+            "Oversold conditions can present opportunities when they coincide with a bullish model signal, "
+            "as the market may be due for a recovery."
+        ),
+        "lost": (
+            "Despite oversold RSI conditions, the trade lost money. "
+            "Oversold markets can continue falling — this is called 'catching a falling knife.' "
+            "Oversold is a necessary but not sufficient condition for a reversal."
+        ),
+    },
     # High volatility
-    if vol > 0.04 or stress == 1:
-        if won:
-            return (
-                "This trade was profitable despite elevated volatility. "
-                "High-volatility environments can produce outsized gains when the direction is correct, "
-                "but the risk of adverse moves is also much greater. "
-                "The model accepted this risk and it paid off — but this outcome is less reliable than in calm markets."
-            )
-        else:
-            return (
-                "Elevated volatility created an unfavorable environment for this trade. "
-                "When volatility is high, even correct directional calls can get stopped out by large intraday swings. "
-                "This is why the Conservative strategy uses a volatility filter — it avoids these noisy conditions entirely."
-            )
-
+    "high_volatility": {
+        "won": (
+            "This trade was profitable despite elevated volatility. "
+            "High-volatility environments can produce outsized gains when the direction is correct, "
+            "but the risk of adverse moves is also much greater. "
+            "The model accepted this risk and it paid off — but this outcome is less reliable than in calm markets."
+        ),
+        "lost": (
+            "Elevated volatility created an unfavorable environment for this trade. "
+            "When volatility is high, even correct directional calls can get stopped out by large intraday swings. "
+            "This is why the Conservative strategy uses a volatility filter — it avoids these noisy conditions entirely."
+        ),
+    },
     # Strong dual momentum
-    if r5 > 0 and r20 > 0 and ma > 1.0:
-        if won:
-            return (
-                "Multiple momentum signals aligned: both short-term and medium-term returns were positive, "
-                "and price was above its moving average. When all signals agree, the probability of a successful "
-                "trend-following trade increases. This kind of alignment is what the model looks for."
-            )
-        else:
-            return (
-                "Despite positive momentum across multiple timeframes and price above the moving average, "
-                "the trade lost money. This shows that even when conditions look ideal, markets can reverse unexpectedly. "
-                "No combination of features guarantees a profit — trading is fundamentally probabilistic."
-            )
-
+    "aligned_momentum": {
+        "won": (
+            "Multiple momentum signals aligned: both short-term and medium-term returns were positive, "
+            "and price was above its moving average. When all signals agree, the probability of a successful "
+            "trend-following trade increases. This kind of alignment is what the model looks for."
+        ),
+        "lost": (
+            "Despite positive momentum across multiple timeframes and price above the moving average, "
+            "the trade lost money. This shows that even when conditions look ideal, markets can reverse unexpectedly. "
+            "No combination of features guarantees a profit — trading is fundamentally probabilistic."
+        ),
+    },
     # Negative momentum entry
-    if r5 < 0:
-        if won:
-            return (
-                "The model entered despite negative short-term momentum, and the trade worked out. "
-                "Sometimes the model sees a bullish setup in the broader indicators (20-day trend, MA ratio) "
-                "even when recent days have been weak. Contrarian entries can be rewarding when the bigger trend is intact."
-            )
-        else:
-            return (
-                "Negative short-term momentum was a warning sign that the model overlooked. "
-                "When recent price action is declining, it often takes time for the trend to stabilize. "
-                "Entering during a pullback within a larger trend carries additional risk of the pullback deepening."
-            )
-
+    "negative_momentum": {
+        "won": (
+            "The model entered despite negative short-term momentum, and the trade worked out. "
+            "Sometimes the model sees a bullish setup in the broader indicators (20-day trend, MA ratio) "
+            "even when recent days have been weak. Contrarian entries can be rewarding when the bigger trend is intact."
+        ),
+        "lost": (
+            "Negative short-term momentum was a warning sign that the model overlooked. "
+            "When recent price action is declining, it often takes time for the trend to stabilize. "
+            "Entering during a pullback within a larger trend carries additional risk of the pullback deepening."
+        ),
+    },
     # Price below moving average
-    if ma < 1.0:
-        if won:
-            return (
-                "Price was below the 20-day moving average at entry, which typically signals a weakening trend. "
-                "The model still found a bullish signal, and the trade was profitable — showing that "
-                "mean reversion back above the moving average can happen quickly."
-            )
-        else:
-            return (
-                "Price was below its 20-day moving average, indicating a deteriorating trend. "
-                "Buying below the moving average often means fighting the prevailing direction. "
-                "The best trend-following trades typically enter when price is comfortably above the moving average."
-            )
-
+    "below_ma": {
+        "won": (
+            "Price was below the 20-day moving average at entry, which typically signals a weakening trend. "
+            "The model still found a bullish signal, and the trade was profitable — showing that "
+            "mean reversion back above the moving average can happen quickly."
+        ),
+        "lost": (
+            "Price was below its 20-day moving average, indicating a deteriorating trend. "
+            "Buying below the moving average often means fighting the prevailing direction. "
+            "The best trend-following trades typically enter when price is comfortably above the moving average."
+        ),
+    },
     # Default fallback
-    if won:
-        return (
+    "default": {
+        "won": (
             "The market conditions were moderately favorable, and the trade ended profitably. "
             "This is the kind of trade that validates the model's approach — "
             "steady conditions with moderate conviction tend to produce consistent, if unspectacular, results."
-        )
-    else:
-        return (
+        ),
+        "lost": (
             "Market conditions appeared reasonable, but the trade still lost money. "
             "This is a reminder that trading signals are probabilistic, not guarantees. "
             "Even a well-calibrated model with a 60% win rate will lose 4 out of every 10 trades."
-        )
+        ),
+    },
+}
+
+
+def _lesson_category(f, prob):
+    """Key into LESSONS for the dominant feature condition at entry."""
+    rsi = f.get("rsi", 50)
+    vol = f.get("volatility_20d", 0)
+    stress = f.get("regime_stress", 0)
+    r5 = f.get("return_5d", 0)
+    r20 = f.get("return_20d", 0)
+    ma = f.get("ma_ratio", 1.0)
+
+    if prob < 0.55:
+        return "weak_signal"
+    if rsi > 70:
+        return "overbought"
+    if rsi < 30:
+        return "oversold"
+    if vol > 0.04 or stress == 1:
+        return "high_volatility"
+    if r5 > 0 and r20 > 0 and ma > 1.0:
+        return "aligned_momentum"
+    if r5 < 0:
+        return "negative_momentum"
+    if ma < 1.0:
+        return "below_ma"
+    return "default"
+
+
+def _select_lesson(f, pnl, prob):
+    """Pick an educational lesson based on the dominant feature conditions + outcome."""
+    lesson = LESSONS[_lesson_category(f, prob)]
+    return lesson["won"] if pnl > 0 else lesson["lost"]
+
+
+def _render_explanation(ma_pos, ma_ratio, rsi, rsi_zone, return_5d, return_20d, volatility_20d,
+                        stress_flag, trend_slope, prob, strength, relative, relative_strength,
+                        entry_price, exit_price, result_word, pnl, lesson):
+    """Explanation text from precomputed fields (shared by explain_trade and the batch path)."""
+    return (
+        f"MARKET CONTEXT: "
+        f"Price was {ma_pos} the 20-day moving average (MA ratio: {ma_ratio:.3f}). "
+        f"RSI was at {rsi:.1f} ({rsi_zone} zone). "
+        f"5-day return was {return_5d * 100:+.2f}% and 20-day return was {return_20d * 100:+.2f}%. "
+        f"20-day volatility was {volatility_20d:.4f} "
+        f"(stress detector: {stress_flag}). "
+        f"Trend acceleration: {trend_slope * 100:+.3f}%."
+        f"\n\n"
+        f"MODEL SIGNAL: "
+        f"The model assigned a {prob * 100:.1f}% bullish probability ({strength} signal). "
+        f"The stock was {relative} SPY over 20 days (relative strength: {relative_strength * 100:+.2f}%)."
+        f"\n\n"
+        f"OUTCOME: "
+        f"Entered at ${entry_price:.2f}, exited at ${exit_price:.2f}. "
+        f"The trade closed {result_word} with a return of {pnl * 100:+.2f}%."
+        f"\n\n"
+        f"LESSON: {lesson}"
+    )
 
 
 def explain_trade(trade):
@@ -134,61 +174,165 @@ def explain_trade(trade):
     f = trade["features"]
     pnl = trade["pnl"]
     prob = trade["bullish_prob"]
-    entry_price = trade["entry_price"]
-    exit_price = trade["exit_price"]
-
-    sections = []
 
-    # --- SECTION 1: Market Context ---
-    ma_pos = "above" if f["ma_ratio"] > 1.0 else "below"
     rsi_val = f["rsi"]
     rsi_zone = "overbought" if rsi_val > 70 else "oversold" if rsi_val < 30 else "neutral"
-    stress_flag = "active" if f.get("regime_stress", 0) == 1 else "inactive"
 
-    context = (
-        f"MARKET CONTEXT: "
-        f"Price was {ma_pos} the 20-day moving average (MA ratio: {f['ma_ratio']:.3f}). "
-        f"RSI was at {rsi_val:.1f} ({rsi_zone} zone). "
-        f"5-day return was {f['return_5d'] * 100:+.2f}% and 20-day return was {f['return_20d'] * 100:+.2f}%. "
-        f"20-day volatility was {f['volatility_20d']:.4f} "
-        f"(stress detector: {stress_flag}). "
-        f"Trend acceleration: {f.get('trend_slope_20d', 0) * 100:+.3f}%."
-    )
-    sections.append(context)
-
-    # --- SECTION 2: Model Signal ---
     if prob >= 0.65:
         strength = "strong"
     elif prob >= 0.55:
         strength = "moderate"
     else:
         strength = "weak"
-
-    signal = (
-        f"MODEL SIGNAL: "
-        f"The model assigned a {prob * 100:.1f}% bullish probability ({strength} signal). "
+    relative_strength = f.get("relative_strength_spy", 0)
+
+    return _render_explanation(
+        ma_pos="above" if f["ma_ratio"] > 1.0 else "below",
+        ma_ratio=f["ma_ratio"],
+        rsi=rsi_val,
+        rsi_zone=rsi_zone,
+        return_5d=f["return_5d"],
+        return_20d=f["return_20d"],
+        volatility_20d=f["volatility_20d"],
+        stress_flag="active" if f.get("regime_stress", 0) == 1 else "inactive",
+        trend_slope=f.get("trend_slope_20d", 0),
+        prob=prob,
+        strength=strength,
+        relative="outperforming" if relative_strength > 0 else "underperforming",
+        relative_strength=relative_strength,
+        entry_price=trade["entry_price"],
+        exit_price=trade["exit_price"],
+        result_word="profitably" if pnl > 0 else "at a loss",
+        pnl=pnl,
+        lesson=_select_lesson(f, pnl, prob),
     )
-    if f.get("relative_strength_spy", 0) > 0:
-        signal += f"The stock was outperforming SPY over 20 days (relative strength: {f['relative_strength_spy'] * 100:+.2f}%)."
-    else:
-        signal += f"The stock was underperforming SPY over 20 days (relative strength: {f.get('relative_strength_spy', 0) * 100:+.2f}%)."
-    sections.append(signal)
 
-    # --- SECTION 3: Outcome ---
-    pnl_pct = pnl * 100
-    result_word = "profitably" if pnl > 0 else "at a loss"
-    outcome = (
-        f"OUTCOME: "
-        f"Entered at ${entry_price:.2f}, exited at ${exit_price:.2f}. "
-        f"The trade closed {result_word} with a return of {pnl_pct:+.2f}%."
+
+# Defaults for missing features, as used by _lesson_category / explain_trade
+FEATURE_DEFAULTS = {
+    "rsi": 50,
+    "volatility_20d": 0,
+    "regime_stress": 0,
+    "return_5d": 0,
+    "return_20d": 0,
+    "ma_ratio": 1.0,
+    "trend_slope_20d": 0,
+    "relative_strength_spy": 0,
+}
+
+
+def _feature_arrays(trades):
+    """{feature: float array} over trades, missing values filled from FEATURE_DEFAULTS."""
+    return {
+        name: np.array([t["features"].get(name, default) for t in trades], dtype=float)
+        for name, default in FEATURE_DEFAULTS.items()
+    }
+
+
+def _categories_from_arrays(f, prob):
+    """Vectorized _lesson_category: (category, mask) pairs in its priority order."""
+    rules = [
+        ("weak_signal", prob < 0.55),
+        ("overbought", f["rsi"] > 70),
+        ("oversold", f["rsi"] < 30),
+        ("high_volatility", (f["volatility_20d"] > 0.04) | (f["regime_stress"] == 1)),
+        ("aligned_momentum", (f["return_5d"] > 0) & (f["return_20d"] > 0) & (f["ma_ratio"] > 1.0)),
+        ("negative_momentum", f["return_5d"] < 0),
+        ("below_ma", f["ma_ratio"] < 1.0),
+    ]
+    return np.select(
+        [mask for _, mask in rules], [name for name, _ in rules], default="default"
     )
-    sections.append(outcome)
 
-    # --- SECTION 4: Lesson ---
-    lesson = _select_lesson(f, pnl, prob)
-    sections.append(f"LESSON: {lesson}")
 
-    return "\n\n".join(sections)
+def classify_lessons(trades):
+    """
+    Lesson category (key of LESSONS) for every trade at once, using the
+    same priority order as _lesson_category.
+    """
+    if not trades:
+        return np.array([], dtype=object)
+    prob = np.array([t["bullish_prob"] for t in trades], dtype=float)
+    return _categories_from_arrays(_feature_arrays(trades), prob).astype(object)
+
+
+def explain_trades_batch(trades):
+    """
+    Explanations for many trades, identical to calling explain_trade on
+    each. Lesson categories and every wording choice are computed with
+    array masks over the whole run; only the final text rendering runs
+    per trade.
+
+    Returns:
+        (explanations list, categories array)
+    """
+    if not trades:
+        return [], np.array([], dtype=object)
+
+    f = _feature_arrays(trades)
+    prob = np.array([t["bullish_prob"] for t in trades], dtype=float)
+    pnl = np.array([t["pnl"] for t in trades], dtype=float)
+    categories = _categories_from_arrays(f, prob).astype(object)
+    won = pnl > 0
+
+    lesson_won = {name: texts["won"] for name, texts in LESSONS.items()}
+    lesson_lost = {name: texts["lost"] for name, texts in LESSONS.items()}
+    lessons = [
+        (lesson_won if w else lesson_lost)[c]
+        for w, c in zip(won.tolist(), categories.tolist())
+    ]
+
+    # Positional columns, in _render_explanation's argument order
+    columns = [
+        np.where(f["ma_ratio"] > 1.0, "above", "below"),
+        f["ma_ratio"],
+        f["rsi"],
+        np.select([f["rsi"] > 70, f["rsi"] < 30], ["overbought", "oversold"], "neutral"),
+        f["return_5d"],
+        f["return_20d"],
+        f["volatility_20d"],
+        np.where(f["regime_stress"] == 1, "active", "inactive"),
+        f["trend_slope_20d"],
+        prob,
+        np.select([prob >= 0.65, prob >= 0.55], ["strong", "moderate"], "weak"),
+        np.where(f["relative_strength_spy"] > 0, "outperforming", "underperforming"),
+        f["relative_strength_spy"],
+        np.array([t["entry_price"] for t in trades], dtype=float),
+        np.array([t["exit_price"] for t in trades], dtype=float),
+        np.where(won, "profitably", "at a loss"),
+        pnl,
+    ]
+    rows = zip(*(column.tolist() for column in columns), lessons)
+    explanations = [_render_explanation(*row) for row in rows]
+    return explanations, categories
+
+
+def lesson_stats(categories, pnl):
+    """
+    Aggregate count and win rate per lesson category.
+
+    Args:
+        categories: Lesson category per trade (from classify_lessons)
+        pnl: Trade returns, same order
+    """
+    categories = np.asarray(categories, dtype=object)
+    won = np.asarray(pnl, dtype=float) > 0
+
+    stats = []
+    for name in LESSONS:
+        mask = categories == name
+        count = int(mask.sum())
+        if count == 0:
+            continue
+        wins = int(won[mask].sum())
+        stats.append({
+            "category": name,
+            "count": count,
+            "wins": wins,
+            "win_rate": wins / count,
+            "avg_pnl": float(np.asarray(pnl, dtype=float)[mask].mean()),
+        })
+    return stats
 
 
 def explain_trade_comparison(win_trade, lose_trade):
@@ -229,10 +373,36 @@ def explain_trade_comparison(win_trade, lose_trade):
 
 
 def explain_max_drawdown(peak_date, trough_date, drawdown_value, trades):
+    return _explain_drawdown("maximum drawdown", peak_date, trough_date, drawdown_value, trades)
+
+
+def explain_drawdown_period(period, trades, rank=1):
+    """
+    Explanation for one episode from find_drawdown_periods.
+
+    Args:
+        period: Episode dict (peak/trough/recovery dates, depth, bar counts)
+        trades: Trades entered between the episode's peak and trough
+        rank: Position of the episode when sorted by depth (1 = deepest)
+    """
+    label = "maximum drawdown" if rank == 1 else f"drawdown ranked #{rank} by depth"
+    explanation = _explain_drawdown(label, period["peak_date"], period["trough_date"], period["depth"], trades)
+
+    if period["recovery_date"] is not None:
+        recovery = (
+            f"The portfolio regained its previous peak on {period['recovery_date'].date()}, "
+            f"{(period['recovery_date'] - period['peak_date']).days} days after the peak."
+        )
+    else:
+        recovery = "The portfolio had not yet regained its previous peak by the end of the backtest."
+    return f"{explanation} {recovery}"
+
+
+def _explain_drawdown(label, peak_date, trough_date, drawdown_value, trades):
     explanation = []
 
     explanation.append(
-        f"The maximum drawdown occurred between {peak_date.date()} and {trough_date.date()}."
+        f"The {label} occurred between {peak_date.date()} and {trough_date.date()}."
     )
 
     explanation.append(
@@ -1,8 +1,10 @@
+from bisect import bisect_left, bisect_right
+
 import pandas as pd
 import numpy as np
 
-from train_trend_model import train_trend_model, FEATURE_COLUMNS
-from dataset_builder import build_dataset
+from train_trend_model import train_trend_model, FEATURE_COLUMNS, TEST_START
+from dataset_builder import build_dataset, INTEGER_FEATURES
 
 INITIAL_CAPITAL = 10_000
 
@@ -25,76 +27,100 @@ NORMAL_POSITION_SIZE = 1.0
 COOLDOWN_POSITION_SIZE = 0.3
 
 
-def backtest_strategy(strategy_type="conservative", symbol="SPY"):
-    """
-    Run backtest with conservative, aggressive, or ultra strategy.
-    
-    Args:
-        strategy_type: "conservative", "aggressive", or "ultra"
-        symbol: Stock ticker (default: SPY)
-    """
-    # Set parameters based on strategy type
+def get_strategy_params(strategy_type="conservative"):
+    """Return threshold / hold / volatility / cooldown settings for a strategy."""
     if strategy_type == "ultra":
-        threshold = ULTRA_THRESHOLD
-        hold_days = ULTRA_HOLD_DAYS
-        volatility_limit = ULTRA_VOLATILITY_LIMIT
-        disable_cooldown = True
+        return {
+            "threshold": ULTRA_THRESHOLD,
+            "hold_days": ULTRA_HOLD_DAYS,
+            "volatility_limit": ULTRA_VOLATILITY_LIMIT,
+            "disable_cooldown": True,
+        }
     elif strategy_type == "aggressive":
-        threshold = AGGRESSIVE_THRESHOLD
-        hold_days = AGGRESSIVE_HOLD_DAYS
-        volatility_limit = AGGRESSIVE_VOLATILITY_LIMIT
-        disable_cooldown = False
+        return {
+            "threshold": AGGRESSIVE_THRESHOLD,
+            "hold_days": AGGRESSIVE_HOLD_DAYS,
+            "volatility_limit": AGGRESSIVE_VOLATILITY_LIMIT,
+            "disable_cooldown": False,
+        }
     else:  # conservative (default)
-        threshold = CONSERVATIVE_THRESHOLD
-        hold_days = CONSERVATIVE_HOLD_DAYS
-        volatility_limit = CONSERVATIVE_VOLATILITY_LIMIT
-        disable_cooldown = False
-    
-    # Debug print to verify parameters
-    print(f"\n=== RUNNING {strategy_type.upper()} STRATEGY ON {symbol} ===")
-    print(f"Threshold: {threshold}")
-    print(f"Hold Days: {hold_days}")
-    print(f"Volatility Limit: {volatility_limit}")
-    print(f"Cooldown Disabled: {disable_cooldown}\n")
-    
-    df = build_dataset(symbol)
-    trades = []
-    # Train model (trained only on past) — pass df to avoid re-downloading
-    model = train_trend_model(symbol, df=df)
+        return {
+            "threshold": CONSERVATIVE_THRESHOLD,
+            "hold_days": CONSERVATIVE_HOLD_DAYS,
+            "volatility_limit": CONSERVATIVE_VOLATILITY_LIMIT,
+            "disable_cooldown": False,
+        }
 
-    # Use test period only
-    test_df = df[df.index >= "2020-01-01"].copy()
 
-    # Predict probabilities
-    test_df["bullish_prob"] = model.predict_proba(
-        test_df[FEATURE_COLUMNS]
-    )[:, 1]
+class TradingStrategy:
+    """
+    Incremental version of the backtest state machine: feed one bar at a
+    time with on_bar(). Keeps position, loss streak and cooldown state and
+    returns the orders generated by each bar, so the same rules drive both
+    the batch backtest and paper trading.
 
-    capital = INITIAL_CAPITAL
-    equity_curve = []
-    position = None
-    loss_streak = 0
-    cooldown_until = None
+    Holding period and cooldown are calendar days by default. Passing
+    hold_bars / cooldown_bars counts them in bars instead (intraday mode).
+    """
 
-    for date, row in test_df.iterrows():
-        price = row["Close"]
+    def __init__(self, strategy_type="conservative", initial_capital=INITIAL_CAPITAL,
+                 hold_bars=None, cooldown_bars=None):
+        params = get_strategy_params(strategy_type)
+        self.strategy_type = strategy_type
+        self.threshold = params["threshold"]
+        self.hold_days = params["hold_days"]
+        self.volatility_limit = params["volatility_limit"]
+        self.disable_cooldown = params["disable_cooldown"]
+        self.hold_bars = hold_bars
+        self.cooldown_bars = cooldown_bars
+
+        self.capital = initial_capital
+        self.position = None
+        self.loss_streak = 0
+        self.cooldown_until = None
+        self.bar_index = -1
+        self.trades = []
+
+    def on_bar(self, date, price, bullish_prob, volatility, features=None):
+        """
+        Process one bar and return a list of orders ({"side", "date", "price", "size"}).
+
+        Args:
+            date: Bar timestamp (pd.Timestamp)
+            price: Close price of the bar
+            bullish_prob: Model probability for this bar
+            volatility: volatility_20d for this bar
+            features: FEATURE_COLUMNS values (array-like) or dict, stored on entry
+        """
+        orders = []
+        self.bar_index += 1
 
         # Exit logic
-        in_cooldown = cooldown_until is not None and date < cooldown_until
+        if self.cooldown_bars is not None:
+            now = self.bar_index
+        else:
+            now = date
+        in_cooldown = self.cooldown_until is not None and now < self.cooldown_until
 
         if in_cooldown:
             position_size = COOLDOWN_POSITION_SIZE
         else:
             position_size = NORMAL_POSITION_SIZE
 
+        position = self.position
         if position:
-            holding_days = (date - position["entry_date"]).days
-
-            if holding_days >= hold_days:
+            if self.hold_bars is not None:
+                holding = self.bar_index - position["entry_bar"]
+                hold_limit = self.hold_bars
+            else:
+                holding = (date - position["entry_date"]).days
+                hold_limit = self.hold_days
+
+            if holding >= hold_limit:
                 exit_price = price
                 pnl = exit_price / position["entry_price"] - 1
 
-                trades.append({
+                self.trades.append({
                     "entry_date": position["entry_date"],
                     "exit_date": date,
                     "entry_price": position["entry_price"],
@@ -103,39 +129,112 @@ def backtest_strategy(strategy_type="conservative", symbol="SPY"):
                     "bullish_prob": position["entry_prob"],
                     "features": position["features"]
                 })
+                orders.append({
+                    "side": "sell",
+                    "date": date,
+                    "price": exit_price,
+                    "size": position["position_size"],
+                })
 
-                capital *= 1 + position["position_size"] * (exit_price / position["entry_price"] - 1)
+                self.capital *= 1 + position["position_size"] * (exit_price / position["entry_price"] - 1)
 
-                position = None
+                self.position = None
 
                 # ----- LOSS STREAK + COOLDOWN LOGIC -----
                 if pnl <= 0:
-                    loss_streak += 1
+                    self.loss_streak += 1
                 else:
-                    loss_streak = 0
+                    self.loss_streak = 0
 
-                if loss_streak >= 3 and not disable_cooldown:
-                    cooldown_until = date + pd.Timedelta(days=30)
-                    loss_streak = 0
+                if self.loss_streak >= 3 and not self.disable_cooldown:
+                    if self.cooldown_bars is not None:
+                        self.cooldown_until = self.bar_index + self.cooldown_bars
+                    else:
+                        self.cooldown_until = date + pd.Timedelta(days=30)
+                    self.loss_streak = 0
 
         # Entry logic
         if (
-            not position
-            and row["bullish_prob"] >= threshold
-            and row["volatility_20d"] < volatility_limit
+            not self.position
+            and bullish_prob >= self.threshold
+            and volatility < self.volatility_limit
         ):
-            position = {
+            if features is None:
+                features = {}
+            elif not isinstance(features, dict):
+                features = dict(zip(FEATURE_COLUMNS, np.asarray(features).tolist()))
+                for name in INTEGER_FEATURES:
+                    features[name] = int(features[name])
+
+            self.position = {
                 "entry_price": price,
                 "entry_date": date,
-                "entry_prob": row["bullish_prob"],
-                "features": row[FEATURE_COLUMNS].to_dict(),
+                "entry_bar": self.bar_index,
+                "entry_prob": bullish_prob,
+                "features": features,
                 "position_size": position_size
             }
+            orders.append({
+                "side": "buy",
+                "date": date,
+                "price": price,
+                "size": position_size,
+            })
+
+        if in_cooldown and self.cooldown_bars is None and date == self.cooldown_until - pd.Timedelta(days=1):
+            print(f"Cooldown ending on {self.cooldown_until.date()}")
+
+        return orders
+
+
+def backtest_strategy(strategy_type="conservative", symbol="SPY"):
+    """
+    Run backtest with conservative, aggressive, or ultra strategy.
+    
+    Args:
+        strategy_type: "conservative", "aggressive", or "ultra"
+        symbol: Stock ticker (default: SPY)
+    """
+    # Set parameters based on strategy type
+    params = get_strategy_params(strategy_type)
+    threshold = params["threshold"]
+    hold_days = params["hold_days"]
+    volatility_limit = params["volatility_limit"]
+    disable_cooldown = params["disable_cooldown"]
+    
+    # Debug print to verify parameters
+    print(f"\n=== RUNNING {strategy_type.upper()} STRATEGY ON {symbol} ===")
+    print(f"Threshold: {threshold}")
+    print(f"Hold Days: {hold_days}")
+    print(f"Volatility Limit: {volatility_limit}")
+    print(f"Cooldown Disabled: {disable_cooldown}\n")
+    
+    df = build_dataset(symbol)
+    # Train model (trained only on past) — pass df to avoid re-downloading
+    model = train_trend_model(symbol, df=df)
+
+    # Use test period only
+    test_df = df[df.index >= TEST_START].copy()
+
+    # Predict probabilities
+    test_df["bullish_prob"] = model.predict_proba(
+        test_df[FEATURE_COLUMNS]
+    )[:, 1]
+
+    strategy = TradingStrategy(strategy_type)
+    equity_curve = []
 
-        if in_cooldown and date == cooldown_until - pd.Timedelta(days=1):
-            print(f"Cooldown ending on {cooldown_until.date()}")
-        
-        equity_curve.append(capital)
+    closes = test_df["Close"].to_numpy()
+    probs = test_df["bullish_prob"].to_numpy()
+    vols = test_df["volatility_20d"].to_numpy()
+    feature_rows = test_df[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+
+    for i, date in enumerate(test_df.index):
+        strategy.on_bar(date, closes[i], probs[i], vols[i], feature_rows[i])
+        equity_curve.append(strategy.capital)
+
+    trades = strategy.trades
+    capital = strategy.capital
 
     test_df["equity"] = equity_curve
     print(f"DEBUG: Number of trades = {len(trades)}")
@@ -185,11 +284,97 @@ def find_max_drawdown_period(equity):
 
     return peak_date, trough_date, drawdown.loc[trough_date]
 
-def trades_during_period(trades, start_date, end_date):
-    return [
-        t for t in trades
-        if start_date <= t["entry_date"] <= end_date
-    ]
+def trades_during_period(trades, start_date, end_date, entry_dates=None):
+    """
+    Trades entered between start_date and end_date (inclusive).
+
+    `trades` must be in entry order (as produced by backtest_strategy and
+    RunStore.get_trades), so the range is found by binary search. Pass
+    precomputed `entry_dates` when querying the same trades repeatedly.
+    """
+    if entry_dates is None:
+        entry_dates = [t["entry_date"] for t in trades]
+    lo, hi = trade_range(entry_dates, start_date, end_date)
+    return trades[lo:hi]
+
+
+def trade_range(entry_dates, start_date, end_date):
+    """(lo, hi) slice bounds of sorted entry_dates falling in [start_date, end_date]."""
+    return bisect_left(entry_dates, start_date), bisect_right(entry_dates, end_date)
+
+
+def find_drawdown_periods(equity, top=None):
+    """
+    Every drawdown episode of an equity curve, found in one vectorized pass.
+
+    An episode is a run of bars below the running peak. Its peak is the bar
+    where that peak value was first reached (as in find_max_drawdown_period),
+    the trough is its lowest drawdown and the recovery is the first bar back
+    at or above the peak (None if the curve ends underwater).
+
+    Args:
+        equity: Equity Series indexed by date
+        top: Keep only the `top` deepest episodes (all when None)
+
+    Returns:
+        List of episode dicts, deepest first
+    """
+    values = equity.to_numpy(dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return []
+
+    running_max = np.maximum.accumulate(values)
+    drawdown = (values - running_max) / running_max
+    underwater = values < running_max
+    if not underwater.any():
+        return []
+
+    # First bar at which each running-max value was reached
+    previous_max = np.concatenate([[-np.inf], running_max[:-1]])
+    new_high = np.where(values > previous_max, np.arange(n), 0)
+    peak_of_bar = np.maximum.accumulate(new_high)
+
+    edges = np.diff(np.concatenate([[False], underwater, [False]]).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)  # one past the last underwater bar
+
+    # Trough: first bar in each episode that hits the episode's minimum
+    depth = np.minimum.reduceat(drawdown, starts)
+    episode_of_bar = np.cumsum(edges[:-1] == 1) - 1
+    at_min = underwater & (drawdown == depth[episode_of_bar])
+    min_positions = np.flatnonzero(at_min)
+    first = np.concatenate([[True], np.diff(episode_of_bar[min_positions]) != 0])
+    troughs = min_positions[first]
+
+    peaks = peak_of_bar[starts]
+    recovered = ends < n
+
+    if top is not None and top < len(depth):
+        if top <= 0:
+            return []
+        # Partial selection keeps top-N at O(n + k log k)
+        chosen = np.argpartition(depth, top - 1)[:top]
+        order = chosen[np.lexsort((chosen, depth[chosen]))]
+    else:
+        order = np.argsort(depth, kind="stable")
+
+    index = equity.index
+    periods = []
+    for i in order.tolist():
+        recovery = int(ends[i]) if recovered[i] else None
+        periods.append({
+            "peak_date": index[peaks[i]],
+            "trough_date": index[troughs[i]],
+            "recovery_date": index[recovery] if recovery is not None else None,
+            "depth": float(depth[i]),
+            "peak_equity": float(values[peaks[i]]),
+            "trough_equity": float(values[troughs[i]]),
+            "bars_to_trough": int(troughs[i] - peaks[i]),
+            "bars_to_recovery": int(recovery - troughs[i]) if recovery is not None else None,
+            "duration_bars": int((recovery if recovery is not None else n - 1) - peaks[i]),
+        })
+    return periods
 
 
 if __name__ == "__main__":
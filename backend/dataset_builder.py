@@ -1,50 +1,119 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import ta
+from numpy.lib.stride_tricks import sliding_window_view
+
+from market_data import get_downloader
 
 
 PREDICTION_HORIZON = 5
 
+# Horizons (trading days) models are trained for; PREDICTION_HORIZON is the default
+HORIZONS = [1, 5, 10, 20]
+
+FEATURE_COLUMNS = [
+    "return_5d",
+    "return_20d",
+    "ma_ratio",
+    "trend_slope_20d",
+    "rsi",
+    "atr",
+    "volatility_20d",
+    "regime_stress",
+    "relative_strength_spy",
+]
+
+# 0/1 flags among FEATURE_COLUMNS; float arrays hold them as 1.0/0.0
+INTEGER_FEATURES = ["regime_stress"]
+
+# Columns kept by the compact representation, in storage order
+COMPACT_COLUMNS = ["Close"] + FEATURE_COLUMNS
 
+VOLATILITY_LABELS = ["low", "medium", "high"]
 
 def load_market_data(symbol="SPY", start="2015-01-01"):
-    df = yf.download(
-        symbol,
-        start=start,
-        auto_adjust=False
-    )
+    """
+    Daily OHLCV for one symbol via the shared downloader (batched, rate
+    limited, retried and briefly cached; see market_data.py).
+    """
+    df = get_downloader().get(symbol, start=start)
 
-    # If columns are multi-index, flatten them
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
+    # Callers add columns in place, so never hand out the cached frame
+    return df.copy()
+
+
+class FeatureNode:
+    """
+    One registered indicator.
+
+    inputs are price columns of the frame (Close, SPY_Close) or other
+    registered features; window is how many earlier bars of its inputs
+    each value looks at (pct_change(5) -> 5, rolling(20) -> 19).
+    """
+
+    __slots__ = ("name", "inputs", "window", "compute")
+
+    def __init__(self, name, inputs, window, compute):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.window = window
+        self.compute = compute
+
+
+FEATURE_REGISTRY = {}
+
+
+def feature(name, inputs, window=0):
+    """Register compute(*input_series) -> Series as feature `name`."""
+    def register(compute):
+        FEATURE_REGISTRY[name] = FeatureNode(name, inputs, window, compute)
+        return compute
+    return register
+
+
+# -------------------------
+# Returns / momentum
+# -------------------------
+@feature("returns", ["Close"], window=1)
+def _returns(close):
+    return close.pct_change()
+
+
+@feature("return_5d", ["Close"], window=5)
+def _return_5d(close):
+    return close.pct_change(5)
+
+
+@feature("return_20d", ["Close"], window=20)
+def _return_20d(close):
+    return close.pct_change(20)
+
+
+# -------------------------
+# Moving averages & trend
+# -------------------------
+@feature("ma_20", ["Close"], window=19)
+def _ma_20(close):
+    return close.rolling(20).mean()
 
-    df.dropna(inplace=True)
-    return df
 
+@feature("ma_ratio", ["Close", "ma_20"])
+def _ma_ratio(close, ma_20):
+    return close / ma_20
 
-def add_features(df):
-    # -------------------------
-    # Returns / momentum
-    # -------------------------
-    df["return_5d"] = df["Close"].pct_change(5)
-    df["return_20d"] = df["Close"].pct_change(20)
-
-    # -------------------------
-    # Moving averages & trend
-    # -------------------------
-    df["ma_20"] = df["Close"].rolling(20).mean()
-    df["ma_ratio"] = df["Close"] / df["ma_20"]
-
-    # Trend slope (acceleration)
-    df["trend_slope_20d"] = (
-        df["ma_20"] - df["ma_20"].shift(5)
-    ) / df["ma_20"].shift(5)
-
-    # -------------------------
-    # RSI (mean reversion)
-    # -------------------------
-    delta = df["Close"].diff()
+
+# Trend slope (acceleration)
+@feature("trend_slope_20d", ["ma_20"], window=5)
+def _trend_slope_20d(ma_20):
+    return (ma_20 - ma_20.shift(5)) / ma_20.shift(5)
+
+
+# -------------------------
+# RSI (mean reversion)
+# -------------------------
+@feature("rsi", ["Close"], window=14)
+def _rsi(close):
+    delta = close.diff()
     gain = delta.clip(lower=0)
     loss = -delta.clip(upper=0)
 
@@ -52,91 +121,431 @@ def add_features(df):
     avg_loss = loss.rolling(14).mean()
 
     rs = avg_gain / avg_loss
-    df["rsi"] = 100 - (100 / (1 + rs))
-
-    # -------------------------
-    # Volatility
-    # -------------------------
-    df["atr"] = df["Close"].rolling(14).std() / df["Close"]
-    df["volatility_20d"] = df["Close"].pct_change().rolling(20).std()
-
-    # -------------------------
-    # Market regime (stress flag)
-    # -------------------------
-    vol_threshold = df["volatility_20d"].quantile(0.7)
-    df["regime_stress"] = (df["volatility_20d"] > vol_threshold).astype(int)
-
-    # -------------------------
-    # Relative strength vs QQQ
-    # -------------------------
-    df["relative_strength_spy"] = (
-        df["Close"].pct_change(20)
-        - df["SPY_Close"].pct_change(20)
-    )
+    return 100 - (100 / (1 + rs))
 
-    return df
 
+# -------------------------
+# Volatility
+# -------------------------
+@feature("atr", ["Close"], window=13)
+def _atr(close):
+    return close.rolling(14).std() / close
 
 
-def add_targets(df: pd.DataFrame) -> pd.DataFrame:
-    # Future return
-    df["future_return"] = df["Close"].shift(-PREDICTION_HORIZON) / df["Close"] - 1
+@feature("volatility_20d", ["returns"], window=19)
+def _volatility_20d(returns):
+    return returns.rolling(20).std()
 
-    # Trend target
-    df["target_trend"] = (df["future_return"] > 0).astype(int)
 
-    # Future volatility
-    df["future_volatility"] = (
-        df["Close"]
-        .pct_change()
-        .rolling(PREDICTION_HORIZON)
-        .std()
-        .shift(-PREDICTION_HORIZON)
-    )
+# -------------------------
+# Market regime (stress flag)
+# -------------------------
+# Thresholded on the whole frame's volatility distribution
+@feature("regime_stress", ["volatility_20d"])
+def _regime_stress(volatility_20d):
+    vol_threshold = volatility_20d.quantile(0.7)
+    return (volatility_20d > vol_threshold).astype(int)
 
-    # Volatility regime
-    df["target_volatility"] = pd.qcut(
-        df["future_volatility"],
-        q=3,
-        labels=["low", "medium", "high"],
-        duplicates="drop"
-    )
 
+# -------------------------
+# Relative strength vs SPY
+# -------------------------
+@feature("spy_return_20d", ["SPY_Close"], window=20)
+def _spy_return_20d(spy_close):
+    return spy_close.pct_change(20)
+
+
+@feature("relative_strength_spy", ["return_20d", "spy_return_20d"])
+def _relative_strength_spy(return_20d, spy_return_20d):
+    return return_20d - spy_return_20d
+
+
+def resolve_features(columns):
+    """
+    Registered features needed for `columns`, dependencies first, each
+    listed once.
+    """
+    order = []
+    seen = set()
+
+    def visit(name):
+        if name in seen:
+            return
+        if name not in FEATURE_REGISTRY:
+            raise ValueError(f"Unknown feature '{name}'")
+        seen.add(name)
+        for dependency in FEATURE_REGISTRY[name].inputs:
+            if dependency in FEATURE_REGISTRY:
+                visit(dependency)
+        order.append(name)
+
+    for name in columns:
+        visit(name)
+    return order
+
+
+def feature_inputs(columns):
+    """Price columns the frame must have to compute `columns`."""
+    inputs = []
+    for name in resolve_features(columns):
+        for dependency in FEATURE_REGISTRY[name].inputs:
+            if dependency not in FEATURE_REGISTRY and dependency not in inputs:
+                inputs.append(dependency)
+    return inputs
+
+
+def feature_lookback(columns):
+    """Bars before the first row where every one of `columns` is defined."""
+    lookback = {}
+    for name in resolve_features(columns):
+        node = FEATURE_REGISTRY[name]
+        lookback[name] = node.window + max(
+            (lookback.get(dependency, 0) for dependency in node.inputs), default=0
+        )
+    return max((lookback[name] for name in columns), default=0)
+
+
+def add_features(df, columns=None, memo=None):
+    """
+    Add `columns` (default FEATURE_COLUMNS) to df, computing only them and
+    the intermediates they depend on. Each node is computed once; only
+    the requested columns are written to df.
+
+    Args:
+        df: Frame with the price columns the features need (feature_inputs)
+        columns: Registered feature names
+        memo: Optional {feature: Series} of nodes already computed for this
+            same frame; filled in place, so repeated calls share the work
+    """
+    columns = FEATURE_COLUMNS if columns is None else columns
+    memo = {} if memo is None else memo
+
+    for name in resolve_features(columns):
+        if name not in memo:
+            node = FEATURE_REGISTRY[name]
+            memo[name] = node.compute(*[
+                memo[dependency] if dependency in FEATURE_REGISTRY else df[dependency]
+                for dependency in node.inputs
+            ])
+
+    for name in columns:
+        df[name] = memo[name]
     return df
 
-def build_dataset(symbol="SPY"):
+
+def horizon_columns(horizon):
     """
-    Build dataset for any stock symbol
-    
+    (future_return, target_trend, future_volatility, target_volatility)
+    column names for a horizon. PREDICTION_HORIZON keeps the plain names
+    the rest of the code reads; other horizons get a "_{h}d" suffix.
+    """
+    if horizon == PREDICTION_HORIZON:
+        return "future_return", "target_trend", "future_volatility", "target_volatility"
+    return (
+        f"future_return_{horizon}d",
+        f"target_trend_{horizon}d",
+        f"future_volatility_{horizon}d",
+        f"target_volatility_{horizon}d",
+    )
+
+
+def add_targets(df: pd.DataFrame, horizons=None) -> pd.DataFrame:
+    """
+    Add prediction targets for every horizon in one pass.
+
+    All horizons are read from shifted views of a single NaN-padded close
+    array (windows[t, k] = close[t + k]), so adding horizons does not add
+    passes over the frame. Rows whose future is not known yet get NaN.
+
     Args:
-        symbol: Stock ticker (default: SPY)
+        df: Frame with a Close column
+        horizons: Horizons in bars (default: [PREDICTION_HORIZON])
+    """
+    horizons = sorted(set(horizons or [PREDICTION_HORIZON]))
+    max_horizon = max(horizons)
+
+    close = df["Close"].to_numpy(dtype=np.float64)
+    n = len(close)
+    padded = np.concatenate([close, np.full(max_horizon, np.nan)])
+    windows = sliding_window_view(padded, max_horizon + 1)[:n]
+
+    # Daily returns after t: returns[t, k - 1] = close[t + k] / close[t + k - 1] - 1,
+    # a view over the 1-D daily returns rather than an n x max_horizon copy
+    daily = padded[1:] / padded[:-1] - 1
+    returns = sliding_window_view(daily, max_horizon)[:n]
+
+    for horizon in horizons:
+        future_col, trend_col, vol_col, regime_col = horizon_columns(horizon)
+
+        # Future return
+        future = windows[:, horizon] / close - 1
+        df[future_col] = future
+
+        # Trend target
+        df[trend_col] = (df[future_col] > 0).astype(int)
+
+        # Future volatility (std of the next `horizon` daily returns)
+        if horizon > 1:
+            df[vol_col] = np.std(returns[:, :horizon], axis=1, ddof=1)
+        else:
+            df[vol_col] = np.nan
+
+        # Volatility regime
+        if df[vol_col].notna().any():
+            df[regime_col] = pd.qcut(
+                df[vol_col],
+                q=3,
+                labels=VOLATILITY_LABELS,
+                duplicates="drop"
+            )
+        else:
+            df[regime_col] = pd.Categorical([np.nan] * n, categories=VOLATILITY_LABELS)
+
+    return df
+
+
+def load_with_benchmark(symbol="SPY", start="2015-01-01", benchmark=True):
+    """
+    Load a symbol's prices joined with SPY_Close for relative strength.
+    benchmark=False skips the SPY download (for features that don't need it).
     """
     # Load primary stock data
-    primary = load_market_data(symbol)
+    primary = load_market_data(symbol, start=start)
+
+    if not benchmark:
+        return primary
 
     # Load SPY as benchmark for relative strength comparison
     if symbol.upper() == "SPY":
         df = primary.copy()
         df["SPY_Close"] = df["Close"]
     else:
-        spy = load_market_data("SPY")
+        spy = load_market_data("SPY", start=start)
         df = primary.join(
             spy["Close"].rename("SPY_Close"),
             how="inner"
         )
 
+    return df
+
+
+def load_feature_inputs(symbol="SPY", columns=FEATURE_COLUMNS, start="2015-01-01"):
+    """Prices for `columns`, with SPY only when one of them needs it."""
+    return load_with_benchmark(symbol, start=start, benchmark="SPY_Close" in feature_inputs(columns))
+
+
+def build_feature_frame(symbol="SPY", columns=FEATURE_COLUMNS, prices=None):
+    """
+    Features only, without targets. Unlike build_dataset this keeps the
+    newest rows (whose future return is still unknown), so it is what
+    live prediction should read from.
+
+    Args:
+        prices: load_feature_inputs output to reuse instead of loading again
+    """
+    df = load_feature_inputs(symbol, columns) if prices is None else prices.copy()
+    df = add_features(df, columns)
+    return df.dropna(subset=columns)
+
+
+def build_feature_tail(symbol="SPY", rows=10, columns=FEATURE_COLUMNS):
+    """
+    The last `rows` rows build_dataset would produce, computed from only the
+    trailing bars `columns` need (feature_lookback) plus rows +
+    PREDICTION_HORIZON, so the cost does not grow with history length.
+
+    regime_stress uses the volatility quantile of this short window rather
+    than of the full history, so it can differ from build_dataset.
+    """
+    bars = feature_lookback(columns) + 1 + rows + PREDICTION_HORIZON
+    # Calendar days covering `bars` trading days, with room for holidays
+    days = int(bars * 7 / 5) + 10
+    start = (pd.Timestamp.today().normalize() - pd.Timedelta(days=days)).strftime("%Y-%m-%d")
+
+    df = add_features(load_feature_inputs(symbol, columns, start=start), columns)
+    df = df.dropna(subset=columns)
+
+    # Match build_dataset: rows whose future return is unknown are dropped
+    return df.iloc[:-PREDICTION_HORIZON].tail(rows)
+
+
+def build_dataset(symbol="SPY", compact=False, horizons=None, columns=FEATURE_COLUMNS, prices=None):
+    """
+    Build dataset for any stock symbol
+    
+    Args:
+        symbol: Stock ticker (default: SPY)
+        compact: Return a CompactDataset instead of the full float64 frame
+            (needs the full FEATURE_COLUMNS)
+        horizons: Also add targets for these horizons (see horizon_columns).
+            Rows are still those of the default horizon, so longer
+            horizons have NaN targets in their last rows.
+        columns: Features to compute (only these and their dependencies)
+        prices: load_feature_inputs output to reuse instead of loading again
+    """
+    df = load_feature_inputs(symbol, columns) if prices is None else prices.copy()
+
     # Add engineered features
-    df = add_features(df)
+    df = add_features(df, columns)
 
     # Add prediction targets
-    df = add_targets(df)
+    extra = [h for h in horizons or [] if h != PREDICTION_HORIZON]
+    df = add_targets(df, [PREDICTION_HORIZON] + extra)
 
     # Final cleanup
-    df.dropna(inplace=True)
+    extra_columns = [col for h in extra for col in horizon_columns(h)]
+    complete = df.columns.difference(extra_columns)
+
+    if compact:
+        # Copy the kept rows straight into float32 instead of dropna-copying
+        # the whole float64 frame first
+        return CompactDataset.from_frame(df, symbol, rows=df[complete].notna().all(axis=1).to_numpy())
 
+    df.dropna(subset=complete, inplace=True)
     return df
 
 
+class CompactDataset:
+    """
+    Serving-oriented dataset: Close + FEATURE_COLUMNS as one contiguous
+    float32 block, plus int8/float32 targets, indexed by date.
+
+    Intermediate columns (ma_20, future_volatility, OHLC, Volume, ...) are
+    dropped, which keeps cached datasets well under half the size of the
+    frame returned by build_dataset.
+    """
+
+    __slots__ = (
+        "symbol",
+        "index",
+        "values",
+        "target_trend",
+        "target_volatility",
+        "future_return",
+    )
+
+    def __init__(self, symbol, index, values, target_trend, target_volatility, future_return):
+        self.symbol = symbol
+        self.index = index
+        self.values = values
+        self.target_trend = target_trend
+        self.target_volatility = target_volatility
+        self.future_return = future_return
+
+    @classmethod
+    def from_frame(cls, df, symbol="SPY", rows=None):
+        """
+        Compact a frame produced by build_dataset (after dropna), or keep
+        only the `rows` boolean mask of one that was not dropna'd.
+
+        The float32 block is filled one column at a time, so no float64
+        copy of the compact columns is made on the way.
+        """
+        if rows is None:
+            rows = slice(None)
+        index = pd.DatetimeIndex(df.index[rows])
+
+        values = np.empty((len(index), len(COMPACT_COLUMNS)), dtype=np.float32)
+        for j, col in enumerate(COMPACT_COLUMNS):
+            values[:, j] = df[col].to_numpy()[rows]
+
+        # Volatility regime stored as category codes (-1 = missing)
+        vol = df["target_volatility"]
+        if isinstance(vol.dtype, pd.CategoricalDtype):
+            vol_codes = vol.cat.codes.to_numpy()
+        else:
+            vol_codes = pd.Categorical(vol, categories=VOLATILITY_LABELS).codes
+
+        return cls(
+            symbol=symbol,
+            index=index,
+            values=values,
+            target_trend=df["target_trend"].to_numpy()[rows].astype(np.int8),
+            target_volatility=np.asarray(vol_codes, dtype=np.int8)[rows],
+            future_return=df["future_return"].to_numpy()[rows].astype(np.float32),
+        )
+
+    def to_arrays(self):
+        """Plain NumPy arrays (for shared_cache); inverse of from_arrays."""
+        return {
+            "index": self.index.to_numpy(),
+            "values": self.values,
+            "target_trend": self.target_trend,
+            "target_volatility": self.target_volatility,
+            "future_return": self.future_return,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, symbol="SPY"):
+        """Wrap to_arrays output (e.g. read-only memmaps) without copying the data."""
+        return cls(
+            symbol=symbol,
+            index=pd.DatetimeIndex(arrays["index"]),
+            values=arrays["values"],
+            target_trend=arrays["target_trend"],
+            target_volatility=arrays["target_volatility"],
+            future_return=arrays["future_return"],
+        )
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def nbytes(self):
+        return (
+            self.values.nbytes
+            + self.target_trend.nbytes
+            + self.target_volatility.nbytes
+            + self.future_return.nbytes
+            + self.index.nbytes
+        )
+
+    @property
+    def close(self):
+        return self.values[:, 0]
+
+    @property
+    def features(self):
+        """(n_rows, len(FEATURE_COLUMNS)) view, no copy."""
+        return self.values[:, 1:]
+
+    def column(self, name):
+        """Return a single stored column as a 1-D view."""
+        return self.values[:, COMPACT_COLUMNS.index(name)]
+
+    def slice(self, start=None, stop=None):
+        """Row slice sharing memory with this dataset."""
+        sl = slice(start, stop)
+        return CompactDataset(
+            symbol=self.symbol,
+            index=self.index[sl],
+            values=self.values[sl],
+            target_trend=self.target_trend[sl],
+            target_volatility=self.target_volatility[sl],
+            future_return=self.future_return[sl],
+        )
+
+    def tail(self, rows):
+        return self.slice(max(len(self) - rows, 0), None)
+
+    def split(self, date):
+        """Split into rows before / on-or-after `date` (index is sorted)."""
+        pos = int(self.index.searchsorted(pd.Timestamp(date)))
+        return self.slice(None, pos), self.slice(pos, None)
+
+    def to_frame(self):
+        """
+        Rebuild a DataFrame with the columns train/backtest code expects.
+        Feature columns are views on the float32 block where pandas allows.
+        """
+        df = pd.DataFrame(self.values, index=self.index, columns=COMPACT_COLUMNS, copy=False)
+        df["future_return"] = self.future_return
+        df["target_trend"] = self.target_trend
+        df["target_volatility"] = pd.Categorical.from_codes(
+            self.target_volatility, categories=VOLATILITY_LABELS
+        )
+        return df
+
 
 if __name__ == "__main__":
     dataset = build_dataset("SPY")
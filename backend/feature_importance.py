@@ -1,7 +1,42 @@
 import pandas as pd
 import numpy as np
+from sklearn.inspection import permutation_importance
 
-from train_trend_model import train_trend_model, FEATURE_COLUMNS
+from train_trend_model import train_trend_model, FEATURE_COLUMNS, TARGET_COLUMN, TEST_START
+
+
+def compute_permutation_importance(model, df, n_repeats=10, n_jobs=-1, random_state=0):
+    """
+    Permutation importance on the out-of-sample period (TEST_START onward).
+
+    Scored with ROC AUC; feature permutations and repeats are spread over
+    joblib workers (n_jobs=-1 uses every core). Works for any fitted
+    estimator, not just linear ones.
+
+    Returns a list of {"name", "importance_mean", "importance_std"}.
+    """
+    test_df = df[df.index >= TEST_START]
+    # The model is fitted on float64; a float32 compact frame is widened first
+    X_test = test_df[FEATURE_COLUMNS].astype(np.float64)
+
+    result = permutation_importance(
+        model,
+        X_test,
+        test_df[TARGET_COLUMN],
+        scoring="roc_auc",
+        n_repeats=n_repeats,
+        n_jobs=n_jobs,
+        random_state=random_state,
+    )
+
+    return [
+        {
+            "name": name,
+            "importance_mean": float(result.importances_mean[i]),
+            "importance_std": float(result.importances_std[i]),
+        }
+        for i, name in enumerate(FEATURE_COLUMNS)
+    ]
 
 
 def show_feature_importance():
@@ -0,0 +1,410 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset_builder import add_features, feature_lookback, CompactDataset, FEATURE_COLUMNS, COMPACT_COLUMNS
+from train_trend_model import make_trend_pipeline, extract_linear_params, predict_bullish_prob
+from backtest_strategy import TradingStrategy, INITIAL_CAPITAL
+
+
+# Horizons and holding periods are counted in bars in intraday mode
+INTRADAY_HORIZON_BARS = 30
+INTRADAY_HOLD_BARS = 60
+INTRADAY_COOLDOWN_BARS = 390  # one regular session of minute bars
+BARS_PER_YEAR = 252 * 390
+
+# Minute bars are ~1/20 as volatile as daily ones, so the daily
+# volatility_20d limits never bind; stress is judged on a running quantile
+STRESS_QUANTILE = 0.7
+
+# regime_stress is replaced by the running-quantile flag, so the per-chunk
+# one is never computed
+CHUNK_FEATURES = [name for name in FEATURE_COLUMNS if name != "regime_stress"]
+
+# Raw bars carried between chunks: what the chunk features' rolling
+# windows look back over (from the feature registry), plus one
+FEATURE_LOOKBACK = feature_lookback(CHUNK_FEATURES) + 1
+
+
+class StreamingFeatureBuilder:
+    """
+    Computes the daily feature set over minute bars one chunk at a time.
+
+    Rolling windows are carried across chunk boundaries by prepending the
+    last FEATURE_LOOKBACK raw bars of the previous chunk. Targets need
+    `horizon` future bars, so the newest `horizon` rows are held back until
+    the next chunk arrives. Memory is O(chunk + lookback + horizon).
+
+    regime_stress compares volatility_20d with the STRESS_QUANTILE of a
+    bounded reservoir sample of volatility seen in earlier chunks (the
+    daily pipeline uses the full-history quantile, which cannot stream).
+    """
+
+    def __init__(self, horizon=INTRADAY_HORIZON_BARS, reservoir_size=10_000, seed=0):
+        self.horizon = horizon
+        self.carry = None
+        self.pending = None
+        self.reservoir = np.empty(reservoir_size)
+        self.reservoir_fill = 0
+        self.volatility_seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def _stress_threshold(self, volatility):
+        if self.reservoir_fill:
+            return np.quantile(self.reservoir[:self.reservoir_fill], STRESS_QUANTILE)
+        # First chunk: nothing earlier to compare with
+        return np.nanquantile(volatility, STRESS_QUANTILE) if np.isfinite(volatility).any() else np.inf
+
+    def _update_reservoir(self, volatility):
+        """Reservoir sampling (algorithm R), vectorized over the chunk."""
+        values = volatility[np.isfinite(volatility)]
+        size = len(self.reservoir)
+
+        free = size - self.reservoir_fill
+        head, values = values[:free], values[free:]
+        self.reservoir[self.reservoir_fill:self.reservoir_fill + len(head)] = head
+        self.reservoir_fill += len(head)
+        self.volatility_seen += len(head)
+
+        if len(values):
+            seen = self.volatility_seen + np.arange(1, len(values) + 1)
+            slots = (self.rng.random(len(values)) * seen).astype(np.int64)
+            keep = slots < size
+            self.reservoir[slots[keep]] = values[keep]
+            self.volatility_seen += len(values)
+
+    def push(self, chunk):
+        """
+        Add a chunk of bars (Close, optional SPY_Close, sorted DatetimeIndex).
+        Returns the rows whose targets are now known, with NaN rows dropped.
+        """
+        raw = pd.DataFrame({"Close": chunk["Close"].astype(np.float64)}, index=chunk.index)
+        raw["SPY_Close"] = chunk["SPY_Close"] if "SPY_Close" in chunk else raw["Close"]
+
+        frame = raw if self.carry is None else pd.concat([self.carry, raw])
+        carried = 0 if self.carry is None else len(self.carry)
+        # From the combined frame: chunks shorter than the lookback must
+        # still accumulate enough history for the rolling windows
+        self.carry = frame.iloc[-FEATURE_LOOKBACK:]
+
+        features = add_features(frame.copy(), CHUNK_FEATURES).iloc[carried:]
+        volatility = features["volatility_20d"].to_numpy()
+        features["regime_stress"] = (volatility > self._stress_threshold(volatility)).astype(int)
+        self._update_reservoir(volatility)
+
+        rows = features[["Close"] + FEATURE_COLUMNS]
+        if self.pending is not None:
+            rows = pd.concat([self.pending, rows])
+
+        return self._emit(rows)
+
+    def flush(self):
+        """
+        End of stream: drop the held-back rows. Their targets are unknown,
+        matching build_dataset's dropna of the last horizon rows.
+        """
+        self.pending = None
+
+    def _emit(self, rows):
+        close = rows["Close"].to_numpy()
+        future = np.full(len(close), np.nan)
+        if len(close) > self.horizon:
+            future[:-self.horizon] = close[self.horizon:] / close[:-self.horizon] - 1
+
+        split = max(len(rows) - self.horizon, 0)
+        self.pending = rows.iloc[split:]
+
+        ready = rows.iloc[:split].copy()
+        ready["future_return"] = future[:split]
+        ready["target_trend"] = (ready["future_return"] > 0).astype(int)
+        return ready.dropna()
+
+
+class FeatureFileWriter:
+    """
+    Appends emitted rows to flat binary files under `directory`:
+    {symbol}.values.f32 (COMPACT_COLUMNS, row-major float32),
+    {symbol}.index.i8 (ns timestamps), {symbol}.target.i1, {symbol}.future.f32.
+    open_feature_file() memory-maps them back as a CompactDataset.
+    """
+
+    def __init__(self, directory, symbol):
+        os.makedirs(directory, exist_ok=True)
+        self.paths = feature_file_paths(directory, symbol)
+        self.files = {key: open(path, "wb") for key, path in self.paths.items()}
+        self.rows = 0
+
+    def write(self, rows):
+        if not len(rows):
+            return
+        self.files["values"].write(rows[COMPACT_COLUMNS].to_numpy(dtype=np.float32).tobytes())
+        self.files["index"].write(rows.index.to_numpy(dtype="datetime64[ns]").view(np.int64).tobytes())
+        self.files["target"].write(rows["target_trend"].to_numpy(dtype=np.int8).tobytes())
+        self.files["future"].write(rows["future_return"].to_numpy(dtype=np.float32).tobytes())
+        self.rows += len(rows)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def feature_file_paths(directory, symbol):
+    base = os.path.join(directory, symbol.upper())
+    return {
+        "values": base + ".values.f32",
+        "index": base + ".index.i8",
+        "target": base + ".target.i1",
+        "future": base + ".future.f32",
+    }
+
+
+def open_feature_file(directory, symbol):
+    """Memory-map a FeatureFileWriter output as a read-only CompactDataset."""
+    paths = feature_file_paths(directory, symbol)
+    index = np.memmap(paths["index"], dtype=np.int64, mode="r")
+    n = len(index)
+
+    values = np.memmap(paths["values"], dtype=np.float32, mode="r", shape=(n, len(COMPACT_COLUMNS)))
+    return CompactDataset(
+        symbol=symbol.upper(),
+        index=pd.DatetimeIndex(index.view("datetime64[ns]")),
+        values=values,
+        target_trend=np.memmap(paths["target"], dtype=np.int8, mode="r"),
+        target_volatility=np.full(n, -1, dtype=np.int8),
+        future_return=np.memmap(paths["future"], dtype=np.float32, mode="r"),
+    )
+
+
+class StreamingMetrics:
+    """Total return, max drawdown and Sharpe over an equity stream in O(1) memory."""
+
+    def __init__(self, periods_per_year=BARS_PER_YEAR):
+        self.periods_per_year = periods_per_year
+        self.first = None
+        self.last = None
+        self.peak = None
+        self.max_drawdown = 0.0
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values):
+        """Fold a chunk of equity values in (vectorized, Chan et al. variance merge)."""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+
+        if self.first is None:
+            self.first = self.peak = values[0]
+            returns = values[1:] / values[:-1] - 1
+        else:
+            returns = values / np.concatenate([[self.last], values[:-1]]) - 1
+        self.last = values[-1]
+
+        if len(returns):
+            n_b = len(returns)
+            mean_b = returns.mean()
+            m2_b = ((returns - mean_b) ** 2).sum()
+            delta = mean_b - self.mean
+            n = self.n + n_b
+            self.m2 += m2_b + delta ** 2 * self.n * n_b / n
+            self.mean += delta * n_b / n
+            self.n = n
+
+        peaks = np.maximum.accumulate(np.concatenate([[self.peak], values]))[1:]
+        self.max_drawdown = min(self.max_drawdown, float(((values - peaks) / peaks).min()))
+        self.peak = peaks[-1]
+
+    def result(self):
+        std = np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+        return {
+            "total_return": float(self.last / self.first - 1) if self.first else 0.0,
+            "max_drawdown": self.max_drawdown,
+            "sharpe_ratio": float(np.sqrt(self.periods_per_year) * self.mean / std) if std else 0.0,
+        }
+
+
+def _trade_record(trade):
+    return {
+        "entry_date": trade["entry_date"].isoformat(),
+        "exit_date": trade["exit_date"].isoformat(),
+        "entry_price": float(trade["entry_price"]),
+        "exit_price": float(trade["exit_price"]),
+        "pnl": float(trade["pnl"]),
+        "bullish_prob": float(trade["bullish_prob"]),
+        "features": {k: float(v) for k, v in trade["features"].items()},
+    }
+
+
+def run_intraday(chunks, symbol, strategy_type="aggressive", params=None, train_bars=50_000,
+                 horizon=INTRADAY_HORIZON_BARS, hold_bars=INTRADAY_HOLD_BARS,
+                 cooldown_bars=INTRADAY_COOLDOWN_BARS, store=None, feature_dir=None):
+    """
+    Stream minute-bar chunks through features -> model -> strategy.
+
+    Args:
+        chunks: Iterable of bar frames (see iter_csv_chunks / synthetic_minute_chunks)
+        params: Folded model params (extract_linear_params). If None, a model
+            is fitted on the first `train_bars` completed rows, which are
+            not traded.
+        store: Optional RunStore; equity points and trades are appended per chunk
+        feature_dir: Optional directory for FeatureFileWriter output
+
+    Returns a summary dict (run_id, bars, trades, metrics). If the stream
+    raises, the stored run is marked failed before the error propagates.
+    """
+    builder = StreamingFeatureBuilder(horizon=horizon)
+    strategy = TradingStrategy(strategy_type, hold_bars=hold_bars, cooldown_bars=cooldown_bars)
+    metrics = StreamingMetrics()
+    buy_hold = StreamingMetrics()
+    writer = FeatureFileWriter(feature_dir, symbol) if feature_dir else None
+    run_id = store.start_run(symbol, f"intraday-{strategy_type}") if store is not None else None
+
+    training = []
+    training_rows = 0
+    first_close = None
+    bars = 0
+    num_trades = 0
+    winning_trades = 0
+
+    completed = False
+    try:
+        for chunk in chunks:
+            rows = builder.push(chunk)
+            if writer is not None:
+                writer.write(rows)
+
+            if params is None:
+                # Buffer only until the training window is full
+                training.append(rows)
+                training_rows += len(rows)
+                if training_rows < train_bars:
+                    continue
+                train = pd.concat(training)
+                fit_rows, rows = train.iloc[:train_bars], train.iloc[train_bars:]
+                model = make_trend_pipeline().fit(fit_rows[FEATURE_COLUMNS], fit_rows["target_trend"])
+                params = extract_linear_params(model)
+                training = None
+
+            if not len(rows):
+                continue
+
+            features = rows[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+            probs = predict_bullish_prob(params, features)
+            closes = rows["Close"].to_numpy()
+            vols = rows["volatility_20d"].to_numpy()
+            if first_close is None:
+                first_close = closes[0]
+
+            equity = np.empty(len(rows))
+            for i, date in enumerate(rows.index):
+                strategy.on_bar(date, closes[i], probs[i], vols[i], features[i])
+                equity[i] = strategy.capital
+
+            benchmark = closes / first_close * INITIAL_CAPITAL
+            metrics.update(equity)
+            buy_hold.update(benchmark)
+            bars += len(rows)
+
+            new_trades = strategy.trades
+            if store is not None:
+                dates = [ts.isoformat() for ts in rows.index]
+                store.append_equity(run_id, zip(dates, equity.tolist(), benchmark.tolist()))
+                store.append_trades(run_id, [_trade_record(t) for t in new_trades], num_trades)
+
+            # Only tallies stay in memory; trades live in the store
+            num_trades += len(new_trades)
+            winning_trades += sum(1 for t in new_trades if t["pnl"] > 0)
+            strategy.trades = []
+
+        summary = {
+            "run_id": run_id,
+            "symbol": symbol.upper(),
+            "bars": bars,
+            "num_trades": num_trades,
+            "winning_trades": winning_trades,
+            "losing_trades": num_trades - winning_trades,
+            "metrics": {**metrics.result(), "num_trades": num_trades},
+            "buy_hold_metrics": buy_hold.result(),
+        }
+
+        if store is not None:
+            store.finish_run(
+                run_id,
+                summary["metrics"],
+                summary["buy_hold_metrics"],
+                num_trades,
+                summary["winning_trades"],
+                summary["losing_trades"],
+            )
+        completed = True
+    finally:
+        builder.flush()
+        if writer is not None:
+            writer.close()
+        if store is not None and not completed:
+            store.fail_run(run_id)
+    return summary
+
+
+def iter_csv_chunks(path, chunksize=100_000, date_column="Datetime"):
+    """
+    Read a minute-bar CSV (date_column, Close, optional SPY_Close, ...) in
+    chunks of `chunksize` rows. The file must be sorted by time.
+    """
+    for chunk in pd.read_csv(path, chunksize=chunksize, parse_dates=[date_column]):
+        yield chunk.set_index(date_column)
+
+
+def synthetic_minute_chunks(symbol="SPY", days=252, chunk_bars=50_000, seed=None):
+    """Random-walk regular-session minute bars, generated chunk by chunk."""
+    rng = np.random.default_rng(seed if seed is not None else sum(map(ord, symbol)))
+    sessions = pd.bdate_range("2020-01-01", periods=days)
+    minutes = pd.timedelta_range("09:30:00", periods=390, freq="min")
+
+    price = 100.0
+    buffer = []
+    buffered = 0
+    for session in sessions:
+        index = session + minutes
+        returns = rng.normal(0.00001, 0.0007, len(index))
+        close = price * np.exp(np.cumsum(returns))
+        price = close[-1]
+        buffer.append(pd.DataFrame({"Close": close}, index=index))
+        buffered += len(index)
+        if buffered >= chunk_bars:
+            yield pd.concat(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield pd.concat(buffer)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from run_store import RunStore
+
+    parser = argparse.ArgumentParser(description="Chunked intraday backtest over minute bars")
+    parser.add_argument("csv", nargs="?", help="Minute-bar CSV (omit for synthetic bars)")
+    parser.add_argument("--symbol", default="SPY")
+    parser.add_argument("--strategy", default="aggressive")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=252, help="Synthetic sessions when no CSV is given")
+    parser.add_argument("--feature-dir", default="", help="Write streamed features here")
+    parser.add_argument("--no-store", action="store_true", help="Do not persist the run")
+    args = parser.parse_args()
+
+    if args.csv:
+        chunks = iter_csv_chunks(args.csv, args.chunksize)
+    else:
+        chunks = synthetic_minute_chunks(args.symbol, args.days, args.chunksize)
+
+    summary = run_intraday(
+        chunks,
+        args.symbol,
+        strategy_type=args.strategy,
+        store=None if args.no_store else RunStore(),
+        feature_dir=args.feature_dir or None,
+    )
+    print(summary)
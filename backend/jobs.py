@@ -0,0 +1,386 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+TERMINAL_STATES = {COMPLETED, FAILED, CANCELLED}
+
+
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    percent REAL NOT NULL,
+    partial TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_submitted ON jobs (submitted_at);
+"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its job has been cancelled."""
+
+
+class QueueFull(Exception):
+    """Raised by JobManager.submit when no more work can be accepted."""
+
+
+class Job:
+    """
+    One unit of background work. The job function receives this object and
+    calls report() to publish progress and check_cancelled() between steps.
+    """
+
+    def __init__(self, manager, kind, params, priority):
+        self.manager = manager
+        self.job_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.priority = priority
+        self.status = QUEUED
+        self.stage = "queued"
+        self.percent = 0.0
+        self.partial = []
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def report(self, stage, percent, **partial):
+        """Publish progress; `partial` is appended to the job's partial results."""
+        self.check_cancelled()
+        self.stage = stage
+        self.percent = float(percent)
+        if partial:
+            self.partial.append(partial)
+        self.manager._publish(self, {"type": "progress", "stage": stage,
+                                     "percent": self.percent, "partial": partial or None})
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set() or self.manager._cancel_requested(self):
+            self.cancel_event.set()
+            raise JobCancelled()
+
+    def snapshot(self):
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "params": self.params,
+            "priority": self.priority,
+            "status": self.status,
+            "stage": self.stage,
+            "percent": self.percent,
+            "partial": self.partial,
+            "result": self.result,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobStore:
+    """
+    SQLite copy of every job's snapshot, shared by all server processes.
+
+    Jobs run in the process that accepted them, but with several uvicorn
+    workers a later poll, cancel or WebSocket may reach another one; that
+    process answers from here. Cancelling a job another process owns sets
+    cancel_requested, which the owner checks at the job's next step.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(JOB_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def save(self, snapshot):
+        """Insert or update a job from Job.snapshot() (keeps cancel_requested)."""
+        row = dict(snapshot)
+        for key in ("params", "partial", "result"):
+            row[key] = json.dumps(row[key])
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, kind, params, priority, status, stage, percent, partial, "
+                    "result, error, submitted_at, started_at, finished_at) "
+                    "VALUES (:job_id, :kind, :params, :priority, :status, :stage, :percent, :partial, "
+                    ":result, :error, :submitted_at, :started_at, :finished_at) "
+                    "ON CONFLICT (job_id) DO UPDATE SET status = excluded.status, stage = excluded.stage, "
+                    "percent = excluded.percent, partial = excluded.partial, result = excluded.result, "
+                    "error = excluded.error, started_at = excluded.started_at, "
+                    "finished_at = excluded.finished_at",
+                    row,
+                )
+        finally:
+            conn.close()
+
+    def get(self, job_id):
+        """Snapshot dict (as Job.snapshot), or None."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return None if row is None else self._snapshot(row)
+
+    def list(self, limit=100):
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT * FROM jobs ORDER BY submitted_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [self._snapshot(row) for row in rows]
+
+    def request_cancel(self, job_id):
+        """
+        Flag a job for cancellation; a still-queued job is marked cancelled
+        right away. Returns the updated snapshot, or None if unknown.
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND finished_at IS NULL",
+                    (job_id,),
+                )
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                    "WHERE job_id = ? AND status = 'queued'",
+                    (time.time(), job_id),
+                )
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return bool(row and row["cancel_requested"])
+
+    def prune(self, keep_finished):
+        """Delete the oldest finished jobs beyond keep_finished."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs "
+                    "WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+                    (keep_finished,),
+                )
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _snapshot(row):
+        snapshot = dict(row)
+        snapshot.pop("cancel_requested")
+        for key in ("params", "partial", "result"):
+            snapshot[key] = json.loads(snapshot[key]) if snapshot[key] is not None else None
+        return snapshot
+
+
+class JobManager:
+    """
+    Bounded background worker pool with priorities and cancellation.
+
+    Lower priority numbers run first (FIFO within a priority). At most
+    `max_workers` jobs run at once and at most `max_queued` wait; submit()
+    raises QueueFull beyond that so the server never accepts unbounded
+    heavy work. Progress events are fanned out to asyncio subscribers
+    (the WebSocket endpoint) with call_soon_threadsafe.
+
+    With a JobStore every state change is also written there, so
+    snapshot() and cancel() work for jobs owned by other processes.
+    """
+
+    def __init__(self, max_workers=2, max_queued=20, keep_finished=100, store=None):
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self.store = store
+        self.jobs = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._handlers = {}
+        self._subscribers = {}
+        self._lock = threading.Condition()
+
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+
+    def register(self, kind, fn):
+        """Register the function run for jobs of `kind`: fn(job, **params) -> result."""
+        self._handlers[kind] = fn
+
+    def submit(self, kind, params, priority=5):
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        with self._lock:
+            queued = sum(1 for job in self.jobs.values() if job.status == QUEUED)
+            if queued >= self.max_queued:
+                raise QueueFull()
+
+            job = Job(self, kind, params, priority)
+            self.jobs[job.job_id] = job
+            self._save(job)
+            heapq.heappush(self._heap, (priority, next(self._counter), job.job_id))
+            self._prune()
+            self._lock.notify()
+
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued job immediately, or flag a running one to stop at its
+        next step. Returns the job's snapshot, or None if it is unknown.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            # Owned by another process (or already pruned here)
+            return self.store.request_cancel(job_id) if self.store is not None else None
+
+        with self._lock:
+            if job.status not in TERMINAL_STATES:
+                job.cancel_event.set()
+                if job.status == QUEUED:
+                    self._finish(job, CANCELLED)
+        return job.snapshot()
+
+    def get(self, job_id):
+        """The Job if it runs in this process, else None (see snapshot)."""
+        return self.jobs.get(job_id)
+
+    def snapshot(self, job_id):
+        """Job state from this process, or from the store for other processes' jobs."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        return self.store.get(job_id) if self.store is not None else None
+
+    def list(self):
+        if self.store is not None:
+            return self.store.list(self.keep_finished + self.max_queued)
+        return [job.snapshot() for job in sorted(
+            self.jobs.values(), key=lambda j: j.submitted_at, reverse=True
+        )]
+
+    def subscribe(self, job_id, loop):
+        """asyncio.Queue receiving this job's events (must be called on `loop`)."""
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append((loop, queue))
+        return queue
+
+    def unsubscribe(self, job_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(job_id, [])
+            self._subscribers[job_id] = [s for s in subscribers if s[1] is not queue]
+
+    def _save(self, job):
+        if self.store is not None:
+            self.store.save(job.snapshot())
+
+    def _cancel_requested(self, job):
+        return self.store is not None and self.store.cancel_requested(job.job_id)
+
+    def _publish(self, job, event):
+        event = {"job_id": job.job_id, "status": job.status, **event}
+        self._save(job)
+        with self._lock:
+            subscribers = list(self._subscribers.get(job.job_id, []))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        if status == COMPLETED:
+            job.stage, job.percent = "done", 100.0
+        self._publish(job, {"type": status, "stage": job.stage, "percent": job.percent})
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond keep_finished."""
+        finished = [j for j in self.jobs.values() if j.status in TERMINAL_STATES]
+        if len(finished) > self.keep_finished:
+            finished.sort(key=lambda j: j.finished_at)
+            for job in finished[:len(finished) - self.keep_finished]:
+                del self.jobs[job.job_id]
+                self._subscribers.pop(job.job_id, None)
+        if self.store is not None:
+            self.store.prune(self.keep_finished)
+
+    def _next_job(self):
+        with self._lock:
+            while True:
+                while self._heap:
+                    _, _, job_id = heapq.heappop(self._heap)
+                    job = self.jobs.get(job_id)
+                    if job is not None and job.status == QUEUED:
+                        job.status = RUNNING
+                        job.started_at = time.time()
+                        return job
+                self._lock.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            # Cancelled through another process while it was queued
+            if self._cancel_requested(job):
+                self._finish(job, CANCELLED)
+                continue
+            self._publish(job, {"type": "started", "stage": job.stage, "percent": job.percent})
+            try:
+                result = self._handlers[job.kind](job, **job.params)
+                self._finish(job, COMPLETED, result=result)
+            except JobCancelled:
+                self._finish(job, CANCELLED)
+            except Exception as e:
+                traceback.print_exc()
+                self._finish(job, FAILED, error=str(e))
@@ -0,0 +1,229 @@
+"""
+Load-test harness for the FastAPI backend.
+
+Drives a weighted mix of routes at stepped concurrency levels and reports
+throughput plus p50/p95/p99 latency per route. By default it starts its
+own backend in-process against the offline StubPriceServer, so results
+do not depend on Yahoo Finance:
+
+    python load_test.py --levels 1,4,16 --duration 20 --output results.json
+
+Pass --url to load-test an already running server instead.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+DEFAULT_SYMBOLS = ["SPY", "QQQ", "TSLA", "NVDA", "AMD", "AAPL"]
+STRATEGIES = ["conservative", "aggressive", "ultra"]
+
+# route name -> (weight, URL path builder)
+ROUTES = {
+    "backtest": (1, lambda sym, strat: f"/api/backtest?symbol={sym}&strategy={strat}&persist=false"),
+    "explain": (2, lambda sym, strat: f"/api/trades/0/explain?symbol={sym}&strategy={strat}"),
+    "price-data": (5, lambda sym, strat: f"/api/price-data?symbol={sym}&start=2023-01-01"),
+    "preview": (2, lambda sym, strat: f"/api/dataset/preview?symbol={sym}&rows=10"),
+}
+
+
+def parse_mix(text):
+    """'backtest=1,price-data=5' -> {route: weight}; unknown routes are rejected."""
+    mix = {}
+    for item in filter(None, text.split(",")):
+        name, _, weight = item.partition("=")
+        if name not in ROUTES:
+            raise ValueError(f"Unknown route '{name}', expected one of {sorted(ROUTES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    values = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "mean": float(values.mean()),
+        "max": float(values.max()),
+    }
+
+
+def run_level(base_url, mix, symbols, concurrency, duration, timeout, seed=0):
+    """Run `concurrency` closed-loop clients for `duration` seconds."""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.perf_counter() + duration
+
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+
+    def client(client_id):
+        rng = random.Random(seed * 1000 + client_id)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            path = ROUTES[name][1](rng.choice(symbols), rng.choice(STRATEGIES))
+
+            start = time.perf_counter()
+            ok = True
+            try:
+                with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError):
+                ok = False
+            elapsed = time.perf_counter() - start
+
+            with lock:
+                if ok:
+                    latencies[name].append(elapsed)
+                else:
+                    errors[name] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    routes = {}
+    for name in names:
+        count = len(latencies[name])
+        routes[name] = {
+            "requests": count,
+            "errors": errors[name],
+            "throughput_rps": count / wall,
+            "latency_ms": percentiles(latencies[name]),
+        }
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "concurrency": concurrency,
+        "duration_s": wall,
+        "requests": total,
+        "errors": sum(errors.values()),
+        "throughput_rps": total / wall,
+        "latency_ms": percentiles([x for v in latencies.values() for x in v]),
+        "routes": routes,
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_offline_backend():
+    """
+    Start StubPriceServer plus the backend in this process, with a scratch
+    run database and shared cache (removed by stop), so synthetic prices
+    never reach the real server's caches. Returns (base_url, stop callable).
+    """
+    from market_data import StubPriceServer
+
+    scratch = tempfile.mkdtemp(prefix="tutor-load-test-")
+    stub = StubPriceServer().start()
+    os.environ["TUTOR_MARKET_DATA_URL"] = stub.url
+    os.environ["TUTOR_DOWNLOAD_RATE"] = "1000"
+    os.environ["TUTOR_SHARED_CACHE_DIR"] = os.path.join(scratch, "shared_cache")
+    os.environ.setdefault("TUTOR_RUN_DB", os.path.join(scratch, "runs.sqlite3"))
+
+    import uvicorn
+    from main import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+        thread.join(timeout=10)
+        stub.stop()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+def format_ms(value):
+    """Latency cell: 8 wide, "-" when the route had no successful requests."""
+    return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+
+def print_level(result):
+    print(f"\n=== CONCURRENCY {result['concurrency']} ===")
+    print(f"{'route':12} | {'reqs':>6} | {'err':>4} | {'rps':>8} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+    for name, stats in result["routes"].items():
+        lat = stats["latency_ms"]
+        print(
+            f"{name:12} | {stats['requests']:6d} | {stats['errors']:4d} | "
+            f"{stats['throughput_rps']:8.2f} | {format_ms(lat['p50'])} | {format_ms(lat['p95'])} | {format_ms(lat['p99'])}"
+        )
+    print(f"Total: {result['throughput_rps']:.2f} req/s, {result['errors']} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the AI Trading Tutor backend")
+    parser.add_argument("--url", default="", help="Target a running server instead of the offline backend")
+    parser.add_argument("--levels", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per level")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of unrecorded load before the first level")
+    parser.add_argument("--mix", default=",".join(f"{k}={v[0]}" for k, v in ROUTES.items()),
+                        help="Route weights, e.g. backtest=1,explain=2,price-data=5,preview=2")
+    parser.add_argument("--symbols", default=",".join(DEFAULT_SYMBOLS))
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", default="load_test_results.json", help="Where to write JSON results")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    levels = [int(level) for level in args.levels.split(",")]
+
+    stop = None
+    base_url = args.url.rstrip("/")
+    if not base_url:
+        base_url, stop = start_offline_backend()
+        print(f"Started offline backend on {base_url}")
+
+    try:
+        if args.warmup > 0:
+            run_level(base_url, mix, symbols, max(levels), args.warmup, args.timeout, seed=-1)
+
+        results = []
+        for level in levels:
+            result = run_level(base_url, mix, symbols, level, args.duration, args.timeout)
+            print_level(result)
+            results.append(result)
+    finally:
+        if stop is not None:
+            stop()
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "target": args.url or "offline",
+            "mix": mix,
+            "symbols": symbols,
+            "duration_per_level_s": args.duration,
+            "levels": results,
+        }, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
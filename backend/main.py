@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Optional, Any
@@ -6,26 +6,74 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import json
+import os
+import asyncio
+import time
 
 # Import your existing modules
 import sys
 sys.path.append('..')
-from dataset_builder import build_dataset, load_market_data
-from train_trend_model import train_trend_model, FEATURE_COLUMNS
+from dataset_builder import (
+    build_dataset,
+    build_feature_frame,
+    build_feature_tail,
+    load_feature_inputs,
+    load_market_data,
+    CompactDataset,
+    HORIZONS,
+    PREDICTION_HORIZON,
+)
+from train_trend_model import (
+    train_horizon_models,
+    FEATURE_COLUMNS,
+    extract_linear_params,
+    model_version,
+    model_to_arrays,
+    model_from_arrays,
+    predict_bullish_prob,
+)
+from feature_importance import compute_permutation_importance
 from backtest_strategy import (
     backtest_strategy,
+    get_strategy_params,
     calculate_total_return,
     calculate_max_drawdown,
     calculate_sharpe_ratio,
     split_trades,
     average_features,
     find_max_drawdown_period,
+    find_drawdown_periods,
+    trade_range,
     trades_during_period
 )
-from ai_explainer import explain_trade, explain_trade_comparison, explain_max_drawdown
+from run_store import RunStore, RUN_COMPLETE
+from trade_index import TradeSimilarityIndex, TradeTable
+from response_formats import finite_list, negotiated_response
+from market_data import get_downloader
+from jobs import JobManager, JobStore, QueueFull, TERMINAL_STATES
+from shared_cache import get_shared_store, frame_to_arrays, frame_from_arrays
+from profiling import install_profiling
+from portfolio_backtest import (
+    build_signal_matrices,
+    run_portfolio_backtest,
+    portfolio_summary,
+    DEFAULT_MAX_POSITIONS,
+)
+from ai_explainer import (
+    explain_trade,
+    explain_trade_comparison,
+    explain_max_drawdown,
+    explain_drawdown_period,
+    explain_trades_batch,
+    lesson_stats,
+    LESSONS,
+)
 
 app = FastAPI(title="AI Trading Tutor API")
 
+# Opt-in request profiling (TUTOR_PROFILING=1); must precede the routes
+install_profiling(app)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,10 +83,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Cache for model and results
-_cached_model = None
-_cached_backtest_results = None
-_price_cache = {}  # Cache for price data keyed by symbol
+# Per-process caches. Prices, datasets and model parameters are backed by
+# the shared store (shared_cache.py), so these only hold wrappers around
+# arrays every worker maps from the same memory. Each entry records its
+# shared publish time ("created") and is attached again once that is
+# older than the store's TTL.
+_price_cache = {}  # Price frame over shared arrays + created keyed by symbol
+_model_cache = {}  # Fitted models per horizon + compact dataset + version + created keyed by symbol
+_predictor_cache = {}  # Folded params per horizon + newest feature row + created keyed by symbol
+_importance_cache = {}  # Permutation importance keyed by (symbol, model version, n_repeats)
+_run_store = RunStore()  # SQLite history of backtest runs
+_similarity_cache = {}  # TradeSimilarityIndex keyed by run_id or ("all", completed runs version, symbol)
+_trade_set_cache = {}  # Fresh backtest trades + similarity index + created keyed by (symbol, strategy)
+_trade_table_cache = {}  # TradeTable (sorted column indexes) keyed by run_id
+_explanation_cache = {}  # Batch explanations + lesson categories + stats keyed by run_id
+_equity_cache = {}  # Stored equity curve Series + trade entry dates keyed by run_id
+# Jobs run in the worker process that accepted them; their state is
+# mirrored in the run database so every worker can answer for them
+_job_manager = JobManager(
+    max_workers=int(os.environ.get("TUTOR_JOB_WORKERS", "2")),
+    max_queued=int(os.environ.get("TUTOR_JOB_QUEUE", "20")),
+    store=JobStore(_run_store.path),
+)
+
+# Seconds a cached prediction is served before checking for a newer bar
+# (the downloader caches prices for as long, so checks are cheap)
+PREDICTOR_RECHECK = 15 * 60
+
+# Seconds between job store polls when streaming another worker's job
+JOB_POLL_INTERVAL = 0.5
 
 
 class BacktestResponse(BaseModel):
@@ -62,6 +135,31 @@ class FeatureImportanceResponse(BaseModel):
     features: List[Dict[str, float]]
 
 
+class BacktestJobRequest(BaseModel):
+    symbols: List[str] = ["SPY"]
+    strategies: List[str] = ["conservative"]
+    priority: int = 5
+
+
+class PredictBatchRequest(BaseModel):
+    symbols: List[str]
+    strategy: str = "conservative"
+    horizon: int = PREDICTION_HORIZON
+
+
+class WarmupRequest(BaseModel):
+    symbols: List[str]
+    train: bool = False
+
+
+class PortfolioBacktestRequest(BaseModel):
+    symbols: List[str]
+    strategy: str = "conservative"
+    max_positions: int = DEFAULT_MAX_POSITIONS
+    position_fraction: Optional[float] = None
+    include_trades: bool = True
+
+
 def serialize_timestamp(ts):
     """Convert pandas Timestamp to ISO string"""
     if pd.isna(ts):
@@ -82,6 +180,254 @@ def prepare_trade_for_json(trade):
     }
 
 
+def is_fresh(entry):
+    """Whether a per-process cache entry's shared data is still within the TTL."""
+    return entry is not None and get_shared_store().is_fresh(entry["created"])
+
+
+def get_price_frame(symbol):
+    """Daily prices, downloaded by one worker and attached by the others."""
+    if not is_fresh(_price_cache.get(symbol)):
+        arrays, meta = get_shared_store().get_or_create(
+            "prices", symbol.upper(), lambda: frame_to_arrays(load_market_data(symbol))
+        )
+        _price_cache[symbol] = {"frame": frame_from_arrays(arrays, meta), "created": meta["created"]}
+    return _price_cache[symbol]["frame"]
+
+
+def build_symbol_model_arrays(symbol):
+    """
+    Build one symbol's dataset with targets for every horizon, train all
+    horizon models in one pass and flatten everything for the shared store,
+    together with the newest feature row for prediction. Prices are loaded
+    once for both.
+    """
+    prices = load_feature_inputs(symbol)
+    df = build_dataset(symbol, horizons=HORIZONS, prices=prices)
+    models = train_horizon_models(symbol, df, HORIZONS)
+    features = build_feature_frame(symbol, prices=prices)
+
+    arrays = CompactDataset.from_frame(df, symbol).to_arrays()
+    for horizon, model in models.items():
+        arrays.update({f"model_h{horizon}_{name}": values for name, values in model_to_arrays(model).items()})
+    arrays["latest_features"] = features[FEATURE_COLUMNS].to_numpy(dtype=np.float64)[-1]
+    arrays["latest_date"] = features.index.to_numpy()[-1:]
+    arrays["preview_values"] = df[list(PREVIEW_COLUMNS)].to_numpy(dtype=np.float64)[-PREVIEW_MAX_ROWS:]
+    return arrays, {"horizons": list(models)}
+
+
+def get_symbol_model(symbol):
+    """
+    Train once per symbol across all workers; keep the models (one per
+    horizon), the compact dataset and the default model's version. The
+    dataset arrays are read-only shared memmaps.
+    """
+    symbol = symbol.upper()
+    if not is_fresh(_model_cache.get(symbol)):
+        arrays, meta = get_shared_store().get_or_create(
+            "models", symbol, lambda: build_symbol_model_arrays(symbol)
+        )
+        dataset = CompactDataset.from_arrays(arrays, symbol)
+        models = {}
+        for horizon in meta["horizons"]:
+            prefix = f"model_h{horizon}_"
+            models[horizon] = model_from_arrays({
+                name[len(prefix):]: values for name, values in arrays.items() if name.startswith(prefix)
+            })
+        model = models[PREDICTION_HORIZON]
+        _model_cache[symbol] = {
+            "model": model,
+            "models": models,
+            "dataset": dataset,
+            "version": model_version(model),
+            "latest_features": np.array(arrays["latest_features"]),
+            "latest_date": pd.Timestamp(arrays["latest_date"][0]),
+            "preview_values": arrays["preview_values"],
+            "created": meta["created"],
+        }
+    return _model_cache[symbol]
+
+
+def check_horizon(horizon):
+    if horizon not in HORIZONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown horizon {horizon}; available: {', '.join(map(str, HORIZONS))}",
+        )
+
+
+def predictor_is_current(entry):
+    """Whether a cached predictor can be served without checking for a newer bar."""
+    return is_fresh(entry) and time.time() - entry["checked"] < PREDICTOR_RECHECK
+
+
+def get_predictor(symbol):
+    """
+    Keep only what inference needs: the folded linear params of every
+    horizon and the newest feature row (as float64, FEATURE_COLUMNS order).
+
+    The row built with the model is used at first; every PREDICTOR_RECHECK
+    seconds the prices are loaded again, so a new trading day's bar
+    replaces it.
+    """
+    symbol = symbol.upper()
+    cached = _predictor_cache.get(symbol)
+    if not predictor_is_current(cached):
+        entry = get_symbol_model(symbol)
+        features, date = entry["latest_features"], entry["latest_date"]
+
+        if time.time() - entry["created"] >= PREDICTOR_RECHECK:
+            frame = build_feature_frame(symbol)
+            if frame.index[-1] > date:
+                features = frame[FEATURE_COLUMNS].to_numpy(dtype=np.float64)[-1]
+                date = frame.index[-1]
+
+        if cached is not None and cached["created"] == entry["created"] and cached["date"] == date:
+            # Same model and bar: keep the folded params, just note the check
+            cached["checked"] = time.time()
+        else:
+            _predictor_cache[symbol] = {
+                "params": {h: extract_linear_params(m) for h, m in entry["models"].items()},
+                "features": features,
+                "volatility_20d": float(features[FEATURE_COLUMNS.index("volatility_20d")]),
+                "date": date,
+                "created": entry["created"],
+                "checked": time.time(),
+            }
+    return _predictor_cache[symbol]
+
+
+def strategy_decision(prob, volatility, strategy="conservative"):
+    """Entry decision for a fresh signal (ignores open positions/cooldown)."""
+    params = get_strategy_params(strategy)
+    if volatility >= params["volatility_limit"]:
+        return "no_entry_volatility"
+    if prob >= params["threshold"]:
+        return "enter_long"
+    return "no_entry"
+
+
+def load_symbols(symbols, load):
+    """
+    Call load(symbol) for each symbol, collecting failures instead of
+    failing the whole batch.
+
+    Returns ({symbol: result}, {symbol: error message}), keyed by upper-case symbol.
+    """
+    loaded, errors = {}, {}
+    for symbol in dict.fromkeys(s.upper() for s in symbols):
+        try:
+            loaded[symbol] = load(symbol)
+        except Exception as e:
+            errors[symbol] = str(e)
+    return loaded, errors
+
+
+def download_errors(symbols, needs_benchmark=True):
+    """
+    Bulk-download symbols plus the SPY benchmark; {symbol: error message}
+    for those that failed. With needs_benchmark (features or models are
+    built next) a failed SPY download fails every symbol, rather than
+    each one retrying it.
+    """
+    _, failed = get_downloader().get_available(list(symbols) + ["SPY"])
+    errors = {symbol: str(error) for symbol, error in failed.items()}
+    if needs_benchmark and "SPY" in errors:
+        errors.update({s.upper(): f"Benchmark SPY: {errors['SPY']}" for s in symbols if s.upper() not in errors})
+    return {s.upper(): errors[s.upper()] for s in symbols if s.upper() in errors}
+
+
+def predict_symbols(symbols, strategy="conservative", horizon=PREDICTION_HORIZON):
+    """
+    Score the newest feature row of each symbol in one fused pass. A symbol
+    that cannot be loaded gets {"symbol", "error"} instead of failing the batch.
+    """
+    # One bulk download for every symbol not loaded yet (plus the benchmark)
+    missing = [s for s in symbols if not predictor_is_current(_predictor_cache.get(s.upper()))]
+    errors = download_errors(missing) if missing else {}
+
+    loaded, load_errors = load_symbols([s for s in symbols if s.upper() not in errors], get_predictor)
+    errors.update(load_errors)
+
+    predictions = []
+    if loaded:
+        predictors = list(loaded.values())
+        X = np.stack([p["features"] for p in predictors])
+        W = np.stack([p["params"][horizon]["weights"] for p in predictors])
+        b = np.array([p["params"][horizon]["bias"] for p in predictors])
+
+        # Row-wise dot product: each symbol against its own model
+        probs = 1.0 / (1.0 + np.exp(-(np.einsum("ij,ij->i", X, W) + b)))
+
+        params = get_strategy_params(strategy)
+        for symbol, p, prob in zip(loaded, predictors, probs):
+            predictions.append({
+                "symbol": symbol,
+                "date": serialize_timestamp(p["date"]),
+                "bullish_prob": float(prob),
+                "horizon": horizon,
+                "volatility_20d": p["volatility_20d"],
+                "threshold": params["threshold"],
+                "decision": strategy_decision(prob, p["volatility_20d"], strategy),
+            })
+    predictions += [{"symbol": symbol, "error": error} for symbol, error in errors.items()]
+    return predictions
+
+
+def get_similarity_index(run_id=None, symbol=None):
+    """
+    Similarity index for one stored run (None if it does not exist), or
+    for every stored trade (optionally one symbol) when run_id is None.
+    Built once and cached; the cross-run index is rebuilt only after runs
+    are saved or finish, replacing the previous one. Runs that are still
+    running (or failed) are indexed but not cached.
+    """
+    if run_id is not None:
+        key = run_id
+    else:
+        key = ("all", _run_store.completed_runs_version(), (symbol or "").upper())
+
+    index = _similarity_cache.get(key)
+    if index is None:
+        if run_id is not None:
+            status = _run_store.run_status(run_id)
+            if status is None:
+                return None
+            trades = _run_store.get_trades(run_id)
+            for trade in trades:
+                trade["run_id"] = run_id
+        else:
+            trades = _run_store.all_trades(symbol=symbol)
+        refs = [(t["run_id"], t["trade_index"]) for t in trades]
+        index = TradeSimilarityIndex(trades, refs=refs)
+
+        if run_id is None:
+            # Only the index over the current set of runs is ever queried again
+            for stale in [k for k in _similarity_cache if isinstance(k, tuple) and k[2] == key[2]]:
+                del _similarity_cache[stale]
+            _similarity_cache[key] = index
+        elif status == RUN_COMPLETE:
+            _similarity_cache[key] = index
+
+    return index
+
+
+def get_trade_set(symbol, strategy):
+    """
+    Trades of a fresh backtest plus their similarity index, reused for the
+    shared store's TTL instead of re-running the backtest per request.
+    """
+    key = (symbol.upper(), strategy)
+    if not is_fresh(_trade_set_cache.get(key)):
+        _, trades = backtest_strategy(strategy_type=strategy, symbol=symbol)
+        _trade_set_cache[key] = {
+            "trades": trades,
+            "index": TradeSimilarityIndex(trades),
+            "created": time.time(),
+        }
+    return _trade_set_cache[key]
+
+
 @app.get("/")
 def read_root():
     return {
@@ -91,9 +437,115 @@ def read_root():
     }
 
 
+def equity_curve_records(date, equity, buy_hold):
+    """JSON equity curve rows from aligned NumPy columns."""
+    return [
+        {"date": date, "equity": e, "buy_hold": b}
+        for date, e, b in zip(
+            [ts.isoformat() for ts in pd.DatetimeIndex(date)],
+            finite_list(equity),
+            finite_list(buy_hold),
+        )
+    ]
+
+
+def run_backtest_report(strategy="conservative", symbol="SPY", persist=True, include_trades=True):
+    """
+    Run a backtest and assemble everything /api/backtest returns.
+
+    Returns (response without "equity_curve", equity curve columns as NumPy arrays).
+    """
+    results, trades = backtest_strategy(strategy_type=strategy, symbol=symbol)
+    equity = results["equity"]
+
+    print(f"\n✅ Backtest completed!")
+    print(f"   - Number of trades: {len(trades)}")
+    print(f"   - Final equity: ${equity.iloc[-1]:.2f}\n")
+
+    # Calculate metrics
+    total_return = calculate_total_return(equity)
+    max_drawdown = calculate_max_drawdown(equity)
+    sharpe = calculate_sharpe_ratio(equity)
+
+    # Buy & Hold comparison
+    buy_hold = (results["Close"] / results["Close"].iloc[0]) * 10_000
+    buy_hold_return = calculate_total_return(buy_hold)
+    buy_hold_dd = calculate_max_drawdown(buy_hold)
+    buy_hold_sharpe = calculate_sharpe_ratio(buy_hold)
+
+    # Equity curve kept columnar; JSON rows are built only when needed
+    columns = {
+        "date": equity.index.to_numpy(dtype="datetime64[ns]"),
+        "equity": equity.to_numpy(dtype=np.float64),
+        "buy_hold": buy_hold.to_numpy(dtype=np.float64),
+    }
+
+    # Split winning/losing trades
+    winning, losing = split_trades(trades)
+
+    # Average features
+    win_avg = average_features(winning) if winning else {}
+    lose_avg = average_features(losing) if losing else {}
+
+    feature_comparison = {}
+    for key in win_avg:
+        feature_comparison[key] = {
+            "winning": float(win_avg[key]),
+            "losing": float(lose_avg[key]) if key in lose_avg else 0.0
+        }
+
+    # Max drawdown explanation
+    peak, trough, dd_value = find_max_drawdown_period(equity)
+    dd_trades = trades_during_period(trades, peak, trough)
+    max_dd_explanation = explain_max_drawdown(peak, trough, dd_value, dd_trades)
+
+    # Prepare trades for JSON
+    json_trades = [prepare_trade_for_json(t) for t in trades]
+
+    response = {
+        "metrics": {
+            "total_return": float(total_return),
+            "max_drawdown": float(max_drawdown),
+            "sharpe_ratio": float(sharpe),
+            "num_trades": len(trades)
+        },
+        "trades": json_trades if include_trades else [],
+        "winning_trades": len(winning),
+        "losing_trades": len(losing),
+        "feature_comparison": feature_comparison,
+        "max_drawdown_explanation": max_dd_explanation,
+        "buy_hold_metrics": {
+            "total_return": float(buy_hold_return),
+            "max_drawdown": float(buy_hold_dd),
+            "sharpe_ratio": float(buy_hold_sharpe)
+        },
+        "strategy_type": strategy,
+        "symbol": symbol
+    }
+
+    if persist:
+        response["run_id"] = _run_store.save_run(
+            symbol,
+            strategy,
+            response["metrics"],
+            response["buy_hold_metrics"],
+            equity_curve_records(**columns),
+            json_trades,
+            winning_trades=len(winning),
+            losing_trades=len(losing),
+        )
+
+    return response, columns
+
+
 @app.get("/api/backtest")
-def get_backtest_results(strategy: str = "conservative", symbol: str = "SPY"):
-    """Run backtest and return all results as JSON"""
+def get_backtest_results(request: Request, strategy: str = "conservative", symbol: str = "SPY",
+                         persist: bool = False, include_trades: bool = True):
+    """
+    Run backtest and return all results. JSON by default; the equity curve
+    can also be sent as Arrow IPC / columnar binary (see response_formats).
+    persist=true also stores the run (see /api/runs) and returns its run_id.
+    """
     
     # DEBUG PRINTS
     print("\n" + "="*60)
@@ -105,78 +557,15 @@ def get_backtest_results(strategy: str = "conservative", symbol: str = "SPY"):
     try:
         # Run backtest with specified strategy and symbol
         print(f"🚀 Calling backtest_strategy(strategy_type='{strategy}', symbol='{symbol}')")
-        results, trades = backtest_strategy(strategy_type=strategy, symbol=symbol)
-        equity = results["equity"]
-        
-        print(f"\n✅ Backtest completed!")
-        print(f"   - Number of trades: {len(trades)}")
-        print(f"   - Final equity: ${equity.iloc[-1]:.2f}\n")
-        
-        # Calculate metrics
-        total_return = calculate_total_return(equity)
-        max_drawdown = calculate_max_drawdown(equity)
-        sharpe = calculate_sharpe_ratio(equity)
-        
-        # Buy & Hold comparison
-        buy_hold = (results["Close"] / results["Close"].iloc[0]) * 10_000
-        buy_hold_return = calculate_total_return(buy_hold)
-        buy_hold_dd = calculate_max_drawdown(buy_hold)
-        buy_hold_sharpe = calculate_sharpe_ratio(buy_hold)
-        
-        # Prepare equity curve data
-        equity_curve = []
-        for date, value in equity.items():
-            equity_curve.append({
-                "date": serialize_timestamp(date),
-                "equity": float(value),
-                "buy_hold": float(buy_hold.loc[date])
-            })
-        
-        # Split winning/losing trades
-        winning, losing = split_trades(trades)
-        
-        # Average features
-        win_avg = average_features(winning) if winning else {}
-        lose_avg = average_features(losing) if losing else {}
-        
-        feature_comparison = {}
-        for key in win_avg:
-            feature_comparison[key] = {
-                "winning": float(win_avg[key]),
-                "losing": float(lose_avg[key]) if key in lose_avg else 0.0
-            }
-        
-        # Max drawdown explanation
-        peak, trough, dd_value = find_max_drawdown_period(equity)
-        dd_trades = trades_during_period(trades, peak, trough)
-        max_dd_explanation = explain_max_drawdown(peak, trough, dd_value, dd_trades)
-        
-        # Prepare trades for JSON
-        json_trades = [prepare_trade_for_json(t) for t in trades]
-        
-        response = {
-            "equity_curve": equity_curve,
-            "metrics": {
-                "total_return": float(total_return),
-                "max_drawdown": float(max_drawdown),
-                "sharpe_ratio": float(sharpe),
-                "num_trades": len(trades)
-            },
-            "trades": json_trades,
-            "winning_trades": len(winning),
-            "losing_trades": len(losing),
-            "feature_comparison": feature_comparison,
-            "max_drawdown_explanation": max_dd_explanation,
-            "buy_hold_metrics": {
-                "total_return": float(buy_hold_return),
-                "max_drawdown": float(buy_hold_dd),
-                "sharpe_ratio": float(buy_hold_sharpe)
-            },
-            "strategy_type": strategy,
-            "symbol": symbol
-        }
-        
-        return response
+        response, columns = run_backtest_report(strategy, symbol, persist, include_trades)
+
+        return negotiated_response(
+            request,
+            response,
+            "equity_curve",
+            columns,
+            lambda: equity_curve_records(**columns),
+        )
         
     except Exception as e:
         print(f"❌ ERROR: {str(e)}")
@@ -185,6 +574,445 @@ def get_backtest_results(strategy: str = "conservative", symbol: str = "SPY"):
         raise HTTPException(status_code=500, detail=f"Backtest failed: {str(e)}")
     
 
+def backtest_job(job, symbols, strategies):
+    """Background job: backtest every symbol x strategy, reporting after each run."""
+    combos = [(symbol, strategy) for symbol in symbols for strategy in strategies]
+    runs = []
+
+    for i, (symbol, strategy) in enumerate(combos):
+        job.report(f"backtest {symbol} / {strategy}", 100.0 * i / len(combos))
+
+        response, _ = run_backtest_report(strategy, symbol, persist=True, include_trades=False)
+        summary = {
+            "symbol": symbol,
+            "strategy": strategy,
+            "run_id": response.get("run_id"),
+            "metrics": response["metrics"],
+            "buy_hold_metrics": response["buy_hold_metrics"],
+        }
+        runs.append(summary)
+
+        job.report(f"finished {symbol} / {strategy}", 100.0 * (i + 1) / len(combos), **summary)
+
+    return {"runs": runs}
+
+
+_job_manager.register("backtest", backtest_job)
+
+
+@app.post("/api/jobs")
+def submit_job(request: BacktestJobRequest):
+    """Queue a multi-symbol / multi-strategy backtest; returns a job ID immediately"""
+    if not request.symbols or not request.strategies:
+        raise HTTPException(status_code=400, detail="symbols and strategies must not be empty")
+    try:
+        job = _job_manager.submit(
+            "backtest",
+            {"symbols": request.symbols, "strategies": request.strategies},
+            priority=request.priority,
+        )
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Too many queued jobs, try again later")
+
+    return {"job_id": job.job_id, "status": job.status}
+
+
+@app.get("/api/jobs")
+def list_jobs():
+    """List recent jobs"""
+    return {"jobs": _job_manager.list()}
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """Current status, progress and (when done) result of a job"""
+    snapshot = _job_manager.snapshot(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return snapshot
+
+
+@app.delete("/api/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued job, or stop a running one after its current step"""
+    snapshot = _job_manager.cancel(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": snapshot["job_id"], "status": snapshot["status"]}
+
+
+@app.websocket("/ws/jobs/{job_id}")
+async def stream_job(websocket: WebSocket, job_id: str):
+    """Stream a job's progress events until it finishes"""
+    await websocket.accept()
+
+    job = _job_manager.get(job_id)
+    if job is None:
+        # Running in another worker process (or unknown): follow the store
+        await stream_stored_job(websocket, job_id)
+        return
+
+    queue = _job_manager.subscribe(job_id, asyncio.get_running_loop())
+    try:
+        # Current state first, so late subscribers still see where the job is
+        await websocket.send_json({"type": "snapshot", **job.snapshot()})
+        if job.status in TERMINAL_STATES:
+            return
+
+        while True:
+            event = await queue.get()
+            await websocket.send_json(event)
+            if event["type"] in TERMINAL_STATES:
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _job_manager.unsubscribe(job_id, queue)
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
+
+
+async def stream_stored_job(websocket, job_id):
+    """Poll the job store and send an event whenever the job's state changes."""
+    try:
+        snapshot = await asyncio.to_thread(_job_manager.snapshot, job_id)
+        if snapshot is None:
+            await websocket.send_json({"type": "error", "detail": "Job not found"})
+            return
+
+        await websocket.send_json({"type": "snapshot", **snapshot})
+        seen = len(snapshot["partial"])
+        state = (snapshot["status"], snapshot["stage"], snapshot["percent"])
+        while snapshot["status"] not in TERMINAL_STATES:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            snapshot = await asyncio.to_thread(_job_manager.snapshot, job_id)
+            if snapshot is None:
+                break
+
+            for partial in snapshot["partial"][seen:]:
+                await websocket.send_json({
+                    "job_id": job_id, "status": snapshot["status"], "type": "progress",
+                    "stage": snapshot["stage"], "percent": snapshot["percent"], "partial": partial,
+                })
+            seen = len(snapshot["partial"])
+
+            current = (snapshot["status"], snapshot["stage"], snapshot["percent"])
+            if current != state:
+                state = current
+                await websocket.send_json({
+                    "job_id": job_id, "status": snapshot["status"],
+                    "type": snapshot["status"] if snapshot["status"] in TERMINAL_STATES else "progress",
+                    "stage": snapshot["stage"], "percent": snapshot["percent"], "partial": None,
+                })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
+
+
+@app.get("/api/runs")
+def list_runs(symbol: str = "", strategy: str = "", since: str = "", until: str = "", limit: int = 50,
+              status: str = RUN_COMPLETE):
+    """
+    List stored backtest runs, newest first. Only complete runs by default;
+    status=running / failed shows chunked runs, status= (empty) every run.
+    """
+    try:
+        runs = _run_store.list_runs(
+            symbol=symbol or None,
+            strategy=strategy or None,
+            since=since or None,
+            until=until or None,
+            limit=limit,
+            status=status or None,
+        )
+        return {"runs": runs}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Listing runs failed: {str(e)}")
+
+
+@app.get("/api/runs/diff")
+def diff_runs(a: int, b: int):
+    """Compare metrics and trades of two stored runs"""
+    try:
+        diff = _run_store.diff_runs(a, b)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Run diff failed: {str(e)}")
+
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return diff
+
+
+def parse_range_filters(filters, start="", end=""):
+    """
+    Turn repeated `filter=column:min:max` params (either bound may be
+    empty) plus entry-date start/end into {column: (low, high)}.
+    """
+    ranges = {}
+    for item in filters:
+        parts = item.split(":")
+        if len(parts) != 3:
+            raise ValueError(f"Bad filter '{item}', expected column:min:max")
+        column, low, high = parts
+        ranges[column] = (low or None, high or None)
+
+    if start or end:
+        ranges["entry_date"] = (start or None, end or None)
+    return ranges
+
+
+@app.get("/api/runs/{run_id}/trades")
+def query_run_trades(
+    run_id: int,
+    sort: str = "entry_date",
+    order: str = "asc",
+    page: int = 1,
+    page_size: int = 50,
+    start: str = "",
+    end: str = "",
+    filter: List[str] = Query([]),
+):
+    """
+    Page through a stored run's trades with sorting (any column, e.g. pnl,
+    entry_date, bullish_prob) and range filters, e.g. filter=rsi:30:70.
+    Rows are flat: features are inlined next to the trade fields.
+    """
+    if page < 1 or page_size < 1:
+        raise HTTPException(status_code=400, detail="page and page_size must be positive")
+    if sort == "date":
+        sort = "entry_date"
+    if sort == "prob":
+        sort = "bullish_prob"
+
+    try:
+        table = _trade_table_cache.get(run_id)
+        if table is None:
+            status = _run_store.run_status(run_id)
+            if status is None:
+                raise HTTPException(status_code=404, detail="Run not found")
+            table = TradeTable(_run_store.get_trades(run_id))
+            # Chunked runs still appending (or failed) may change; cache complete ones only
+            if status == RUN_COMPLETE:
+                _trade_table_cache[run_id] = table
+
+        total, positions = table.query(
+            sort_by=sort,
+            descending=order == "desc",
+            filters=parse_range_filters(filter, start, end),
+            offset=(page - 1) * page_size,
+            limit=page_size,
+        )
+
+        rows = []
+        for position in positions:
+            trade = table.trades[position]
+            row = {key: trade[key] for key in ["trade_index"] + TradeTable.BASE_COLUMNS}
+            row.update(trade["features"])
+            rows.append(row)
+
+        return {
+            "run_id": run_id,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "trades": rows,
+        }
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Trade query failed: {str(e)}")
+
+
+def get_run_explanations(run_id):
+    """
+    All explanations of a stored run, rendered in one batch on first use.
+    Complete runs are immutable, so their entry never goes stale; runs
+    still running (or failed) are rendered on every call.
+    """
+    cached = _explanation_cache.get(run_id)
+    if cached is None:
+        status = _run_store.run_status(run_id)
+        if status is None:
+            return None
+
+        trades = _run_store.get_trades(run_id)
+        explanations, categories = explain_trades_batch(trades)
+        cached = {
+            "trades": trades,
+            "explanations": explanations,
+            "categories": categories,
+            "stats": lesson_stats(categories, [t["pnl"] for t in trades]),
+            "status": status,
+        }
+        if status == RUN_COMPLETE:
+            _explanation_cache[run_id] = cached
+    return cached
+
+
+@app.get("/api/runs/{run_id}/explanations")
+def run_explanations(run_id: int, category: str = "", page: int = 1, page_size: int = 50):
+    """
+    Explanations for every trade of a stored run, optionally limited to
+    one lesson category (e.g. overbought, weak_signal).
+    """
+    if page < 1 or page_size < 1:
+        raise HTTPException(status_code=400, detail="page and page_size must be positive")
+    if category and category not in LESSONS:
+        raise HTTPException(status_code=400, detail=f"Unknown category '{category}', expected one of {list(LESSONS)}")
+
+    try:
+        cached = get_run_explanations(run_id)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Run not found")
+
+        categories = cached["categories"]
+        positions = np.flatnonzero(categories == category) if category else np.arange(len(categories))
+        offset = (page - 1) * page_size
+
+        items = []
+        for position in positions[offset:offset + page_size].tolist():
+            trade = cached["trades"][position]
+            items.append({
+                "trade_index": trade["trade_index"],
+                "entry_date": trade["entry_date"],
+                "exit_date": trade["exit_date"],
+                "pnl": trade["pnl"],
+                "bullish_prob": trade["bullish_prob"],
+                "category": categories[position],
+                "explanation": cached["explanations"][position],
+            })
+
+        return {
+            "run_id": run_id,
+            "category": category or None,
+            "total": len(positions),
+            "page": page,
+            "page_size": page_size,
+            "explanations": items,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Explanations failed: {str(e)}")
+
+
+@app.get("/api/runs/{run_id}/explanations/stats")
+def run_explanation_stats(run_id: int):
+    """Count, win rate and average return per lesson category for a stored run"""
+    try:
+        cached = get_run_explanations(run_id)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Run not found")
+        return {
+            "run_id": run_id,
+            "total_trades": len(cached["trades"]),
+            "categories": cached["stats"],
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Explanation stats failed: {str(e)}")
+
+
+@app.get("/api/runs/{run_id}/drawdowns")
+def run_drawdowns(run_id: int, top: int = 5, include_trades: bool = True):
+    """
+    The `top` deepest drawdown episodes of a stored run (peak, trough,
+    recovery, depth, duration), each with an explanation and the trades
+    entered between its peak and trough.
+    """
+    if top < 1:
+        raise HTTPException(status_code=400, detail="top must be positive")
+
+    try:
+        cached = get_run_explanations(run_id)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Run not found")
+
+        stored = _equity_cache.get(run_id)
+        if stored is None:
+            run = _run_store.get_run(run_id, include_equity=True, include_trades=False)
+            curve = run["equity_curve"]
+            stored = {
+                "equity": pd.Series(
+                    [p["equity"] for p in curve],
+                    index=pd.DatetimeIndex([p["date"] for p in curve]),
+                    dtype=float,
+                ),
+                "entry_dates": [t["entry_date"] for t in cached["trades"]],
+            }
+            if cached["status"] == RUN_COMPLETE:
+                _equity_cache[run_id] = stored
+        equity = stored["equity"]
+        entry_dates = stored["entry_dates"]
+
+        periods = []
+        for rank, period in enumerate(find_drawdown_periods(equity, top=top), start=1):
+            # Stored trade dates are ISO strings, so bisect with ISO bounds
+            lo, hi = trade_range(entry_dates, period["peak_date"].isoformat(), period["trough_date"].isoformat())
+            trades = cached["trades"][lo:hi]
+
+            item = {
+                "rank": rank,
+                "peak_date": period["peak_date"].isoformat(),
+                "trough_date": period["trough_date"].isoformat(),
+                "recovery_date": period["recovery_date"].isoformat() if period["recovery_date"] is not None else None,
+                "depth": period["depth"],
+                "bars_to_trough": period["bars_to_trough"],
+                "bars_to_recovery": period["bars_to_recovery"],
+                "duration_bars": period["duration_bars"],
+                "num_trades": hi - lo,
+                "winning_trades": sum(1 for t in trades if t["pnl"] > 0),
+                "explanation": explain_drawdown_period(period, trades, rank),
+            }
+            if include_trades:
+                item["trades"] = [
+                    {
+                        "trade_index": trade["trade_index"],
+                        "entry_date": trade["entry_date"],
+                        "exit_date": trade["exit_date"],
+                        "pnl": trade["pnl"],
+                        "bullish_prob": trade["bullish_prob"],
+                        "category": cached["categories"][position],
+                        "explanation": cached["explanations"][position],
+                    }
+                    for position, trade in enumerate(trades, start=lo)
+                ]
+            periods.append(item)
+
+        return {"run_id": run_id, "drawdowns": periods}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Drawdown analysis failed: {str(e)}")
+
+
+@app.get("/api/runs/{run_id}")
+def get_run(run_id: int, include_equity: bool = True, include_trades: bool = True):
+    """Get a stored backtest run without recomputing it"""
+    try:
+        run = _run_store.get_run(run_id, include_equity=include_equity, include_trades=include_trades)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Loading run failed: {str(e)}")
+
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
+
+
 @app.get("/api/trades/{trade_index}/explain")
 def explain_specific_trade(trade_index: int, strategy: str = "conservative", symbol: str = "SPY"):
     """Get AI explanation for a specific trade"""
@@ -209,20 +1037,40 @@ def explain_specific_trade(trade_index: int, strategy: str = "conservative", sym
 
 
 @app.get("/api/trades/compare")
-def compare_trades():
-    """Compare a winning trade vs a losing trade"""
+def compare_trades(strategy: str = "conservative", symbol: str = "SPY", trade_index: Optional[int] = None):
+    """
+    Compare a winning trade vs a losing trade. With trade_index, the chosen
+    trade is paired with its nearest neighbour of the opposite outcome;
+    otherwise the most similar win/loss pair of the run is used.
+    """
     try:
-        results, trades = backtest_strategy(strategy_type="conservative")
-        winning, losing = split_trades(trades)
-        
-        if not winning or not losing:
-            raise HTTPException(status_code=404, detail="Not enough trades to compare")
-        
-        comparison = explain_trade_comparison(winning[0], losing[0])
+        trade_set = get_trade_set(symbol, strategy)
+        trades, index = trade_set["trades"], trade_set["index"]
+
+        if trade_index is not None:
+            if trade_index < 0 or trade_index >= len(trades):
+                raise HTTPException(status_code=404, detail="Trade not found")
+
+            neighbours = index.query_position(trade_index, k=1)
+            chosen_won = trades[trade_index]["pnl"] > 0
+            opposite = neighbours["losing" if chosen_won else "winning"]
+            if not opposite:
+                raise HTTPException(status_code=404, detail="Not enough trades to compare")
+
+            pair = (trade_index, opposite[0]["position"])
+            if not chosen_won:
+                pair = pair[::-1]
+        else:
+            pair = index.closest_pair()
+            if pair is None:
+                raise HTTPException(status_code=404, detail="Not enough trades to compare")
+
+        win_trade, lose_trade = trades[pair[0]], trades[pair[1]]
+        comparison = explain_trade_comparison(win_trade, lose_trade)
         
         return {
-            "winning_trade": prepare_trade_for_json(winning[0]),
-            "losing_trade": prepare_trade_for_json(losing[0]),
+            "winning_trade": prepare_trade_for_json(win_trade),
+            "losing_trade": prepare_trade_for_json(lose_trade),
             "comparison": comparison
         }
         
@@ -232,88 +1080,367 @@ def compare_trades():
         raise HTTPException(status_code=500, detail=f"Comparison failed: {str(e)}")
 
 
+@app.get("/api/trades/similar")
+def get_similar_trades(run_id: int, trade_index: int, k: int = 5, scope: str = "run", symbol: str = ""):
+    """
+    k most similar winning and losing trades to a stored trade.
+
+    scope="run" searches the trade's own run; scope="all" searches every
+    stored run (optionally only `symbol`).
+    """
+    try:
+        run_index = get_similarity_index(run_id)
+        if run_index is None:
+            raise HTTPException(status_code=404, detail="Run not found")
+        if trade_index < 0 or trade_index >= len(run_index):
+            raise HTTPException(status_code=404, detail="Trade not found")
+
+        if scope == "all":
+            index = get_similarity_index(symbol=symbol or None)
+            position = index.ref_positions.get((run_id, trade_index))
+            if position is not None:
+                neighbours = index.query_position(position, k=k)
+            else:
+                neighbours = index.query(run_index.trades[trade_index]["features"], k=k)
+        else:
+            index = run_index
+            neighbours = index.query_position(trade_index, k=k)
+
+        def describe(match):
+            trade = index.trades[match["position"]]
+            return {
+                "run_id": trade["run_id"],
+                "trade_index": trade["trade_index"],
+                "symbol": trade.get("symbol"),
+                "strategy": trade.get("strategy"),
+                "distance": match["distance"],
+                "trade": {key: trade[key] for key in (
+                    "entry_date", "exit_date", "entry_price", "exit_price",
+                    "pnl", "bullish_prob", "features",
+                )},
+            }
+
+        return {
+            "trade": run_index.trades[trade_index],
+            "scope": scope,
+            "indexed_trades": len(index),
+            "winning": [describe(m) for m in neighbours["winning"]],
+            "losing": [describe(m) for m in neighbours["losing"]],
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Similarity search failed: {str(e)}")
+
+
 @app.get("/api/feature-importance")
-def get_feature_importance():
-    """Get feature importance from the trained model"""
+def get_feature_importance(symbol: str = "SPY", n_repeats: int = Query(10, ge=1, le=50)):
+    """
+    Out-of-sample permutation importance for a symbol's model, alongside the
+    raw logistic coefficients. Cached per model version.
+    """
     try:
-        model = train_trend_model()
-        clf = model.named_steps["clf"]
-        coefficients = clf.coef_[0]
-        
-        features = []
-        for i, feature_name in enumerate(FEATURE_COLUMNS):
-            features.append({
-                "name": feature_name,
-                "coefficient": float(coefficients[i]),
-                "abs_importance": float(abs(coefficients[i]))
-            })
-        
-        # Sort by absolute importance
-        features.sort(key=lambda x: x["abs_importance"], reverse=True)
-        
-        return {"features": features}
+        entry = get_symbol_model(symbol)
+        model = entry["model"]
+        cache_key = (symbol.upper(), entry["version"], n_repeats)
+
+        if cache_key not in _importance_cache:
+            importance = compute_permutation_importance(
+                model, entry["dataset"].to_frame(), n_repeats=n_repeats
+            )
+            coefficients = model.named_steps["clf"].coef_[0]
+
+            features = []
+            for i, item in enumerate(importance):
+                features.append({
+                    "name": item["name"],
+                    "coefficient": float(coefficients[i]),
+                    "abs_importance": float(abs(coefficients[i])),
+                    "permutation_importance": item["importance_mean"],
+                    "permutation_std": item["importance_std"],
+                })
+
+            # Sort by out-of-sample importance
+            features.sort(key=lambda x: x["permutation_importance"], reverse=True)
+            _importance_cache[cache_key] = features
+
+        return {
+            "features": _importance_cache[cache_key],
+            "symbol": symbol.upper(),
+            "model_version": entry["version"],
+        }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Feature importance calculation failed: {str(e)}")
 
 
+PREVIEW_COLUMNS = {
+    "Close": "close",
+    "return_5d": "return_5d",
+    "return_20d": "return_20d",
+    "ma_ratio": "ma_ratio",
+    "rsi": "rsi",
+    "volatility_20d": "volatility_20d",
+}
+
+# Indicators the preview shows; a tail-only preview computes just these
+PREVIEW_FEATURES = [col for col in PREVIEW_COLUMNS if col != "Close"]
+
+# Trailing float64 preview rows kept with each symbol's cached model
+PREVIEW_MAX_ROWS = 250
+
+# Preview values are rounded to this many significant digits, so the cached
+# and the trailing-window computation (whose rolling sums start at different
+# bars and differ in the last bits) serve the same numbers
+PREVIEW_DIGITS = 8
+
+
+def round_significant(values, digits=PREVIEW_DIGITS):
+    """Round a float array to `digits` significant digits (NaN, inf and 0 unchanged)."""
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values) & (values != 0)
+    magnitude = np.floor(np.log10(np.abs(values, where=finite, out=np.ones_like(values))))
+    scale = 10.0 ** (digits - 1 - magnitude)
+    return np.where(finite, np.round(values * scale) / scale, values)
+
+
+def columns_to_records(index, columns):
+    """
+    Vectorized NaN-safe row serialization.
+
+    Args:
+        index: DatetimeIndex for the "date" field
+        columns: {output name: 1-D array}
+    """
+    dates = [ts.isoformat() for ts in index]
+    # NaN -> None in one pass instead of a pd.isna check per cell
+    values = {name: finite_list(np.asarray(column, dtype=np.float64)) for name, column in columns.items()}
+
+    return [
+        {"date": date, **{name: values[name][i] for name in values}}
+        for i, date in enumerate(dates)
+    ]
+
+
 @app.get("/api/dataset/preview")
-def get_dataset_preview(rows: int = 10):
-    """Get a preview of the dataset"""
+def get_dataset_preview(request: Request, rows: int = Query(10, ge=1, le=PREVIEW_MAX_ROWS), symbol: str = "SPY"):
+    """
+    Get a preview of the dataset. Served from the rows cached with the
+    symbol's model when it is already loaded, otherwise computed over just
+    the trailing window the indicators need.
+
+    Both paths return the same fields and the same float64 values, rounded
+    to PREVIEW_DIGITS significant digits. total_rows and date_range
+    describe the full dataset and are null when source is "tail".
+    """
     try:
-        df = build_dataset()
-        
-        # Get last N rows
-        preview_df = df.tail(rows)
-        
-        data = []
-        for date, row in preview_df.iterrows():
-            data.append({
-                "date": serialize_timestamp(date),
-                "close": float(row["Close"]),
-                "return_5d": float(row["return_5d"]) if not pd.isna(row["return_5d"]) else None,
-                "return_20d": float(row["return_20d"]) if not pd.isna(row["return_20d"]) else None,
-                "ma_ratio": float(row["ma_ratio"]) if not pd.isna(row["ma_ratio"]) else None,
-                "rsi": float(row["rsi"]) if not pd.isna(row["rsi"]) else None,
-                "volatility_20d": float(row["volatility_20d"]) if not pd.isna(row["volatility_20d"]) else None,
-            })
-        
-        return {
-            "data": data,
-            "total_rows": len(df),
-            "date_range": {
-                "start": serialize_timestamp(df.index[0]),
-                "end": serialize_timestamp(df.index[-1])
+        cached = _model_cache.get(symbol.upper())
+
+        if is_fresh(cached):
+            dataset = cached["dataset"]
+            # float64 rows kept with the model, not the float32 compact block
+            values = cached["preview_values"][-rows:]
+            dates = dataset.index[len(dataset) - len(values):]
+            columns = {out: values[:, j] for j, out in enumerate(PREVIEW_COLUMNS.values())}
+            total_rows = len(dataset)
+            date_range = {
+                "start": serialize_timestamp(dataset.index[0]),
+                "end": serialize_timestamp(dataset.index[-1])
             }
+            source = "cache"
+        else:
+            tail = build_feature_tail(symbol, rows, PREVIEW_FEATURES)
+            dates = tail.index
+            columns = {out: tail[col].to_numpy() for col, out in PREVIEW_COLUMNS.items()}
+            # Full history was never loaded, so its size and range are unknown
+            total_rows = None
+            date_range = None
+            source = "tail"
+
+        columns = {out: round_significant(column) for out, column in columns.items()}
+        payload = {
+            "total_rows": total_rows,
+            "date_range": date_range,
+            "symbol": symbol.upper(),
+            "source": source,
         }
+
+        return negotiated_response(
+            request,
+            payload,
+            "data",
+            {"date": dates.to_numpy(dtype="datetime64[ns]"), **columns},
+            lambda: columns_to_records(dates, columns),
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Dataset preview failed: {str(e)}")
 
 
+@app.post("/api/warmup")
+def warmup(request: WarmupRequest):
+    """
+    Prefetch prices for a watchlist in bulk (one rate-limited download per
+    batch) and optionally train and cache each symbol's model. Symbols that
+    fail are reported under "errors"; the others are still warmed.
+    """
+    if not request.symbols:
+        raise HTTPException(status_code=400, detail="No symbols given")
+    try:
+        errors = download_errors(request.symbols, needs_benchmark=request.train)
+        ok = [s for s in request.symbols if s.upper() not in errors]
+        frames, load_errors = load_symbols(ok, get_price_frame)
+        errors.update(load_errors)
+
+        trained = []
+        if request.train:
+            models, train_errors = load_symbols(list(frames), get_symbol_model)
+            errors.update(train_errors)
+            trained = [{"symbol": s, "model_version": entry["version"]} for s, entry in models.items()]
+
+        return {
+            "symbols": [s.upper() for s in request.symbols],
+            "rows": {s: len(frame) for s, frame in frames.items()},
+            "trained": trained,
+            "errors": errors,
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Warmup failed: {str(e)}")
+
+
+@app.post("/api/portfolio/backtest")
+def portfolio_backtest(request: PortfolioBacktestRequest):
+    """
+    Run the strategy across a universe with shared capital: at most
+    max_positions open at once, each sized at position_fraction of equity
+    (default 1 / max_positions).
+    """
+    symbols = list(dict.fromkeys(s.upper() for s in request.symbols))
+    if not symbols:
+        raise HTTPException(status_code=400, detail="No symbols given")
+    if request.max_positions < 1:
+        raise HTTPException(status_code=400, detail="max_positions must be positive")
+    if request.position_fraction is not None and not 0 < request.position_fraction <= 1:
+        raise HTTPException(status_code=400, detail="position_fraction must be in (0, 1]")
+
+    try:
+        # One bulk download for every symbol not trained yet (plus the benchmark)
+        missing = [s for s in symbols if not is_fresh(_model_cache.get(s))]
+        if missing:
+            get_downloader().get_many(missing + ["SPY"])
+
+        entries = {}
+        for symbol in symbols:
+            cached = get_symbol_model(symbol)
+            entries[symbol] = (cached["dataset"], extract_linear_params(cached["model"]))
+
+        dates, symbols, close, prob, vol = build_signal_matrices(entries)
+        results, trades = run_portfolio_backtest(
+            dates, symbols, close, prob, vol,
+            strategy_type=request.strategy,
+            max_positions=request.max_positions,
+            position_fraction=request.position_fraction,
+        )
+        summary = portfolio_summary(results, trades, symbols, close)
+
+        equity_curve = [
+            {"date": date, "equity": e, "buy_hold": b, "cash": c, "open_positions": n}
+            for date, e, b, c, n in zip(
+                [ts.isoformat() for ts in results.index],
+                results["equity"].tolist(),
+                finite_list(summary["benchmark"]),
+                results["cash"].tolist(),
+                results["open_positions"].tolist(),
+            )
+        ]
+
+        return {
+            "symbols": symbols,
+            "strategy_type": request.strategy,
+            "max_positions": request.max_positions,
+            "metrics": summary["metrics"],
+            "buy_hold_metrics": summary["buy_hold_metrics"],
+            "per_symbol": summary["per_symbol"],
+            "equity_curve": equity_curve,
+            "trades": [
+                {**t, "entry_date": t["entry_date"].isoformat(), "exit_date": t["exit_date"].isoformat()}
+                for t in trades
+            ] if request.include_trades else [],
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Portfolio backtest failed: {str(e)}")
+
+
+@app.get("/api/predict")
+def get_prediction(symbol: str = "SPY", strategy: str = "conservative", horizon: int = PREDICTION_HORIZON):
+    """
+    Latest bullish probability and strategy decision for one symbol.
+    `horizon` picks which of the symbol's models (HORIZONS) scores it.
+    """
+    check_horizon(horizon)
+    try:
+        predictor = get_predictor(symbol)
+        prob = predict_bullish_prob(predictor["params"][horizon], predictor["features"])
+        params = get_strategy_params(strategy)
+
+        return {
+            "symbol": symbol.upper(),
+            "date": serialize_timestamp(predictor["date"]),
+            "bullish_prob": float(prob),
+            "horizon": horizon,
+            "volatility_20d": predictor["volatility_20d"],
+            "threshold": params["threshold"],
+            "decision": strategy_decision(prob, predictor["volatility_20d"], strategy),
+            "strategy": strategy,
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+
+@app.post("/api/predict/batch")
+def get_batch_prediction(request: PredictBatchRequest):
+    """Latest signals for a whole watchlist"""
+    if not request.symbols:
+        raise HTTPException(status_code=400, detail="No symbols given")
+    check_horizon(request.horizon)
+    try:
+        return {
+            "predictions": predict_symbols(request.symbols, request.strategy, request.horizon),
+            "strategy": request.strategy,
+            "horizon": request.horizon,
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+
+
 @app.get("/api/price-data")
-def get_price_data(symbol: str = "SPY", start: str = "", end: str = ""):
+def get_price_data(request: Request, symbol: str = "SPY", start: str = "", end: str = ""):
     """Get daily close prices for a date range (used for trade charts)"""
     try:
         # Use cache to avoid re-downloading on every explain click
-        if symbol not in _price_cache:
-            _price_cache[symbol] = load_market_data(symbol)
-
-        df = _price_cache[symbol].copy()
+        df = get_price_frame(symbol)
 
-        if start:
-            df = df[df.index >= start]
-        if end:
-            df = df[df.index <= end]
-
-        prices = []
-        for date, row in df.iterrows():
-            prices.append({
-                "date": serialize_timestamp(date).split("T")[0],
-                "close": float(row["Close"])
-            })
+        # Sorted index: slice by position instead of copying then masking
+        lo = df.index.searchsorted(pd.Timestamp(start)) if start else 0
+        hi = df.index.searchsorted(pd.Timestamp(end), side="right") if end else len(df)
+        dates = df.index[lo:hi]
+        close = df["Close"].to_numpy(dtype=np.float64)[lo:hi]
 
-        return {"prices": prices, "symbol": symbol}
+        return negotiated_response(
+            request,
+            {"symbol": symbol},
+            "prices",
+            {"date": dates.to_numpy(dtype="datetime64[ns]"), "close": close},
+            lambda: [
+                {"date": d, "close": c}
+                for d, c in zip(dates.strftime("%Y-%m-%d"), finite_list(close))
+            ],
+        )
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Price data failed: {str(e)}")
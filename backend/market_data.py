@@ -0,0 +1,378 @@
+import io
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+import zlib
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate=2.0, capacity=5):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def split_by_symbol(df, symbols):
+    """
+    Split a multi-ticker frame into {symbol: single-symbol frame}. Handles
+    both (ticker, field) and (field, ticker) column layouts and plain
+    single-ticker frames.
+    """
+    frames = {}
+    if isinstance(df.columns, pd.MultiIndex):
+        top = set(df.columns.get_level_values(0))
+        for symbol in symbols:
+            if symbol in top:
+                frame = df[symbol]
+            elif symbol in set(df.columns.get_level_values(1)):
+                frame = df.xs(symbol, axis=1, level=1)
+            else:
+                continue
+            frames[symbol] = frame.dropna(how="all")
+    elif len(symbols) == 1:
+        frames[symbols[0]] = df
+
+    for symbol, frame in frames.items():
+        frame = frame.dropna()
+        frame.columns.name = None
+        frames[symbol] = frame
+    return {s: f for s, f in frames.items() if len(f)}
+
+
+class YFinanceSource:
+    """Yahoo Finance: one yf.download call per batch of symbols."""
+
+    def fetch(self, symbols, start):
+        df = yf.download(
+            symbols,
+            start=start,
+            auto_adjust=False,
+            group_by="ticker",
+            threads=False,
+            progress=False,
+        )
+        return split_by_symbol(df, symbols)
+
+
+class HttpCsvSource:
+    """
+    Plain HTTP source: GET {base_url}/prices?symbols=A,B&start=YYYY-MM-DD
+    returning long CSV (Date, Symbol, Open, High, Low, Close, Adj Close, Volume).
+    Used with StubPriceServer for tests and offline load testing.
+    """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def fetch(self, symbols, start):
+        query = urllib.parse.urlencode({"symbols": ",".join(symbols), "start": start})
+        with urllib.request.urlopen(f"{self.base_url}/prices?{query}", timeout=self.timeout) as response:
+            body = response.read()
+
+        long_df = pd.read_csv(io.BytesIO(body), parse_dates=["Date"])
+        frames = {}
+        for symbol, group in long_df.groupby("Symbol", sort=False):
+            frame = group.drop(columns="Symbol").set_index("Date").sort_index()
+            frames[symbol] = frame.dropna()
+        return frames
+
+
+class MarketDataDownloader:
+    """
+    Download layer in front of a price source.
+
+    - Symbols requested together are fetched in bulk (batch_size per call).
+    - Concurrent requests for a symbol already being fetched wait on the
+      same in-flight Future instead of downloading it again.
+    - Every source call takes a token from a rate-limiting bucket and is
+      retried with exponential backoff, both when it raises and for the
+      symbols it returned no data for (yf.download reports rate limits and
+      transient errors as empty columns rather than exceptions).
+    - Results are kept for `ttl` seconds, so e.g. the SPY benchmark is
+      downloaded once for every symbol built in that window; expired
+      entries are evicted on the next call.
+    """
+
+    def __init__(self, source=None, rate=2.0, burst=5, max_retries=3, backoff=0.5,
+                 batch_size=50, ttl=900):
+        self.source = source if source is not None else YFinanceSource()
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.ttl = ttl
+        self._cache = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _fetch_with_retry(self, symbols, start):
+        """
+        Fetch a batch; each retry asks only for the symbols still missing.
+
+        Returns:
+            (frames dict, error of the last attempt or None); symbols not in
+            frames failed every attempt
+        """
+        frames = {}
+        pending = list(symbols)
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            self.bucket.acquire()
+            try:
+                fetched = self.source.fetch(pending, start)
+                error = None
+            except Exception as e:
+                fetched, error = {}, e
+
+            frames.update({symbol: fetched[symbol] for symbol in pending if symbol in fetched})
+            pending = [symbol for symbol in pending if symbol not in frames]
+            if not pending:
+                break
+        return frames, error
+
+    def _evict_expired(self, now):
+        """Drop cached frames older than ttl (call with the lock held)."""
+        expired = [key for key, (fetched_at, _) in self._cache.items() if now - fetched_at >= self.ttl]
+        for key in expired:
+            del self._cache[key]
+
+    def _resolve(self, symbols, start, futures, frames, error):
+        """Complete this call's still-pending Futures for `symbols` and cache the frames."""
+        with self._lock:
+            for symbol in symbols:
+                future = futures[symbol]
+                if future.done():
+                    continue
+                if self._in_flight.get((symbol, start)) is future:
+                    del self._in_flight[(symbol, start)]
+                frame = frames.get(symbol)
+                if frame is not None:
+                    self._cache[(symbol, start)] = (time.monotonic(), frame)
+                    future.set_result(frame)
+                else:
+                    future.set_exception(error or ValueError(f"No price data for {symbol}"))
+
+    def get_many(self, symbols, start="2015-01-01"):
+        """Return {symbol: price frame} for every symbol; raises if any fails."""
+        frames, errors = self.get_available(symbols, start)
+        if errors:
+            raise next(iter(errors.values()))
+        return frames
+
+    def get_available(self, symbols, start="2015-01-01"):
+        """
+        Like get_many, but one symbol failing does not fail the others.
+
+        Returns:
+            ({symbol: price frame} for the symbols that loaded,
+             {symbol: exception} for the ones that did not)
+        """
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        now = time.monotonic()
+
+        results = {}
+        waiting = {}
+        to_fetch = []
+        with self._lock:
+            self._evict_expired(now)
+            for symbol in symbols:
+                key = (symbol, start)
+                cached = self._cache.get(key)
+                if cached is not None and now - cached[0] < self.ttl:
+                    results[symbol] = cached[1]
+                elif key in self._in_flight:
+                    waiting[symbol] = self._in_flight[key]
+                else:
+                    future = Future()
+                    self._in_flight[key] = future
+                    waiting[symbol] = future
+                    to_fetch.append(symbol)
+
+        try:
+            for i in range(0, len(to_fetch), self.batch_size):
+                batch = to_fetch[i:i + self.batch_size]
+                frames, error = self._fetch_with_retry(batch, start)
+                self._resolve(batch, start, waiting, frames, error)
+        finally:
+            # If anything above raised, never leave other callers waiting
+            # on this call's Futures
+            self._resolve(to_fetch, start, waiting, {}, RuntimeError("Price download aborted"))
+
+        errors = {}
+        for symbol, future in waiting.items():
+            error = future.exception()
+            if error is None:
+                results[symbol] = future.result()
+            else:
+                errors[symbol] = error
+
+        return {symbol: results[symbol] for symbol in symbols if symbol in results}, errors
+
+    def get(self, symbol, start="2015-01-01"):
+        return self.get_many([symbol], start)[symbol.upper()]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_downloader = None
+
+
+def get_downloader():
+    """
+    Process-wide downloader. TUTOR_MARKET_DATA_URL switches the source from
+    Yahoo Finance to an HttpCsvSource (e.g. a local StubPriceServer).
+    """
+    global _downloader
+    if _downloader is None:
+        url = os.environ.get("TUTOR_MARKET_DATA_URL")
+        source = HttpCsvSource(url) if url else YFinanceSource()
+        _downloader = MarketDataDownloader(
+            source,
+            rate=float(os.environ.get("TUTOR_DOWNLOAD_RATE", "2.0")),
+        )
+    return _downloader
+
+
+def data_source_name():
+    """
+    Short name of the configured price source, used to keep caches of
+    different sources apart: "yfinance", or "http-<hash of the URL>".
+    """
+    url = os.environ.get("TUTOR_MARKET_DATA_URL")
+    if not url:
+        return "yfinance"
+    return f"http-{zlib.crc32(url.encode()):08x}"
+
+
+def set_downloader(downloader):
+    global _downloader
+    _downloader = downloader
+
+
+def synthetic_prices(symbol, start="2015-01-01", end=None):
+    """Deterministic random-walk OHLCV frame for a symbol (seeded by its name)."""
+    rng = np.random.default_rng(zlib.crc32(symbol.upper().encode()))
+    dates = pd.bdate_range("2015-01-01", end or pd.Timestamp.today().normalize())
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0004, 0.012, len(dates))))
+    spread = np.abs(rng.normal(0, 0.005, len(dates)))
+
+    df = pd.DataFrame({
+        "Open": close * (1 - spread / 2),
+        "High": close * (1 + spread),
+        "Low": close * (1 - spread),
+        "Close": close,
+        "Adj Close": close,
+        "Volume": rng.integers(1_000_000, 5_000_000, len(dates)),
+    }, index=pd.DatetimeIndex(dates, name="Date"))
+    return df[df.index >= start]
+
+
+class StubPriceServer:
+    """
+    Local HTTP server speaking HttpCsvSource's protocol with synthetic
+    prices. Runs on a background thread; use as a context manager.
+
+    fail_first: number of initial requests answered with HTTP 503, to
+    exercise retry/backoff.
+    delay: seconds each request takes, to exercise concurrent callers.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, fail_first=0, delay=0.0):
+        stub = self
+        self.requests = []
+        self.fail_first = fail_first
+        self.delay = delay
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urllib.parse.urlparse(self.path)
+                params = urllib.parse.parse_qs(parsed.query)
+                stub.requests.append(parsed.path + "?" + parsed.query)
+                if stub.delay:
+                    time.sleep(stub.delay)
+
+                if stub.fail_first > 0:
+                    stub.fail_first -= 1
+                    self.send_error(503)
+                    return
+                if parsed.path != "/prices":
+                    self.send_error(404)
+                    return
+
+                symbols = params.get("symbols", [""])[0].split(",")
+                start = params.get("start", ["2015-01-01"])[0]
+                frames = []
+                for symbol in filter(None, symbols):
+                    frame = synthetic_prices(symbol, start)
+                    frames.append(frame.assign(Symbol=symbol.upper()).reset_index())
+                body = pd.concat(frames).to_csv(index=False).encode() if frames else b""
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import sys
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = StubPriceServer(port=port)
+    print(f"Serving synthetic prices on {server.url} (set TUTOR_MARKET_DATA_URL to use it)")
+    server.server.serve_forever()
@@ -0,0 +1,136 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from dataset_builder import build_dataset, FEATURE_COLUMNS
+from train_trend_model import train_trend_model, TEST_START
+from backtest_strategy import TradingStrategy, INITIAL_CAPITAL
+
+
+def prepare_bars(symbol="SPY", start=TEST_START):
+    """
+    Build the bar stream the strategy consumes for one symbol: Close,
+    volatility_20d, features and the model's bullish_prob from `start` on.
+    The model is trained on data before TEST_START exactly like the backtest.
+    """
+    df = build_dataset(symbol)
+    model = train_trend_model(symbol, df=df)
+
+    bars = df[df.index >= start][["Close"] + FEATURE_COLUMNS].copy()
+    bars["bullish_prob"] = model.predict_proba(bars[FEATURE_COLUMNS])[:, 1]
+    return bars
+
+
+def stored_bar_feed(bars_by_symbol):
+    """
+    Merge per-symbol bar frames into one time-ordered event stream.
+
+    Yields (date, symbol, close, bullish_prob, volatility_20d, feature_row).
+    Uses a k-way heap merge, so memory is O(number of symbols).
+    """
+    def symbol_events(symbol, bars):
+        closes = bars["Close"].to_numpy()
+        probs = bars["bullish_prob"].to_numpy()
+        vols = bars["volatility_20d"].to_numpy()
+        features = bars[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+        for i, date in enumerate(bars.index):
+            yield date, symbol, closes[i], probs[i], vols[i], features[i]
+
+    streams = [symbol_events(s, b) for s, b in bars_by_symbol.items()]
+    return heapq.merge(*streams, key=lambda event: (event[0], event[1]))
+
+
+def simulated_feed(symbols, start="2024-01-01", periods=252, seed=0):
+    """
+    Local random-walk feed for exercising the engine without market data.
+
+    Volatility is a running 20-bar std of returns kept in a ring buffer and
+    the bullish probability is a logistic squash of recent momentum, so each
+    bar costs O(1) per symbol.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=periods)
+
+    prices = np.full(len(symbols), 100.0)
+    window = np.zeros((len(symbols), 20))
+
+    for i, date in enumerate(dates):
+        returns = rng.normal(0.0004, 0.012, len(symbols))
+        prices = prices * (1 + returns)
+        window[:, i % 20] = returns
+
+        n = min(i + 1, 20)
+        vols = window[:, :n].std(axis=1)
+        momentum = window[:, :n].sum(axis=1)
+        probs = 1.0 / (1.0 + np.exp(-momentum * 20))
+
+        for j, symbol in enumerate(symbols):
+            yield date, symbol, prices[j], probs[j], vols[j], None
+
+
+class PaperTradingEngine:
+    """
+    Runs one TradingStrategy per symbol over an event stream. Each bar is a
+    dict lookup plus one on_bar call, i.e. O(1) per bar per symbol.
+    """
+
+    def __init__(self, strategy_type="conservative", initial_capital=INITIAL_CAPITAL):
+        self.strategy_type = strategy_type
+        self.initial_capital = initial_capital
+        self.strategies = {}
+        self.equity = {}
+        self.orders = []
+
+    def strategy_for(self, symbol):
+        if symbol not in self.strategies:
+            self.strategies[symbol] = TradingStrategy(self.strategy_type, self.initial_capital)
+            self.equity[symbol] = []
+        return self.strategies[symbol]
+
+    def on_bar(self, date, symbol, price, bullish_prob, volatility, features=None):
+        """Feed one bar for one symbol and return the orders it generated."""
+        strategy = self.strategy_for(symbol)
+        orders = strategy.on_bar(date, price, bullish_prob, volatility, features)
+
+        for order in orders:
+            order["symbol"] = symbol
+        self.orders.extend(orders)
+        self.equity[symbol].append((date, strategy.capital))
+        return orders
+
+    def replay(self, feed):
+        """Consume a whole feed (see stored_bar_feed / simulated_feed)."""
+        for event in feed:
+            self.on_bar(*event)
+        return self.results()
+
+    def results(self):
+        """Per-symbol equity series, trades and final capital."""
+        out = {}
+        for symbol, strategy in self.strategies.items():
+            points = self.equity[symbol]
+            out[symbol] = {
+                "equity": pd.Series(
+                    [value for _, value in points],
+                    index=pd.DatetimeIndex([date for date, _ in points]),
+                    name="equity",
+                ),
+                "trades": strategy.trades,
+                "final_capital": strategy.capital,
+            }
+        return out
+
+
+if __name__ == "__main__":
+    symbols = ["SPY", "QQQ"]
+    bars = {s: prepare_bars(s) for s in symbols}
+
+    engine = PaperTradingEngine("conservative")
+    results = engine.replay(stored_bar_feed(bars))
+
+    for symbol, result in results.items():
+        print(
+            f"{symbol}: {len(result['trades'])} trades, "
+            f"final capital ${result['final_capital']:.2f}"
+        )
@@ -0,0 +1,307 @@
+import numpy as np
+import pandas as pd
+
+from train_trend_model import TEST_START, predict_bullish_prob
+from backtest_strategy import (
+    get_strategy_params,
+    INITIAL_CAPITAL,
+    NORMAL_POSITION_SIZE,
+    COOLDOWN_POSITION_SIZE,
+    calculate_total_return,
+    calculate_max_drawdown,
+    calculate_sharpe_ratio,
+)
+
+
+# Simultaneous positions allowed by default; each slot gets 1/DEFAULT_MAX_POSITIONS of equity
+DEFAULT_MAX_POSITIONS = 10
+
+# Same cooldown rule as TradingStrategy: 3 losses in a row -> 30 days at reduced size
+LOSS_STREAK_LIMIT = 3
+COOLDOWN_DAYS = 30
+
+NS_PER_DAY = 86_400 * 10**9
+
+
+def build_signal_matrices(entries, start=TEST_START):
+    """
+    Align per-symbol datasets on one date axis.
+
+    Args:
+        entries: {symbol: (CompactDataset, linear params from extract_linear_params)}
+        start: First date of the simulation (the models' out-of-sample period)
+
+    Returns:
+        (dates, symbols, close, prob, vol): close/prob/vol are dates x symbols
+        float64 matrices with NaN where a symbol has no bar
+    """
+    symbols = list(entries)
+    parts = {}
+    for symbol, (dataset, params) in entries.items():
+        _, test = dataset.split(start)
+        parts[symbol] = (
+            test.index,
+            test.close.astype(np.float64),
+            predict_bullish_prob(params, test.features),
+            test.column("volatility_20d").astype(np.float64),
+        )
+
+    dates = pd.DatetimeIndex([])
+    for index, _, _, _ in parts.values():
+        dates = dates.union(index)
+
+    shape = (len(dates), len(symbols))
+    close = np.full(shape, np.nan)
+    prob = np.full(shape, np.nan)
+    vol = np.full(shape, np.nan)
+    for j, symbol in enumerate(symbols):
+        index, c, p, v = parts[symbol]
+        rows = dates.get_indexer(index)
+        close[rows, j] = c
+        prob[rows, j] = p
+        vol[rows, j] = v
+
+    return dates, symbols, close, prob, vol
+
+
+def run_portfolio_backtest(dates, symbols, close, prob, vol, strategy_type="conservative",
+                           initial_capital=INITIAL_CAPITAL, max_positions=DEFAULT_MAX_POSITIONS,
+                           position_fraction=None):
+    """
+    Backtest a universe with one shared capital budget.
+
+    Every symbol follows TradingStrategy's rules (threshold, hold days,
+    volatility filter, per-symbol loss-streak cooldown). Each bar is one
+    set of array operations over all symbols; only the date loop is Python.
+
+    Sizing: a new position is allocated equity * position_fraction
+    (default 1 / max_positions), times COOLDOWN_POSITION_SIZE while that
+    symbol is in cooldown. When more symbols qualify than there are free
+    slots or cash, the highest bullish_prob wins. Equity is marked to
+    market every bar; a symbol without a bar keeps its last close.
+
+    Args:
+        dates: DatetimeIndex of the rows
+        symbols: Column labels
+        close, prob, vol: dates x symbols matrices (NaN = no bar)
+        max_positions: Cap on simultaneously open positions
+
+    Returns:
+        (results DataFrame with equity / cash / open_positions / exposure, trades list)
+    """
+    params = get_strategy_params(strategy_type)
+    threshold = params["threshold"]
+    hold_days = params["hold_days"]
+    volatility_limit = params["volatility_limit"]
+    disable_cooldown = params["disable_cooldown"]
+    if position_fraction is None:
+        position_fraction = 1.0 / max_positions
+
+    n_dates, n_symbols = close.shape
+    now_ns = dates.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+    cash = float(initial_capital)
+    in_position = np.zeros(n_symbols, dtype=bool)
+    shares = np.zeros(n_symbols)
+    entry_price = np.zeros(n_symbols)
+    entry_ns = np.zeros(n_symbols, dtype=np.int64)
+    entry_prob = np.zeros(n_symbols)
+    entry_size = np.zeros(n_symbols)
+    loss_streak = np.zeros(n_symbols, dtype=np.int64)
+    cooldown_until = np.full(n_symbols, np.iinfo(np.int64).min)
+    last_price = np.full(n_symbols, np.nan)
+
+    equity_curve = np.empty(n_dates)
+    cash_curve = np.empty(n_dates)
+    open_curve = np.empty(n_dates, dtype=np.int64)
+    exits = []
+
+    for t in range(n_dates):
+        now = now_ns[t]
+        price = close[t]
+        has_bar = ~np.isnan(price)
+        last_price = np.where(has_bar, price, last_price)
+
+        # Sizing is decided before this bar's exits, as in TradingStrategy
+        size = np.where(now < cooldown_until, COOLDOWN_POSITION_SIZE, NORMAL_POSITION_SIZE)
+
+        # ----- Exits -----
+        exiting = in_position & has_bar & ((now - entry_ns) // NS_PER_DAY >= hold_days)
+        if exiting.any():
+            idx = np.flatnonzero(exiting)
+            exit_price = price[idx]
+            pnl = exit_price / entry_price[idx] - 1
+            cash += float(np.dot(shares[idx], exit_price))
+            exits.append((idx, entry_ns[idx], np.full(len(idx), now), entry_price[idx],
+                          exit_price, pnl, entry_prob[idx], entry_size[idx]))
+
+            in_position[idx] = False
+            shares[idx] = 0.0
+
+            # ----- LOSS STREAK + COOLDOWN LOGIC (per symbol) -----
+            streak = np.where(pnl <= 0, loss_streak[idx] + 1, 0)
+            if not disable_cooldown:
+                triggered = streak >= LOSS_STREAK_LIMIT
+                cooldown_until[idx[triggered]] = now + COOLDOWN_DAYS * NS_PER_DAY
+                streak[triggered] = 0
+            loss_streak[idx] = streak
+
+        held = np.flatnonzero(in_position)
+        equity = cash + float(np.dot(shares[held], last_price[held]))
+
+        # ----- Entries -----
+        slots = max_positions - len(held)
+        if slots > 0:
+            candidates = np.flatnonzero(
+                ~in_position & has_bar & (prob[t] >= threshold) & (vol[t] < volatility_limit)
+            )
+            if len(candidates):
+                # Strongest signals first; they also get the cash first
+                candidates = candidates[np.argsort(-prob[t, candidates], kind="stable")[:slots]]
+                allocation = equity * position_fraction * size[candidates]
+                affordable = np.cumsum(allocation) <= cash + 1e-9 * equity
+                candidates = candidates[affordable]
+                allocation = allocation[affordable]
+
+                in_position[candidates] = True
+                shares[candidates] = allocation / price[candidates]
+                entry_price[candidates] = price[candidates]
+                entry_ns[candidates] = now
+                entry_prob[candidates] = prob[t, candidates]
+                entry_size[candidates] = size[candidates]
+                cash -= float(allocation.sum())
+
+        equity_curve[t] = equity
+        cash_curve[t] = cash
+        open_curve[t] = int(in_position.sum())
+
+    results = pd.DataFrame({
+        "equity": equity_curve,
+        "cash": cash_curve,
+        "open_positions": open_curve,
+    }, index=dates)
+    results["exposure"] = 1 - results["cash"] / results["equity"]
+
+    return results, _exit_records(exits, symbols)
+
+
+def _exit_records(exits, symbols):
+    if not exits:
+        return []
+    columns = [np.concatenate(parts) for parts in zip(*exits)]
+    idx, entry_ns, exit_ns, entry_price, exit_price, pnl, prob, size = columns
+
+    order = np.lexsort((idx, entry_ns))
+    entry_dates = pd.DatetimeIndex(entry_ns[order].astype("datetime64[ns]"))
+    exit_dates = pd.DatetimeIndex(exit_ns[order].astype("datetime64[ns]"))
+
+    return [
+        {
+            "symbol": symbols[i],
+            "entry_date": entry_date,
+            "exit_date": exit_date,
+            "entry_price": ep,
+            "exit_price": xp,
+            "pnl": r,
+            "bullish_prob": p,
+            "position_size": s,
+        }
+        for i, entry_date, exit_date, ep, xp, r, p, s in zip(
+            idx[order].tolist(), entry_dates, exit_dates, entry_price[order].tolist(),
+            exit_price[order].tolist(), pnl[order].tolist(), prob[order].tolist(), size[order].tolist(),
+        )
+    ]
+
+
+def equal_weight_benchmark(close, initial_capital=INITIAL_CAPITAL):
+    """Buy & hold of every symbol with equal weight from its first bar (NaNs forward-filled)."""
+    filled = pd.DataFrame(close).ffill().bfill().to_numpy()
+    return initial_capital * (filled / filled[0]).mean(axis=1)
+
+
+def _finite(value):
+    """Metric as a float, or None when it is undefined (e.g. Sharpe with no trades)."""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def portfolio_summary(results, trades, symbols, close):
+    """
+    Strategy vs equal-weight buy & hold metrics plus per-symbol trade stats.
+    Metrics that are undefined (NaN/inf) are None so the result stays valid JSON.
+    """
+    equity = results["equity"]
+    benchmark = pd.Series(equal_weight_benchmark(close, equity.iloc[0]), index=results.index)
+
+    positions = {symbol: i for i, symbol in enumerate(symbols)}
+    symbol_idx = np.array([positions[t["symbol"]] for t in trades], dtype=np.int64)
+    pnl = np.array([t["pnl"] for t in trades])
+    counts = np.bincount(symbol_idx, minlength=len(symbols))
+    wins = np.bincount(symbol_idx, weights=pnl > 0, minlength=len(symbols))
+    pnl_sum = np.bincount(symbol_idx, weights=pnl, minlength=len(symbols))
+
+    per_symbol = [
+        {
+            "symbol": symbol,
+            "num_trades": int(counts[i]),
+            "win_rate": float(wins[i] / counts[i]) if counts[i] else None,
+            "avg_pnl": float(pnl_sum[i] / counts[i]) if counts[i] else None,
+        }
+        for i, symbol in enumerate(symbols)
+    ]
+
+    return {
+        "metrics": {
+            "total_return": _finite(calculate_total_return(equity)),
+            "max_drawdown": _finite(calculate_max_drawdown(equity)),
+            "sharpe_ratio": _finite(calculate_sharpe_ratio(equity)),
+            "num_trades": len(trades),
+            "winning_trades": int((pnl > 0).sum()),
+            "avg_exposure": _finite(results["exposure"].mean()),
+            "max_open_positions": int(results["open_positions"].max()),
+        },
+        "buy_hold_metrics": {
+            "total_return": _finite(calculate_total_return(benchmark)),
+            "max_drawdown": _finite(calculate_max_drawdown(benchmark)),
+            "sharpe_ratio": _finite(calculate_sharpe_ratio(benchmark)),
+        },
+        "per_symbol": per_symbol,
+        "benchmark": benchmark,
+    }
+
+
+def synthetic_universe(n_symbols=500, years=10, seed=0):
+    """Random close / prob / vol matrices for benchmarking the engine."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2015-01-01", periods=252 * years)
+    shape = (len(dates), n_symbols)
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, shape), axis=0))
+    prob = np.clip(rng.normal(0.5, 0.08, shape), 0, 1)
+    vol = np.abs(rng.normal(0.015, 0.005, shape))
+    symbols = [f"SYM{i:03d}" for i in range(n_symbols)]
+    return dates, symbols, close, prob, vol
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Time the portfolio backtester on a synthetic universe")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--strategy", default="aggressive")
+    parser.add_argument("--max-positions", type=int, default=DEFAULT_MAX_POSITIONS)
+    args = parser.parse_args()
+
+    dates, symbols, close, prob, vol = synthetic_universe(args.symbols, args.years)
+
+    start = time.perf_counter()
+    results, trades = run_portfolio_backtest(
+        dates, symbols, close, prob, vol, args.strategy, max_positions=args.max_positions
+    )
+    elapsed = time.perf_counter() - start
+
+    summary = portfolio_summary(results, trades, symbols, close)
+    print(f"{args.symbols} symbols x {len(dates)} bars in {elapsed:.2f}s")
+    print(summary["metrics"])
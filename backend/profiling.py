@@ -0,0 +1,251 @@
+"""
+Opt-in per-request profiling.
+
+Disabled unless TUTOR_PROFILING=1, in which case install_profiling(app)
+(called by main.py right after the app is created) adds:
+
+- a middleware that profiles a request when it carries the header
+  "X-Profile: 1" or the query parameter ?profile=1,
+- a route class running each endpoint under cProfile for those requests,
+  in the thread that actually executes it (sync endpoints run in the
+  threadpool, so profiling inside the middleware would miss them),
+- GET /api/profiles, /api/profiles/{id} and /api/profiles/{id}/download.
+
+Profiles are written to TUTOR_PROFILE_DIR (default backend/data/profiles)
+as {id}.prof (pstats format, e.g. for snakeviz) plus {id}.json metadata;
+only the newest TUTOR_PROFILE_KEEP are kept. When profiling is disabled
+nothing is installed, so requests pay no overhead at all.
+"""
+import asyncio
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+from fastapi.routing import APIRoute
+
+
+PROFILE_DIR = os.environ.get(
+    "TUTOR_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles"),
+)
+PROFILE_KEEP = int(os.environ.get("TUTOR_PROFILE_KEEP", "50"))
+
+# Functions listed in each profile's JSON summary
+SUMMARY_FUNCTIONS = 25
+
+PROFILE_ID = re.compile(r"^[0-9]+-[0-9a-f]+$")
+
+_active_profile = contextvars.ContextVar("active_profile", default=None)
+
+
+def profiling_enabled():
+    return os.environ.get("TUTOR_PROFILING", "").lower() in ("1", "true", "yes")
+
+
+def profile_requested(request):
+    return (
+        request.headers.get("x-profile", "").lower() in ("1", "true")
+        or request.query_params.get("profile", "").lower() in ("1", "true")
+    )
+
+
+def _enable(profiler):
+    """
+    Start profiling; False if another profiler is already active (newer
+    Pythons allow only one at a time), in which case the request runs
+    unprofiled.
+    """
+    try:
+        profiler.enable()
+        return True
+    except ValueError:
+        return False
+
+
+def _profiled(endpoint):
+    """Run `endpoint` under the active request's profiler, if there is one."""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            profiler = _active_profile.get()
+            if profiler is None:
+                return await endpoint(*args, **kwargs)
+            # Runs on the event loop thread: other coroutines interleaving
+            # with this one are captured too
+            if not _enable(profiler):
+                return await endpoint(*args, **kwargs)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profiler.disable()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            profiler = _active_profile.get()
+            if profiler is None:
+                return endpoint(*args, **kwargs)
+            if not _enable(profiler):
+                return endpoint(*args, **kwargs)
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                profiler.disable()
+    return wrapper
+
+
+class ProfilingRoute(APIRoute):
+    """APIRoute whose endpoint can be profiled per request."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+
+def summarize(profiler, limit=SUMMARY_FUNCTIONS):
+    """Top functions by cumulative time."""
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "ncalls": ncalls,
+            "tottime_ms": tottime * 1000,
+            "cumtime_ms": cumtime * 1000,
+        })
+    rows.sort(key=lambda r: r["cumtime_ms"], reverse=True)
+    return rows[:limit]
+
+
+def save_profile(profiler, request, status_code, duration):
+    """Write {id}.prof + {id}.json and prune old profiles; returns the id."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}"
+
+    profiler.dump_stats(os.path.join(PROFILE_DIR, profile_id + ".prof"))
+    meta = {
+        "id": profile_id,
+        "method": request.method,
+        "path": request.url.path,
+        "query": str(request.query_params),
+        "status_code": status_code,
+        "duration_ms": duration * 1000,
+        "created": time.time(),
+        "top_functions": summarize(profiler),
+    }
+    with open(os.path.join(PROFILE_DIR, profile_id + ".json"), "w") as f:
+        json.dump(meta, f)
+
+    _prune()
+    return profile_id
+
+
+def _prune():
+    ids = list_profile_ids()
+    for profile_id in ids[PROFILE_KEEP:]:
+        for ext in (".prof", ".json"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + ext))
+            except FileNotFoundError:
+                pass
+
+
+def list_profile_ids():
+    """Stored profile ids, newest first (ids start with a ms timestamp)."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    ids = [name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith(".json")]
+    return sorted(ids, key=lambda i: int(i.split("-")[0]), reverse=True)
+
+
+def load_profile_meta(profile_id):
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, profile_id + ".json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+router = APIRouter()
+
+
+@router.get("/api/profiles")
+def list_profiles(limit: int = 20):
+    """Most recent request profiles (metadata only)"""
+    profiles = []
+    for profile_id in list_profile_ids()[:limit]:
+        meta = load_profile_meta(profile_id)
+        if meta is not None:
+            meta.pop("top_functions", None)
+            profiles.append(meta)
+    return {"profiles": profiles}
+
+
+@router.get("/api/profiles/{profile_id}")
+def get_profile(profile_id: str, sort: str = "cumulative", limit: int = 40):
+    """Profile metadata plus a pstats text report"""
+    meta = load_profile_meta(profile_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    out = io.StringIO()
+    try:
+        stats = pstats.Stats(os.path.join(PROFILE_DIR, profile_id + ".prof"), stream=out)
+        stats.sort_stats(sort).print_stats(limit)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key '{sort}'")
+    meta["report"] = out.getvalue()
+    return meta
+
+
+@router.get("/api/profiles/{profile_id}/download")
+def download_profile(profile_id: str):
+    """Raw pstats file (open with snakeviz or pstats)"""
+    if load_profile_meta(profile_id) is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(
+        os.path.join(PROFILE_DIR, profile_id + ".prof"),
+        media_type="application/octet-stream",
+        filename=profile_id + ".prof",
+    )
+
+
+def install_profiling(app):
+    """
+    Enable opt-in profiling on `app` when TUTOR_PROFILING is set. Must be
+    called before any route is declared so they use ProfilingRoute.
+    """
+    if not profiling_enabled():
+        return False
+
+    app.router.route_class = ProfilingRoute
+    app.include_router(router)
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if not profile_requested(request):
+            return await call_next(request)
+
+        profiler = cProfile.Profile()
+        token = _active_profile.set(profiler)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _active_profile.reset(token)
+        duration = time.perf_counter() - start
+
+        response.headers["X-Profile-Id"] = save_profile(profiler, request, response.status_code, duration)
+        return response
+
+    print(f"Request profiling enabled, profiles saved to {PROFILE_DIR}")
+    return True
@@ -0,0 +1,199 @@
+import gzip
+import json
+import math
+
+import numpy as np
+from fastapi.responses import Response
+
+# Optional: Arrow IPC output and brotli compression
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+COLUMNAR = "application/x-tutor-columnar"
+JSON = "application/json"
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+
+COLUMNAR_MAGIC = b"TTC1"
+
+
+def json_safe(value):
+    """Recursively replace NaN/inf floats (incl. NumPy scalars) with None."""
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def dumps(value):
+    """
+    json.dumps that always produces valid JSON (non-finite floats -> null).
+    The recursive json_safe pass only runs when the fast path finds a NaN/inf.
+    """
+    try:
+        return json.dumps(value, allow_nan=False)
+    except ValueError:
+        return json.dumps(json_safe(value), allow_nan=False)
+
+
+def finite_list(values):
+    """Column as a JSON-ready list; float NaN/inf become None in one NumPy pass."""
+    values = np.asarray(values)
+    if values.dtype.kind != "f":
+        return values.tolist()
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def choose_format(request):
+    """
+    Pick the response format from ?format=arrow|columnar|json or the Accept
+    header. Arrow falls back to the built-in columnar format when pyarrow
+    is not installed.
+    """
+    requested = request.query_params.get("format", "").lower()
+    accept = request.headers.get("accept", "")
+
+    if requested == "arrow" or ARROW_STREAM in accept:
+        return ARROW_STREAM if pa is not None else COLUMNAR
+    if requested == "columnar" or COLUMNAR in accept:
+        return COLUMNAR
+    return JSON
+
+
+def to_arrow_ipc(columns, metadata=None):
+    """
+    Arrow IPC stream with one record batch. Numeric and datetime64 NumPy
+    columns without nulls are wrapped without copying.
+    """
+    batch = pa.RecordBatch.from_arrays(
+        [pa.array(np.ascontiguousarray(values)) for values in columns.values()],
+        names=list(columns),
+    )
+    schema = batch.schema
+    if metadata:
+        schema = schema.with_metadata({"payload": dumps(metadata)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(batch.replace_schema_metadata(schema.metadata))
+    return sink.getvalue().to_pybytes()
+
+
+def to_columnar(columns, metadata=None):
+    """
+    Minimal binary columnar format used when pyarrow is unavailable:
+
+        b"TTC1" | uint32 header length | JSON header | 8-byte aligned column buffers
+
+    The header lists each column's name, NumPy dtype string, byte offset
+    (from the start of the buffer section) and length, plus the `payload`
+    metadata. Column buffers are the raw little-endian NumPy memory.
+    """
+    header = {"columns": [], "payload": metadata or {}}
+    buffers = []
+    offset = 0
+    for name, values in columns.items():
+        values = np.ascontiguousarray(values)
+        if values.dtype.byteorder == ">":
+            values = values.astype(values.dtype.newbyteorder("<"))
+        # Byte view of the column's memory (works for datetime64 too)
+        buffer = memoryview(values.view(np.uint8))
+        header["columns"].append({
+            "name": name,
+            "dtype": values.dtype.str,
+            "offset": offset,
+            "length": len(values),
+        })
+        buffers.append(buffer)
+        padding = -len(buffer) % 8
+        if padding:
+            buffers.append(b"\0" * padding)
+        offset += len(buffer) + padding
+
+    header_bytes = dumps(header).encode()
+    header_bytes += b" " * (-(len(header_bytes) + 8) % 8)
+
+    return b"".join(
+        [COLUMNAR_MAGIC, np.uint32(len(header_bytes)).tobytes(), header_bytes] + buffers
+    )
+
+
+def read_columnar(body):
+    """Inverse of to_columnar: returns (columns, payload); columns are views on body."""
+    if body[:4] != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar payload")
+    header_len = int(np.frombuffer(body, dtype="<u4", count=1, offset=4)[0])
+    header = json.loads(body[8:8 + header_len])
+    base = 8 + header_len
+
+    columns = {}
+    for col in header["columns"]:
+        columns[col["name"]] = np.frombuffer(
+            body, dtype=np.dtype(col["dtype"]), count=col["length"], offset=base + col["offset"]
+        )
+    return columns, header["payload"]
+
+
+def compress(body, request):
+    """Compress JSON with brotli or gzip (per Accept-Encoding) above COMPRESS_MIN_BYTES."""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+
+    accepted = {
+        part.split(";")[0].strip()
+        for part in request.headers.get("accept-encoding", "").split(",")
+    }
+    if "br" in accepted and brotli is not None:
+        return brotli.compress(body, quality=4), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
+
+
+def negotiated_response(request, payload, table_key, columns, records):
+    """
+    Build the response for an array-heavy endpoint.
+
+    Args:
+        request: Incoming request (format + encoding negotiation)
+        payload: JSON-ready fields other than the array field
+        table_key: Name of the array field in the JSON response
+        columns: {name: 1-D NumPy array} used by the binary formats
+        records: Callable returning the JSON list for table_key (float
+            columns already NaN-free, see finite_list)
+
+    Only JSON is compressed: the binary formats are raw float buffers that
+    compress poorly, and compressing them would cost the CPU they save.
+    """
+    media_type = choose_format(request)
+
+    if media_type == ARROW_STREAM:
+        body = to_arrow_ipc(columns, {"table": table_key, **payload})
+    elif media_type == COLUMNAR:
+        body = to_columnar(columns, {"table": table_key, **payload})
+    else:
+        body = dumps({**payload, table_key: records()}).encode()
+
+    encoding = None
+    if media_type == JSON:
+        body, encoding = compress(body, request)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=body, media_type=media_type, headers=headers)
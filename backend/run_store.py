@@ -0,0 +1,430 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+
+DEFAULT_DB_PATH = os.environ.get(
+    "TUTOR_RUN_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "runs.sqlite3"),
+)
+
+# Run states. save_run writes complete runs; chunked runs (start_run) are
+# running until finish_run or fail_run.
+RUN_RUNNING = "running"
+RUN_COMPLETE = "complete"
+RUN_FAILED = "failed"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    num_trades INTEGER NOT NULL,
+    winning_trades INTEGER NOT NULL,
+    losing_trades INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'complete'
+);
+CREATE INDEX IF NOT EXISTS idx_runs_symbol_strategy_date
+    ON runs (symbol, strategy, run_date);
+
+CREATE TABLE IF NOT EXISTS run_metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    scope TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, scope, name)
+);
+
+CREATE TABLE IF NOT EXISTS equity_points (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    date TEXT NOT NULL,
+    equity REAL NOT NULL,
+    buy_hold REAL,
+    PRIMARY KEY (run_id, date)
+);
+
+CREATE TABLE IF NOT EXISTS trades (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    trade_index INTEGER NOT NULL,
+    entry_date TEXT NOT NULL,
+    exit_date TEXT NOT NULL,
+    entry_price REAL NOT NULL,
+    exit_price REAL NOT NULL,
+    pnl REAL NOT NULL,
+    bullish_prob REAL NOT NULL,
+    features TEXT NOT NULL,
+    PRIMARY KEY (run_id, trade_index)
+);
+CREATE INDEX IF NOT EXISTS idx_trades_run_entry
+    ON trades (run_id, entry_date);
+"""
+
+
+class RunStore:
+    """
+    Embedded SQLite history of backtest runs (metrics, equity curve, trades).
+
+    Each save is one transaction with executemany bulk inserts. A new
+    connection is opened per call, so the store is safe to share between
+    FastAPI's worker threads.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executescript(SCHEMA)
+                # Databases created before runs had a status
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(runs)")}
+                if "status" not in columns:
+                    conn.execute("ALTER TABLE runs ADD COLUMN status TEXT NOT NULL DEFAULT 'complete'")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def save_run(self, symbol, strategy, metrics, buy_hold_metrics, equity_curve, trades,
+                 winning_trades=0, losing_trades=0, run_date=None):
+        """
+        Persist one run and return its run_id.
+
+        Args:
+            equity_curve: [{"date", "equity", "buy_hold"}] as returned by /api/backtest
+            trades: JSON-ready trades (see prepare_trade_for_json)
+        """
+        if run_date is None:
+            run_date = datetime.now().isoformat(timespec="seconds")
+
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO runs (symbol, strategy, run_date, num_trades, winning_trades, losing_trades) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (symbol.upper(), strategy, run_date, len(trades), winning_trades, losing_trades),
+                )
+                run_id = cursor.lastrowid
+
+                metric_rows = [(run_id, "strategy", k, float(v)) for k, v in metrics.items()]
+                metric_rows += [(run_id, "buy_hold", k, float(v)) for k, v in buy_hold_metrics.items()]
+                conn.executemany(
+                    "INSERT INTO run_metrics (run_id, scope, name, value) VALUES (?, ?, ?, ?)",
+                    metric_rows,
+                )
+
+                conn.executemany(
+                    "INSERT INTO equity_points (run_id, date, equity, buy_hold) VALUES (?, ?, ?, ?)",
+                    [(run_id, p["date"], p["equity"], p.get("buy_hold")) for p in equity_curve],
+                )
+
+                conn.executemany(
+                    "INSERT INTO trades (run_id, trade_index, entry_date, exit_date, entry_price, "
+                    "exit_price, pnl, bullish_prob, features) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            run_id, i, t["entry_date"], t["exit_date"], t["entry_price"],
+                            t["exit_price"], t["pnl"], t["bullish_prob"], json.dumps(t["features"]),
+                        )
+                        for i, t in enumerate(trades)
+                    ],
+                )
+        finally:
+            conn.close()
+
+        return run_id
+
+    def start_run(self, symbol, strategy, run_date=None):
+        """
+        Open a run whose equity points and trades are appended in chunks
+        (see append_equity / append_trades / finish_run). Returns run_id.
+        """
+        if run_date is None:
+            run_date = datetime.now().isoformat(timespec="seconds")
+
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO runs (symbol, strategy, run_date, num_trades, winning_trades, losing_trades, status) "
+                    "VALUES (?, ?, ?, 0, 0, 0, ?)",
+                    (symbol.upper(), strategy, run_date, RUN_RUNNING),
+                )
+                return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def append_equity(self, run_id, points):
+        """Bulk-append [(date, equity, buy_hold)] rows in one transaction."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO equity_points (run_id, date, equity, buy_hold) VALUES (?, ?, ?, ?)",
+                    [(run_id, date, equity, buy_hold) for date, equity, buy_hold in points],
+                )
+        finally:
+            conn.close()
+
+    def append_trades(self, run_id, trades, start_index):
+        """Bulk-append JSON-ready trades numbered from start_index."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO trades (run_id, trade_index, entry_date, exit_date, entry_price, "
+                    "exit_price, pnl, bullish_prob, features) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            run_id, start_index + i, t["entry_date"], t["exit_date"], t["entry_price"],
+                            t["exit_price"], t["pnl"], t["bullish_prob"], json.dumps(t["features"]),
+                        )
+                        for i, t in enumerate(trades)
+                    ],
+                )
+        finally:
+            conn.close()
+
+    def finish_run(self, run_id, metrics, buy_hold_metrics, num_trades, winning_trades, losing_trades):
+        """Record final metrics and trade counts of a chunked run."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE runs SET num_trades = ?, winning_trades = ?, losing_trades = ?, status = ? "
+                    "WHERE run_id = ?",
+                    (num_trades, winning_trades, losing_trades, RUN_COMPLETE, run_id),
+                )
+                metric_rows = [(run_id, "strategy", k, float(v)) for k, v in metrics.items()]
+                metric_rows += [(run_id, "buy_hold", k, float(v)) for k, v in buy_hold_metrics.items()]
+                conn.executemany(
+                    "INSERT OR REPLACE INTO run_metrics (run_id, scope, name, value) VALUES (?, ?, ?, ?)",
+                    metric_rows,
+                )
+        finally:
+            conn.close()
+
+    def fail_run(self, run_id):
+        """Mark a chunked run that stopped before finish_run as failed."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("UPDATE runs SET status = ? WHERE run_id = ?", (RUN_FAILED, run_id))
+        finally:
+            conn.close()
+
+    def run_status(self, run_id):
+        """Status of a run (RUN_RUNNING / RUN_COMPLETE / RUN_FAILED), or None if it does not exist."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT status FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        finally:
+            conn.close()
+        return None if row is None else row["status"]
+
+    def _metrics_for(self, conn, run_ids):
+        metrics = {run_id: {"metrics": {}, "buy_hold_metrics": {}} for run_id in run_ids}
+        if not run_ids:
+            return metrics
+
+        placeholders = ",".join("?" * len(run_ids))
+        rows = conn.execute(
+            f"SELECT run_id, scope, name, value FROM run_metrics WHERE run_id IN ({placeholders})",
+            list(run_ids),
+        )
+        for row in rows:
+            key = "metrics" if row["scope"] == "strategy" else "buy_hold_metrics"
+            metrics[row["run_id"]][key][row["name"]] = row["value"]
+        return metrics
+
+    def list_runs(self, symbol=None, strategy=None, since=None, until=None, limit=50, status=None):
+        """List runs (newest first) with their metrics, filtered on the indexed columns."""
+        clauses = []
+        params = []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if symbol:
+            clauses.append("symbol = ?")
+            params.append(symbol.upper())
+        if strategy:
+            clauses.append("strategy = ?")
+            params.append(strategy)
+        if since:
+            clauses.append("run_date >= ?")
+            params.append(since)
+        if until:
+            clauses.append("run_date <= ?")
+            params.append(until)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+
+        conn = self._connect()
+        try:
+            runs = [
+                dict(row) for row in conn.execute(
+                    f"SELECT * FROM runs {where} ORDER BY run_date DESC, run_id DESC LIMIT ?",
+                    params,
+                )
+            ]
+            metrics = self._metrics_for(conn, [r["run_id"] for r in runs])
+        finally:
+            conn.close()
+
+        for run in runs:
+            run.update(metrics[run["run_id"]])
+        return runs
+
+    def get_run(self, run_id, include_equity=True, include_trades=True):
+        """Full stored run, or None if it does not exist."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+
+            run = dict(row)
+            run.update(self._metrics_for(conn, [run_id])[run_id])
+
+            if include_equity:
+                run["equity_curve"] = [
+                    dict(r) for r in conn.execute(
+                        "SELECT date, equity, buy_hold FROM equity_points WHERE run_id = ? ORDER BY date",
+                        (run_id,),
+                    )
+                ]
+
+            if include_trades:
+                run["trades"] = self.get_trades(run_id, conn=conn)
+        finally:
+            conn.close()
+
+        return run
+
+    def get_trades(self, run_id, start=None, end=None, conn=None):
+        """Trades of a run in entry order, optionally limited to an entry-date range."""
+        own_conn = conn is None
+        if own_conn:
+            conn = self._connect()
+
+        clauses = ["run_id = ?"]
+        params = [run_id]
+        if start:
+            clauses.append("entry_date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("entry_date <= ?")
+            params.append(end)
+
+        try:
+            rows = conn.execute(
+                "SELECT trade_index, entry_date, exit_date, entry_price, exit_price, pnl, bullish_prob, features "
+                f"FROM trades WHERE {' AND '.join(clauses)} ORDER BY entry_date",
+                params,
+            ).fetchall()
+        finally:
+            if own_conn:
+                conn.close()
+
+        trades = []
+        for row in rows:
+            trade = dict(row)
+            trade["features"] = json.loads(trade["features"])
+            trades.append(trade)
+        return trades
+
+    def completed_runs_version(self):
+        """
+        (number of complete runs, highest complete run_id); changes whenever
+        a run is saved or a chunked run finishes.
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(run_id), 0) FROM runs WHERE status = ?", (RUN_COMPLETE,)
+            ).fetchone()
+            return tuple(row)
+        finally:
+            conn.close()
+
+    def all_trades(self, symbol=None, strategy=None):
+        """Trades across every complete run, tagged with run_id / symbol / strategy."""
+        clauses = ["r.status = ?"]
+        params = [RUN_COMPLETE]
+        if symbol:
+            clauses.append("r.symbol = ?")
+            params.append(symbol.upper())
+        if strategy:
+            clauses.append("r.strategy = ?")
+            params.append(strategy)
+        where = f"WHERE {' AND '.join(clauses)}"
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT t.run_id, r.symbol, r.strategy, t.trade_index, t.entry_date, t.exit_date, "
+                "t.entry_price, t.exit_price, t.pnl, t.bullish_prob, t.features "
+                f"FROM trades t JOIN runs r ON r.run_id = t.run_id {where} "
+                "ORDER BY t.run_id, t.trade_index",
+                params,
+            ).fetchall()
+        finally:
+            conn.close()
+
+        trades = []
+        for row in rows:
+            trade = dict(row)
+            trade["features"] = json.loads(trade["features"])
+            trades.append(trade)
+        return trades
+
+    def diff_runs(self, run_id_a, run_id_b):
+        """
+        Metric deltas (b - a) and trade-set overlap between two stored runs.
+        A delta is None when either side is missing or NULL (SQLite stores
+        NaN metrics, e.g. the Sharpe ratio of a run without trades, as NULL).
+        """
+        a = self.get_run(run_id_a, include_equity=False)
+        b = self.get_run(run_id_b, include_equity=False)
+        if a is None or b is None:
+            return None
+
+        def deltas(key):
+            names = set(a[key]) | set(b[key])
+            return {
+                name: {
+                    "a": a[key].get(name),
+                    "b": b[key].get(name),
+                    "delta": (
+                        b[key][name] - a[key][name]
+                        if a[key].get(name) is not None and b[key].get(name) is not None else None
+                    ),
+                }
+                for name in sorted(names)
+            }
+
+        entries_a = {t["entry_date"] for t in a["trades"]}
+        entries_b = {t["entry_date"] for t in b["trades"]}
+
+        return {
+            "run_a": {k: a[k] for k in ("run_id", "symbol", "strategy", "run_date")},
+            "run_b": {k: b[k] for k in ("run_id", "symbol", "strategy", "run_date")},
+            "metrics": deltas("metrics"),
+            "buy_hold_metrics": deltas("buy_hold_metrics"),
+            "trades": {
+                "common_entries": len(entries_a & entries_b),
+                "only_in_a": sorted(entries_a - entries_b),
+                "only_in_b": sorted(entries_b - entries_a),
+            },
+        }
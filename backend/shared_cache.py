@@ -0,0 +1,209 @@
+"""
+Cross-process cache for read-only NumPy arrays.
+
+With several uvicorn workers each process used to build and hold its own
+copy of every dataset and model. Entries published here are written once
+as .npy files and attached by every worker with np.load(mmap_mode="r"),
+so all processes share the same pages of the OS page cache. The default
+root is on /dev/shm (RAM-backed) when available.
+
+Each data source and cache schema gets its own directory under the root
+(e.g. yfinance-v2/), so synthetic prices from a stub server never leak
+into the cache a real server reads, and entries written by older code
+are never attached by newer code. Layout under that directory:
+
+    {namespace}/{key}.json          pointer: current version, arrays, meta
+    {namespace}/{key}.lock          builder lock (fcntl, where available)
+    {namespace}/{key}@{version}/    one .npy file per array
+
+Readers never lock: a pointer is replaced atomically with os.replace only
+after its version directory is complete, so a reader sees either the old
+or the new entry. Builders take the key's file lock so only one worker
+computes an entry while the others wait and then attach it.
+"""
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from market_data import data_source_name
+
+# Optional: cross-process builder lock (POSIX only)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+DEFAULT_ROOT = (
+    "/dev/shm/ai-trading-tutor"
+    if os.path.isdir("/dev/shm")
+    else os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "shared_cache")
+)
+
+# Entries older than this are rebuilt (prices change daily)
+DEFAULT_TTL = 12 * 3600
+
+# Bump whenever the arrays published under any namespace change layout
+# (2: one model per prediction horizon, 3: models carry the newest feature row)
+SCHEMA_VERSION = 4
+
+
+class SharedArrayStore:
+    """Publish/attach named groups of arrays shared by every worker process."""
+
+    def __init__(self, root=DEFAULT_ROOT, ttl=DEFAULT_TTL):
+        self.root = root
+        self.ttl = ttl
+
+    def _base(self, namespace, key):
+        directory = os.path.join(self.root, namespace)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, str(key).replace(os.sep, "_"))
+
+    def get(self, namespace, key):
+        """
+        Attach an entry read-only and zero-copy.
+
+        Returns:
+            (arrays dict of read-only memmaps, meta dict), or None when the
+            entry is missing or older than ttl. meta["created"] is the
+            publish time, so holders can tell when to attach again.
+        """
+        base = self._base(namespace, key)
+        try:
+            with open(base + ".json") as f:
+                pointer = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if self.ttl is not None and time.time() - pointer["created"] > self.ttl:
+            return None
+
+        directory = f"{base}@{pointer['version']}"
+        try:
+            arrays = {
+                name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+                for name in pointer["arrays"]
+            }
+        except FileNotFoundError:
+            # Replaced and cleaned up between reading the pointer and attaching
+            return None
+        return arrays, {**pointer["meta"], "created": pointer["created"]}
+
+    def is_fresh(self, created):
+        """Whether an entry published at `created` is still within ttl."""
+        return self.ttl is None or time.time() - created <= self.ttl
+
+    def publish(self, namespace, key, arrays, meta=None):
+        """Write a new version of an entry and switch the pointer to it atomically."""
+        base = self._base(namespace, key)
+        version = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        directory = f"{base}@{version}"
+
+        tmp = directory + ".tmp"
+        os.makedirs(tmp)
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(values))
+        os.rename(tmp, directory)
+
+        pointer = {
+            "version": version,
+            "created": time.time(),
+            "arrays": list(arrays),
+            "meta": meta or {},
+        }
+        tmp_pointer = f"{base}.json.{uuid.uuid4().hex[:8]}"
+        with open(tmp_pointer, "w") as f:
+            json.dump(pointer, f)
+        os.replace(tmp_pointer, base + ".json")
+
+        self._remove_old_versions(base, version)
+        return self.get(namespace, key)
+
+    def _remove_old_versions(self, base, keep):
+        # Workers still mapping an old version keep their pages (POSIX
+        # unlink semantics); new readers only ever follow the pointer.
+        directory, name = os.path.split(base)
+        for entry in os.listdir(directory):
+            if entry.startswith(name + "@") and entry != f"{name}@{keep}" and not entry.endswith(".tmp"):
+                shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+    def get_or_create(self, namespace, key, build):
+        """
+        Attach an entry, building and publishing it first if needed.
+
+        Args:
+            namespace: Entry group, e.g. "datasets" or "models"
+            key: Entry name within the namespace, e.g. the symbol
+            build: Callable returning (arrays dict, meta dict); runs in at
+                most one process at a time per key
+        """
+        entry = self.get(namespace, key)
+        if entry is not None:
+            return entry
+
+        with open(self._base(namespace, key) + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Another worker may have published while we waited
+                entry = self.get(namespace, key)
+                if entry is None:
+                    arrays, meta = build()
+                    entry = self.publish(namespace, key, arrays, meta)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        return entry
+
+    def clear(self, namespace=None):
+        """Remove every entry (or one namespace) for all workers."""
+        target = os.path.join(self.root, namespace) if namespace else self.root
+        shutil.rmtree(target, ignore_errors=True)
+
+
+def frame_to_arrays(df):
+    """Numeric DataFrame with a DatetimeIndex -> (arrays, meta) for publish()."""
+    arrays = {"index": df.index.to_numpy()}
+    for i, column in enumerate(df.columns):
+        arrays[f"col{i}"] = df[column].to_numpy()
+    return arrays, {"columns": list(df.columns), "index_name": df.index.name}
+
+
+def frame_from_arrays(arrays, meta):
+    """DataFrame over attached arrays (columns stay read-only memmaps)."""
+    index = pd.DatetimeIndex(arrays["index"], name=meta.get("index_name"))
+    return pd.DataFrame(
+        {column: arrays[f"col{i}"] for i, column in enumerate(meta["columns"])},
+        index=index,
+        copy=False,
+    )
+
+
+_shared_store = None
+
+
+def get_shared_store():
+    """
+    Process-wide store under {root}/{data source}-v{SCHEMA_VERSION}.
+    TUTOR_SHARED_CACHE_DIR overrides the root and TUTOR_SHARED_CACHE_TTL
+    the entry lifetime in seconds.
+    """
+    global _shared_store
+    if _shared_store is None:
+        root = os.environ.get("TUTOR_SHARED_CACHE_DIR", DEFAULT_ROOT)
+        _shared_store = SharedArrayStore(
+            root=os.path.join(root, f"{data_source_name()}-v{SCHEMA_VERSION}"),
+            ttl=float(os.environ.get("TUTOR_SHARED_CACHE_TTL", DEFAULT_TTL)),
+        )
+    return _shared_store
+
+
+def set_shared_store(store):
+    global _shared_store
+    _shared_store = store
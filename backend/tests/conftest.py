@@ -0,0 +1,46 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the API's run database and shared cache out of backend/data; read
+# when main is first imported
+SCRATCH_DIR = tempfile.mkdtemp(prefix="tutor-tests-")
+os.environ["TUTOR_RUN_DB"] = os.path.join(SCRATCH_DIR, "runs.sqlite3")
+os.environ["TUTOR_SHARED_CACHE_DIR"] = os.path.join(SCRATCH_DIR, "shared")
+
+from market_data import MarketDataDownloader, get_downloader, set_downloader, synthetic_prices
+
+class SyntheticSource:
+    """
+    Price source serving market_data.synthetic_prices. Each bar's value
+    depends only on the symbol and date; the series runs up to today so
+    the trailing-window paths (build_feature_tail) see recent bars.
+    """
+
+    def fetch(self, symbols, start):
+        return {symbol: synthetic_prices(symbol, start) for symbol in symbols}
+
+
+@pytest.fixture(autouse=True, scope="session")
+def synthetic_market_data():
+    previous = get_downloader()
+    set_downloader(MarketDataDownloader(SyntheticSource(), rate=1000, burst=1000))
+    yield
+    set_downloader(previous)
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient for the API (imports main, so only for tests that need it)."""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from ai_explainer import (
+    LESSONS,
+    _lesson_category,
+    classify_lessons,
+    explain_trade,
+    explain_trades_batch,
+    lesson_stats,
+)
+from backtest_strategy import backtest_strategy
+
+
+def boundary_trades():
+    """Trades sitting exactly on every threshold the lesson rules compare against."""
+    base = {
+        "return_5d": 0.01, "return_20d": 0.02, "ma_ratio": 1.01, "trend_slope_20d": 0.001,
+        "rsi": 50.0, "atr": 0.01, "volatility_20d": 0.01, "regime_stress": 0,
+        "relative_strength_spy": 0.0,
+    }
+    variants = [
+        {}, {"rsi": 70.0}, {"rsi": 70.01}, {"rsi": 30.0}, {"rsi": 29.99},
+        {"volatility_20d": 0.04}, {"volatility_20d": 0.0401}, {"regime_stress": 1},
+        {"return_5d": 0.0}, {"return_5d": -0.001}, {"ma_ratio": 1.0}, {"ma_ratio": 0.99, "return_5d": 0.0},
+    ]
+    trades = []
+    for i, variant in enumerate(variants):
+        for prob in (0.549, 0.55, 0.65, 0.7):
+            for pnl in (0.0, 0.01):
+                trades.append({
+                    "entry_price": 100.0 + i, "exit_price": 100.0 * (1 + pnl), "pnl": pnl,
+                    "bullish_prob": prob, "features": {**base, **variant},
+                })
+    # Optional features missing: both paths fall back to the same defaults
+    sparse = dict(trades[0], features={k: v for k, v in base.items()
+                                       if k not in ("regime_stress", "trend_slope_20d", "relative_strength_spy")})
+    return trades + [sparse]
+
+
+def run_trades():
+    trades = []
+    for symbol, strategy in [("SPY", "ultra"), ("NVDA", "aggressive"), ("TSLA", "conservative")]:
+        trades += backtest_strategy(strategy, symbol)[1]
+    return trades
+
+
+@pytest.mark.parametrize("make_trades", [run_trades, boundary_trades])
+def test_batch_explanations_match_per_trade(make_trades):
+    trades = make_trades()
+    explanations, categories = explain_trades_batch(trades)
+
+    assert len(trades) > 20
+    assert explanations == [explain_trade(t) for t in trades]
+    assert categories.tolist() == [_lesson_category(t["features"], t["bullish_prob"]) for t in trades]
+    assert classify_lessons(trades).tolist() == categories.tolist()
+
+
+def test_boundary_trades_reach_every_category():
+    categories = set(classify_lessons(boundary_trades()).tolist())
+    assert categories == set(LESSONS)
+
+
+def test_lesson_stats_count_and_win_rate():
+    trades = boundary_trades()
+    categories = classify_lessons(trades)
+    pnl = np.array([t["pnl"] for t in trades])
+
+    stats = {s["category"]: s for s in lesson_stats(categories, pnl)}
+    assert sum(s["count"] for s in stats.values()) == len(trades)
+    for name, s in stats.items():
+        mask = categories == name
+        assert s["count"] == mask.sum()
+        assert s["win_rate"] == pytest.approx((pnl[mask] > 0).mean())
+        assert s["avg_pnl"] == pytest.approx(pnl[mask].mean())
+    assert explain_trades_batch([])[0] == []
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from backtest_strategy import backtest_strategy
+from paper_trading import PaperTradingEngine, prepare_bars, stored_bar_feed
+
+
+@pytest.mark.parametrize("strategy_type", ["conservative", "aggressive", "ultra"])
+def test_paper_engine_matches_batch_backtest(strategy_type):
+    test_df, trades = backtest_strategy(strategy_type, "SPY")
+
+    engine = PaperTradingEngine(strategy_type)
+    results = engine.replay(stored_bar_feed({"SPY": prepare_bars("SPY")}))["SPY"]
+
+    assert len(trades) > 0
+    np.testing.assert_array_equal(results["equity"].index, test_df.index)
+    np.testing.assert_allclose(results["equity"].to_numpy(), test_df["equity"].to_numpy())
+    assert results["trades"] == trades
+
+
+def test_trade_features_keep_integer_flags():
+    _, trades = backtest_strategy("aggressive", "SPY")
+
+    for trade in trades:
+        assert type(trade["features"]["regime_stress"]) is int
+        assert type(trade["features"]["rsi"]) is float
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from dataset_builder import FEATURE_COLUMNS, add_features, build_feature_frame, load_with_benchmark
+
+
+def legacy_features(df):
+    """The hand-written indicator code the feature graph replaced."""
+    df["return_5d"] = df["Close"].pct_change(5)
+    df["return_20d"] = df["Close"].pct_change(20)
+    ma_20 = df["Close"].rolling(20).mean()
+    df["ma_ratio"] = df["Close"] / ma_20
+    df["trend_slope_20d"] = (ma_20 - ma_20.shift(5)) / ma_20.shift(5)
+
+    delta = df["Close"].diff()
+    avg_gain = delta.clip(lower=0).rolling(14).mean()
+    avg_loss = (-delta.clip(upper=0)).rolling(14).mean()
+    df["rsi"] = 100 - (100 / (1 + avg_gain / avg_loss))
+
+    df["atr"] = df["Close"].rolling(14).std() / df["Close"]
+    df["volatility_20d"] = df["Close"].pct_change().rolling(20).std()
+    df["regime_stress"] = (df["volatility_20d"] > df["volatility_20d"].quantile(0.7)).astype(int)
+    df["relative_strength_spy"] = df["Close"].pct_change(20) - df["SPY_Close"].pct_change(20)
+    return df
+
+
+@pytest.mark.parametrize("symbol", ["SPY", "NVDA"])
+def test_feature_graph_matches_legacy_features(symbol):
+    expected = legacy_features(load_with_benchmark(symbol)).dropna(subset=FEATURE_COLUMNS)
+    frame = build_feature_frame(symbol)
+
+    pd.testing.assert_index_equal(frame.index, expected.index)
+    pd.testing.assert_frame_equal(frame[FEATURE_COLUMNS], expected[FEATURE_COLUMNS])
+
+
+def test_feature_subset_computes_only_requested_columns():
+    prices = load_with_benchmark("NVDA")
+    full = add_features(prices.copy())
+
+    subset = add_features(prices.copy(), ["rsi", "trend_slope_20d"])
+    assert set(subset.columns) - set(prices.columns) == {"rsi", "trend_slope_20d"}
+    pd.testing.assert_frame_equal(subset[["rsi", "trend_slope_20d"]], full[["rsi", "trend_slope_20d"]])
@@ -0,0 +1,30 @@
+import main
+from dataset_builder import build_dataset
+
+
+def test_cached_and_tail_previews_serve_identical_rows(client):
+    params = {"symbol": "AMD", "rows": 25}
+    main._model_cache.pop("AMD", None)
+
+    tail = client.get("/api/dataset/preview", params=params).json()
+    main.get_symbol_model("AMD")
+    cached = client.get("/api/dataset/preview", params=params).json()
+
+    assert (tail["source"], cached["source"]) == ("tail", "cache")
+    assert len(cached["data"]) == 25
+    assert cached["data"] == tail["data"]
+    assert set(cached) == set(tail)
+
+
+def test_preview_values_are_float64_rounded(client):
+    main.get_symbol_model("AMD")
+    row = client.get("/api/dataset/preview", params={"symbol": "AMD", "rows": 1}).json()["data"][-1]
+
+    close = build_dataset("AMD")["Close"].iloc[-1]
+    assert row["close"] == float(f"{close:.{main.PREVIEW_DIGITS}g}")
+
+
+def test_preview_rows_are_bounded(client):
+    for rows in (0, main.PREVIEW_MAX_ROWS + 1):
+        response = client.get("/api/dataset/preview", params={"symbol": "AMD", "rows": rows})
+        assert response.status_code == 422
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_strategy import (
+    calculate_drawdown,
+    find_drawdown_periods,
+    find_max_drawdown_period,
+    trades_during_period,
+)
+
+
+def drawdown_episodes_by_loop(equity):
+    """Reference: walk the curve bar by bar, tracking the open episode."""
+    values = equity.to_numpy()
+    episodes = []
+    peak = 0
+    current = None
+    for i, value in enumerate(values):
+        if value >= values[peak]:
+            if current is not None:
+                current["recovery"] = i
+                episodes.append(current)
+                current = None
+            if value > values[peak]:
+                peak = i
+            continue
+        depth = (value - values[peak]) / values[peak]
+        if current is None:
+            current = {"peak": peak, "trough": i, "depth": depth, "recovery": None}
+        elif depth < current["depth"]:
+            current["trough"], current["depth"] = i, depth
+    if current is not None:
+        episodes.append(current)
+    return episodes
+
+
+def random_equity(seed, n=500):
+    rng = np.random.default_rng(seed)
+    values = 10_000 * np.cumprod(1 + rng.normal(0.0003, 0.01, n))
+    return pd.Series(values, index=pd.bdate_range("2020-01-01", periods=n))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_drawdown_periods_match_loop(seed):
+    equity = random_equity(seed)
+    index = equity.index
+
+    expected = drawdown_episodes_by_loop(equity)
+    periods = find_drawdown_periods(equity)
+
+    assert len(periods) == len(expected)
+    by_peak = {period["peak_date"]: period for period in periods}
+    for episode in expected:
+        period = by_peak[index[episode["peak"]]]
+        assert period["trough_date"] == index[episode["trough"]]
+        assert period["depth"] == pytest.approx(episode["depth"])
+        recovery = episode["recovery"]
+        assert period["recovery_date"] == (index[recovery] if recovery is not None else None)
+
+    depths = [period["depth"] for period in periods]
+    assert depths == sorted(depths)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_deepest_drawdown_matches_max_drawdown_period(seed):
+    equity = random_equity(seed)
+    peak_date, trough_date, depth = find_max_drawdown_period(equity)
+
+    deepest = find_drawdown_periods(equity, top=1)[0]
+    assert deepest["peak_date"] == peak_date
+    assert deepest["trough_date"] == trough_date
+    assert deepest["depth"] == pytest.approx(depth)
+    assert deepest["depth"] == pytest.approx(calculate_drawdown(equity).min())
+
+
+def test_drawdown_top_n_is_prefix_of_full_ranking():
+    equity = random_equity(7)
+    full = find_drawdown_periods(equity)
+
+    for top in (1, 3, len(full)):
+        assert find_drawdown_periods(equity, top=top) == full[:top]
+    assert find_drawdown_periods(equity, top=0) == []
+    assert find_drawdown_periods(pd.Series([1.0, 2.0, 3.0], index=equity.index[:3])) == []
+
+
+def test_trades_during_period_matches_linear_filter():
+    rng = np.random.default_rng(3)
+    entries = pd.DatetimeIndex(sorted(rng.choice(pd.bdate_range("2020-01-01", periods=300), 120)))
+    trades = [{"entry_date": entry, "pnl": float(rng.normal())} for entry in entries]
+    entry_dates = [t["entry_date"] for t in trades]
+
+    # Bounds on and between entry dates (duplicates included) and outside the range
+    bounds = list(entries[::7]) + [entries[0] - pd.Timedelta(days=10), entries[-1] + pd.Timedelta(days=10)]
+    for start in bounds:
+        for end in bounds:
+            expected = [t for t in trades if start <= t["entry_date"] <= end]
+            assert trades_during_period(trades, start, end) == expected
+            assert trades_during_period(trades, start, end, entry_dates) == expected
+
+
+def test_run_drawdowns_list_trades_between_peak_and_trough(client):
+    run_id = client.get("/api/backtest", params={"symbol": "SPY", "strategy": "aggressive", "persist": True}).json()["run_id"]
+    trades = client.get(f"/api/runs/{run_id}", params={"include_equity": False}).json()["trades"]
+
+    periods = client.get(f"/api/runs/{run_id}/drawdowns", params={"top": 3}).json()["drawdowns"]
+
+    assert 0 < len(periods) <= 3
+    assert [p["rank"] for p in periods] == list(range(1, len(periods) + 1))
+    assert [p["depth"] for p in periods] == sorted(p["depth"] for p in periods)
+    for period in periods:
+        expected = [t["entry_date"] for t in trades if period["peak_date"] <= t["entry_date"] <= period["trough_date"]]
+        assert [t["entry_date"] for t in period["trades"]] == expected
+        assert period["num_trades"] == len(expected)
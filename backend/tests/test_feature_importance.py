@@ -0,0 +1,19 @@
+import pytest
+
+from dataset_builder import FEATURE_COLUMNS
+
+
+@pytest.mark.parametrize("n_repeats", [0, -1, 51])
+def test_out_of_range_repeats_are_rejected(client, n_repeats):
+    response = client.get("/api/feature-importance", params={"symbol": "SPY", "n_repeats": n_repeats})
+    assert response.status_code == 422
+
+
+def test_importance_covers_every_feature_sorted(client):
+    response = client.get("/api/feature-importance", params={"symbol": "SPY", "n_repeats": 2})
+    assert response.status_code == 200
+
+    features = response.json()["features"]
+    assert sorted(f["name"] for f in features) == sorted(FEATURE_COLUMNS)
+    importances = [f["permutation_importance"] for f in features]
+    assert importances == sorted(importances, reverse=True)
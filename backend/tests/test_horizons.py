@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from dataset_builder import (
+    FEATURE_COLUMNS,
+    HORIZONS,
+    PREDICTION_HORIZON,
+    add_targets,
+    build_dataset,
+    horizon_columns,
+    load_with_benchmark,
+)
+from train_trend_model import TEST_START, make_trend_pipeline, train_horizon_models, train_trend_model
+
+
+def legacy_targets(df, horizon):
+    """Per-horizon targets as computed before the single-pass add_targets."""
+    future = df["Close"].shift(-horizon) / df["Close"] - 1
+    volatility = df["Close"].pct_change().rolling(horizon).std().shift(-horizon)
+    return future, (future > 0).astype(int), volatility
+
+
+def test_single_pass_targets_match_per_horizon_targets():
+    prices = load_with_benchmark("SPY")
+    df = add_targets(prices.copy(), HORIZONS)
+
+    for horizon in HORIZONS:
+        future_col, trend_col, vol_col, _ = horizon_columns(horizon)
+        future, trend, volatility = legacy_targets(prices, horizon)
+
+        np.testing.assert_allclose(df[future_col], future, rtol=1e-12)
+        np.testing.assert_array_equal(df[trend_col], trend)
+        if horizon > 1:
+            np.testing.assert_allclose(df[vol_col], volatility, rtol=1e-9)
+        else:
+            assert df[vol_col].isna().all()
+
+
+def test_multi_horizon_dataset_keeps_default_rows_and_columns():
+    default = build_dataset("SPY")
+    multi = build_dataset("SPY", horizons=HORIZONS)
+
+    pd.testing.assert_frame_equal(multi[default.columns], default)
+    for horizon in HORIZONS:
+        assert set(horizon_columns(horizon)) <= set(multi.columns)
+
+
+def test_default_horizon_model_matches_trend_model():
+    df = build_dataset("SPY", horizons=HORIZONS)
+    models = train_horizon_models("SPY", df=df, n_jobs=1)
+    single = train_trend_model("SPY", df=df)
+
+    X = df[FEATURE_COLUMNS]
+    np.testing.assert_allclose(
+        models[PREDICTION_HORIZON].predict_proba(X)[:, 1],
+        single.predict_proba(X)[:, 1],
+        rtol=1e-6,
+    )
+
+
+def test_every_horizon_model_matches_a_separate_fit():
+    df = build_dataset("SPY", horizons=HORIZONS)
+    models = train_horizon_models("SPY", df=df, n_jobs=2)
+    X = df[FEATURE_COLUMNS]
+
+    for horizon in HORIZONS:
+        future_col, target_col, _, _ = horizon_columns(horizon)
+        train = df[(df.index < TEST_START) & df[future_col].notna()]
+        separate = make_trend_pipeline().fit(train[FEATURE_COLUMNS], train[target_col])
+
+        np.testing.assert_allclose(
+            models[horizon].predict_proba(X)[:, 1],
+            separate.predict_proba(X)[:, 1],
+            rtol=1e-6,
+        )
+
+
+def test_predict_endpoint_serves_every_horizon(client):
+    probs = {}
+    for horizon in HORIZONS:
+        response = client.get("/api/predict", params={"symbol": "SPY", "horizon": horizon})
+        assert response.status_code == 200
+        assert response.json()["horizon"] == horizon
+        probs[horizon] = response.json()["bullish_prob"]
+
+    assert all(0 <= p <= 1 for p in probs.values())
+    assert client.get("/api/predict", params={"symbol": "SPY", "horizon": 999}).status_code == 400
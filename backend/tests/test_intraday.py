@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_builder import add_features
+from intraday import CHUNK_FEATURES, FEATURE_LOOKBACK, StreamingFeatureBuilder
+
+HORIZON = 30
+
+
+def minute_bars(n=1200, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-02 09:30", periods=n, freq="min")
+    return pd.DataFrame({
+        "Close": 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n))),
+        "SPY_Close": 400 * np.exp(np.cumsum(rng.normal(0, 0.0008, n))),
+    }, index=index)
+
+
+def single_pass(bars):
+    """Reference: every feature and target over the whole series at once."""
+    df = add_features(bars.copy(), CHUNK_FEATURES)
+    close = df["Close"].to_numpy()
+    future = np.full(len(close), np.nan)
+    future[:-HORIZON] = close[HORIZON:] / close[:-HORIZON] - 1
+    df["future_return"] = future
+    return df.dropna(subset=CHUNK_FEATURES + ["future_return"])
+
+
+def streamed(bars, chunk_size):
+    builder = StreamingFeatureBuilder(horizon=HORIZON)
+    parts = [builder.push(bars.iloc[i:i + chunk_size]) for i in range(0, len(bars), chunk_size)]
+    builder.flush()
+    return pd.concat(parts)
+
+
+@pytest.mark.parametrize("chunk_size", [5, FEATURE_LOOKBACK - 1, FEATURE_LOOKBACK, 390, 1200])
+def test_chunked_features_match_one_pass(chunk_size):
+    bars = minute_bars()
+    expected = single_pass(bars)
+    rows = streamed(bars, chunk_size)
+
+    pd.testing.assert_index_equal(rows.index, expected.index)
+    # regime_stress uses a running quantile when streaming, so it differs by design
+    for column in CHUNK_FEATURES + ["Close", "future_return"]:
+        np.testing.assert_allclose(rows[column], expected[column], rtol=1e-9, err_msg=column)
+    np.testing.assert_array_equal(rows["target_trend"], (expected["future_return"] > 0).astype(int))
+    assert set(rows["regime_stress"].unique()) <= {0, 1}
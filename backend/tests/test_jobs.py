@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from jobs import CANCELLED, COMPLETED, FAILED, QUEUED, RUNNING, JobManager, JobStore, QueueFull
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class Handlers:
+    """Job functions for tests; `gate` holds "block" jobs until it is set."""
+
+    def __init__(self, manager):
+        self.gate = threading.Event()
+        self.ran = []
+        manager.register("record", self.record)
+        manager.register("block", self.block)
+        manager.register("loop", self.loop)
+        manager.register("fail", self.fail)
+
+    def record(self, job, name):
+        self.ran.append(name)
+        return {"name": name}
+
+    def block(self, job):
+        self.gate.wait(5)
+        return None
+
+    def loop(self, job, steps):
+        for step in range(steps):
+            job.report("step", 100 * step / steps, step=step)
+            time.sleep(0.01)
+        return {"steps": steps}
+
+    def fail(self, job):
+        raise RuntimeError("boom")
+
+
+@pytest.fixture
+def manager():
+    return JobManager(max_workers=1, max_queued=5)
+
+
+def test_jobs_run_by_priority_then_submission_order(manager):
+    handlers = Handlers(manager)
+    blocker = manager.submit("block", {})
+    wait_for(lambda: blocker.status == RUNNING)
+
+    jobs = [
+        manager.submit("record", {"name": "low"}, priority=9),
+        manager.submit("record", {"name": "high-1"}, priority=1),
+        manager.submit("record", {"name": "mid"}, priority=5),
+        manager.submit("record", {"name": "high-2"}, priority=1),
+    ]
+    handlers.gate.set()
+    wait_for(lambda: all(job.status == COMPLETED for job in jobs))
+
+    assert handlers.ran == ["high-1", "high-2", "mid", "low"]
+    assert jobs[0].result == {"name": "low"}
+
+
+def test_cancel_queued_and_running_jobs(manager):
+    handlers = Handlers(manager)
+    running = manager.submit("loop", {"steps": 500})
+    wait_for(lambda: running.status == RUNNING)
+    queued = manager.submit("record", {"name": "never"})
+
+    assert manager.cancel(queued.job_id)["status"] == CANCELLED
+    manager.cancel(running.job_id)
+    wait_for(lambda: running.status == CANCELLED)
+
+    assert running.percent < 100
+    assert handlers.ran == []
+    assert manager.cancel("missing") is None
+
+
+def test_queue_is_bounded(manager):
+    handlers = Handlers(manager)
+    blocker = manager.submit("block", {})
+    wait_for(lambda: blocker.status == RUNNING)
+
+    for _ in range(5):
+        manager.submit("record", {"name": "queued"})
+    with pytest.raises(QueueFull):
+        manager.submit("record", {"name": "overflow"})
+    with pytest.raises(ValueError):
+        manager.submit("unknown", {})
+    handlers.gate.set()
+
+
+def test_failed_job_reports_error(manager):
+    Handlers(manager)
+    job = manager.submit("fail", {})
+    wait_for(lambda: job.status == FAILED)
+    assert job.error == "boom"
+
+
+def test_progress_streams_to_subscribers(manager):
+    handlers = Handlers(manager)
+
+    async def collect():
+        # Hold the only worker so the subscription exists before the job starts
+        manager.submit("block", {})
+        target = manager.submit("loop", {"steps": 3})
+        queue = manager.subscribe(target.job_id, asyncio.get_running_loop())
+        handlers.gate.set()
+
+        events = []
+        while not events or events[-1]["type"] not in (COMPLETED, FAILED, CANCELLED):
+            events.append(await asyncio.wait_for(queue.get(), timeout=10))
+        return target, events
+
+    target, events = asyncio.run(collect())
+
+    assert [e["type"] for e in events] == ["started", "progress", "progress", "progress", COMPLETED]
+    assert [e["partial"] for e in events[1:4]] == [{"step": 0}, {"step": 1}, {"step": 2}]
+    assert events[-1]["percent"] == 100.0
+    assert target.result == {"steps": 3}
+
+
+def test_jobs_are_shared_through_the_store(tmp_path):
+    # Two managers on one database stand in for two server processes
+    path = str(tmp_path / "jobs.sqlite3")
+    owner = JobManager(max_workers=1, max_queued=5, store=JobStore(path))
+    other = JobManager(max_workers=1, max_queued=5, store=JobStore(path))
+    handlers = Handlers(owner)
+
+    running = owner.submit("loop", {"steps": 500})
+    wait_for(lambda: running.status == RUNNING)
+    queued = owner.submit("record", {"name": "never"})
+
+    assert other.get(running.job_id) is None
+    assert other.snapshot(running.job_id)["status"] == RUNNING
+    assert other.snapshot(queued.job_id)["status"] == QUEUED
+    assert {job["job_id"] for job in other.list()} == {running.job_id, queued.job_id}
+
+    assert other.cancel(queued.job_id)["status"] == CANCELLED
+    other.cancel(running.job_id)
+    wait_for(lambda: running.status == CANCELLED)
+    wait_for(lambda: queued.status == CANCELLED)
+
+    assert handlers.ran == []
+    assert other.snapshot(running.job_id)["status"] == CANCELLED
+    assert other.cancel("missing") is None
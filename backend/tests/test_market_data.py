@@ -0,0 +1,171 @@
+import threading
+import time
+import urllib.error
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import market_data
+from market_data import (
+    HttpCsvSource,
+    MarketDataDownloader,
+    StubPriceServer,
+    TokenBucket,
+    split_by_symbol,
+    synthetic_prices,
+)
+
+START = "2024-01-01"
+
+
+@pytest.fixture
+def stub():
+    with StubPriceServer() as server:
+        yield server
+
+
+def downloader_for(server, **kwargs):
+    kwargs = {"rate": 1000, "burst": 1000, "backoff": 0.01, **kwargs}
+    return MarketDataDownloader(HttpCsvSource(server.url), **kwargs)
+
+
+def requested_symbols(server):
+    return [request.split("symbols=")[1].split("&")[0].replace("%2C", ",") for request in server.requests]
+
+
+def test_bulk_download_splits_into_symbol_frames(stub):
+    frames = downloader_for(stub).get_many(["spy", "QQQ", "NVDA"], START)
+
+    assert list(frames) == ["SPY", "QQQ", "NVDA"]
+    assert requested_symbols(stub) == ["SPY,QQQ,NVDA"]
+    for symbol, frame in frames.items():
+        expected = synthetic_prices(symbol, START)
+        np.testing.assert_array_equal(frame.index, expected.index)
+        np.testing.assert_allclose(frame["Close"], expected["Close"])
+
+
+def test_symbols_are_batched(stub):
+    downloader_for(stub, batch_size=2).get_many(["A", "B", "C"], START)
+    assert requested_symbols(stub) == ["A,B", "C"]
+
+
+def test_results_are_cached_until_ttl(stub):
+    downloader = downloader_for(stub, ttl=0.2)
+    downloader.get("SPY", START)
+    downloader.get("SPY", START)
+    assert len(stub.requests) == 1
+
+    time.sleep(0.25)
+    downloader.get("SPY", START)
+    assert len(stub.requests) == 2
+
+
+def test_retries_5xx_with_backoff(stub):
+    stub.fail_first = 2
+    frames = downloader_for(stub, max_retries=3).get_many(["SPY", "QQQ"], START)
+
+    assert set(frames) == {"SPY", "QQQ"}
+    assert len(stub.requests) == 3
+
+
+def test_gives_up_after_max_retries(stub):
+    stub.fail_first = 10
+    downloader = downloader_for(stub, max_retries=2)
+
+    with pytest.raises(urllib.error.HTTPError):
+        downloader.get_many(["SPY", "QQQ"], START)
+    assert len(stub.requests) == 3
+
+    frames, errors = downloader.get_available(["SPY"], START)
+    assert frames == {} and isinstance(errors["SPY"], urllib.error.HTTPError)
+
+
+def test_concurrent_requests_for_a_symbol_share_one_download():
+    with StubPriceServer(delay=0.2) as stub:
+        downloader = downloader_for(stub)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(downloader.get("SPY", START)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(stub.requests) == 1
+    assert len(results) == 8 and all(frame is results[0] for frame in results)
+
+
+def test_token_bucket_throttles_downloads(stub):
+    downloader = downloader_for(stub, rate=10, burst=1)
+    started = time.monotonic()
+    for symbol in ["A", "B", "C", "D"]:
+        downloader.get(symbol, START)
+
+    # One token up front, then one every 0.1 s
+    assert time.monotonic() - started >= 0.28
+
+
+def test_token_bucket_allows_burst_then_rate():
+    bucket = TokenBucket(rate=20, capacity=3)
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.05
+    for _ in range(2):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.09
+
+
+def frame(values, index):
+    return pd.DataFrame({"Close": values, "Volume": values}, index=index)
+
+
+def test_split_by_symbol_handles_both_column_layouts():
+    index = pd.bdate_range(START, periods=3)
+    spy = frame([1.0, 2.0, 3.0], index)
+    qqq = frame([4.0, np.nan, 6.0], index)
+
+    by_ticker = pd.concat({"SPY": spy, "QQQ": qqq}, axis=1)
+    by_field = by_ticker.swaplevel(axis=1)
+
+    for combined in (by_ticker, by_field):
+        frames = split_by_symbol(combined, ["SPY", "QQQ", "MISSING"])
+        assert list(frames) == ["SPY", "QQQ"]
+        pd.testing.assert_frame_equal(frames["SPY"], spy, check_names=False)
+        # Rows with missing values are dropped per symbol
+        assert frames["QQQ"].index.tolist() == [index[0], index[2]]
+
+    single = split_by_symbol(spy, ["SPY"])
+    pd.testing.assert_frame_equal(single["SPY"], spy)
+
+
+class PartialSource:
+    """Synthetic prices for every symbol except `missing` (as yf.download reports failures)."""
+
+    def __init__(self, missing):
+        self.missing = missing
+
+    def fetch(self, symbols, start):
+        return {s: synthetic_prices(s, start) for s in symbols if s != self.missing}
+
+
+def test_batch_endpoints_report_per_symbol_errors(client, monkeypatch):
+    monkeypatch.setattr(
+        market_data, "_downloader",
+        MarketDataDownloader(PartialSource("ZZZZ"), rate=1000, burst=1000, backoff=0.01),
+    )
+
+    response = client.post("/api/predict/batch", json={"symbols": ["SPY", "ZZZZ"]})
+    assert response.status_code == 200
+    predictions = {p["symbol"]: p for p in response.json()["predictions"]}
+    assert 0 <= predictions["SPY"]["bullish_prob"] <= 1
+    assert "ZZZZ" in predictions["ZZZZ"]["error"]
+
+    response = client.post("/api/warmup", json={"symbols": ["QQQ", "ZZZZ"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body["rows"]) == {"QQQ"}
+    assert set(body["errors"]) == {"ZZZZ"}
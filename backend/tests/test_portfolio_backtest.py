@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_strategy import backtest_strategy
+from portfolio_backtest import portfolio_summary, run_portfolio_backtest, synthetic_universe
+
+
+def single_symbol_matrices(test_df):
+    column = lambda name: test_df[name].to_numpy(dtype=np.float64)[:, None]
+    return test_df.index, ["SPY"], column("Close"), column("bullish_prob"), column("volatility_20d")
+
+
+@pytest.mark.parametrize("strategy_type", ["conservative", "aggressive", "ultra"])
+def test_single_symbol_matches_backtest_strategy(strategy_type):
+    test_df, expected = backtest_strategy(strategy_type, "SPY")
+    dates, symbols, close, prob, vol = single_symbol_matrices(test_df)
+
+    results, trades = run_portfolio_backtest(
+        dates, symbols, close, prob, vol, strategy_type, max_positions=1, position_fraction=1.0
+    )
+
+    fields = ["entry_date", "exit_date", "entry_price", "exit_price", "pnl", "bullish_prob"]
+    assert len(trades) == len(expected) > 0
+    assert [{k: t[k] for k in fields} for t in trades] == [{k: t[k] for k in fields} for t in expected]
+    # TradingStrategy books equity at exits; the portfolio marks to market,
+    # so the curves agree on every bar without an open position
+    flat = results["open_positions"].to_numpy() == 0
+    np.testing.assert_allclose(results["equity"].to_numpy()[flat], test_df["equity"].to_numpy()[flat])
+    assert flat.any()
+
+
+def test_open_positions_never_exceed_max_positions():
+    dates, symbols, close, prob, vol = synthetic_universe(n_symbols=40, years=2)
+    results, trades = run_portfolio_backtest(dates, symbols, close, prob, vol, "aggressive", max_positions=4)
+
+    assert results["open_positions"].max() == 4
+    assert (results["cash"] >= -1e-6).all()
+
+    # Recount from the trades: positions open after each bar's entries
+    entries = pd.Series(1, index=pd.DatetimeIndex([t["entry_date"] for t in trades]))
+    exits = pd.Series(-1, index=pd.DatetimeIndex([t["exit_date"] for t in trades]))
+    counted = pd.concat([entries, exits]).groupby(level=0).sum().reindex(dates, fill_value=0).cumsum()
+    from_trades = counted.to_numpy()
+    # Positions still open at the end are not in trades
+    assert (from_trades <= results["open_positions"].to_numpy()).all()
+    assert from_trades.max() == 4
+
+
+def test_zero_trades_give_null_metrics():
+    dates, symbols, close, _, vol = synthetic_universe(n_symbols=5, years=1)
+    prob = np.zeros_like(close)
+
+    results, trades = run_portfolio_backtest(dates, symbols, close, prob, vol)
+    summary = portfolio_summary(results, trades, symbols, close)
+
+    assert trades == []
+    assert summary["metrics"]["sharpe_ratio"] is None
+    assert summary["metrics"]["total_return"] == 0.0
+    assert summary["metrics"]["num_trades"] == 0
+    assert all(row["win_rate"] is None for row in summary["per_symbol"])
+
+
+def test_endpoint_returns_null_metrics_without_trades(client, monkeypatch):
+    import main
+
+    build = main.build_signal_matrices
+
+    def never_bullish(entries):
+        dates, symbols, close, prob, vol = build(entries)
+        return dates, symbols, close, np.zeros_like(prob), vol
+
+    monkeypatch.setattr(main, "build_signal_matrices", never_bullish)
+    response = client.post("/api/portfolio/backtest", json={"symbols": ["SPY", "AAPL"]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["metrics"]["sharpe_ratio"] is None
+    assert body["metrics"]["num_trades"] == 0
+    assert body["trades"] == []
+    assert len(body["equity_curve"]) > 0
@@ -0,0 +1,124 @@
+import gzip
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import response_formats
+from response_formats import (
+    ARROW_STREAM,
+    COLUMNAR,
+    JSON,
+    finite_list,
+    negotiated_response,
+    read_columnar,
+    to_arrow_ipc,
+    to_columnar,
+)
+
+COLUMNS = {
+    "date": np.array(["2021-01-04", "2021-01-05", "2021-01-06"], dtype="datetime64[ns]"),
+    "close": np.array([100.5, np.nan, 102.25]),
+    "volume": np.array([10, 20, 30], dtype=np.int64),
+    "flag": np.array([1, 0, 1], dtype=np.int8),
+}
+METADATA = {"symbol": "SPY", "sharpe_ratio": float("nan"), "nested": {"value": np.float64(np.inf)}}
+
+
+def make_request(accept="", encoding="", fmt=""):
+    return SimpleNamespace(
+        headers={"accept": accept, "accept-encoding": encoding},
+        query_params={"format": fmt} if fmt else {},
+    )
+
+
+def records(rows=3):
+    return lambda: [
+        {"date": str(d)[:10], "close": c}
+        for d, c in zip(COLUMNS["date"][:rows], finite_list(COLUMNS["close"][:rows]))
+    ]
+
+
+def test_columnar_round_trip_keeps_dtypes_nan_and_metadata():
+    columns, payload = read_columnar(to_columnar(COLUMNS, METADATA))
+
+    assert list(columns) == list(COLUMNS)
+    for name, values in COLUMNS.items():
+        assert columns[name].dtype == values.dtype
+        np.testing.assert_array_equal(columns[name], values)
+    assert payload == {"symbol": "SPY", "sharpe_ratio": None, "nested": {"value": None}}
+
+
+def test_columnar_columns_are_zero_copy_views():
+    body = to_columnar(COLUMNS)
+    columns, _ = read_columnar(body)
+    for values in columns.values():
+        assert not values.flags.owndata
+    with pytest.raises(ValueError):
+        read_columnar(b"XXXX" + body[4:])
+
+
+def test_arrow_round_trip():
+    pa = pytest.importorskip("pyarrow")
+    reader = pa.ipc.open_stream(to_arrow_ipc(COLUMNS, METADATA))
+    table = reader.read_all()
+
+    np.testing.assert_array_equal(table.column("date").to_numpy(), COLUMNS["date"])
+    np.testing.assert_array_equal(table.column("close").to_numpy(), COLUMNS["close"])
+    np.testing.assert_array_equal(table.column("volume").to_numpy(), COLUMNS["volume"])
+    assert json.loads(table.schema.metadata[b"payload"])["sharpe_ratio"] is None
+
+
+@pytest.mark.parametrize("request_kwargs, media_type", [
+    ({}, JSON),
+    ({"accept": "application/json"}, JSON),
+    ({"accept": COLUMNAR}, COLUMNAR),
+    ({"fmt": "columnar"}, COLUMNAR),
+    ({"accept": ARROW_STREAM}, ARROW_STREAM),
+    ({"fmt": "arrow"}, ARROW_STREAM),
+])
+def test_format_negotiation(request_kwargs, media_type):
+    response = negotiated_response(make_request(**request_kwargs), METADATA, "prices", COLUMNS, records())
+    assert response.media_type == media_type
+    assert response.headers["vary"] == "Accept, Accept-Encoding"
+
+    if media_type == COLUMNAR:
+        _, payload = read_columnar(response.body)
+        assert payload["table"] == "prices"
+    elif media_type == JSON:
+        body = json.loads(response.body)
+        assert body["sharpe_ratio"] is None
+        assert body["prices"][1] == {"date": "2021-01-05", "close": None}
+
+
+def test_arrow_falls_back_to_columnar_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(response_formats, "pa", None)
+    response = negotiated_response(make_request(fmt="arrow"), {}, "prices", COLUMNS, records())
+    assert response.media_type == COLUMNAR
+
+
+def test_only_large_json_is_compressed():
+    many = {name: np.resize(values, 2000) for name, values in COLUMNS.items()}
+    big_records = lambda: [{"close": c} for c in finite_list(many["close"])]
+
+    small = negotiated_response(make_request(encoding="gzip"), {}, "prices", COLUMNS, records())
+    assert "content-encoding" not in small.headers
+
+    big = negotiated_response(make_request(encoding="gzip, deflate"), {}, "prices", many, big_records)
+    assert big.headers["content-encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(big.body))["prices"]) == 2000
+
+    brotli = pytest.importorskip("brotli")
+    big = negotiated_response(make_request(encoding="br;q=1.0, gzip"), {}, "prices", many, big_records)
+    assert big.headers["content-encoding"] == "br"
+    assert len(json.loads(brotli.decompress(big.body))["prices"]) == 2000
+
+    binary = negotiated_response(make_request(accept=COLUMNAR, encoding="br, gzip"), {}, "prices", many, big_records)
+    assert "content-encoding" not in binary.headers
+    assert len(read_columnar(binary.body)[0]["close"]) == 2000
+
+
+def test_finite_list_replaces_only_non_finite_floats():
+    assert finite_list(np.array([1.5, np.nan, -np.inf])) == [1.5, None, None]
+    assert finite_list(np.array([1, 2], dtype=np.int64)) == [1, 2]
@@ -0,0 +1,102 @@
+import math
+
+import pytest
+
+from run_store import RUN_COMPLETE, RUN_FAILED, RUN_RUNNING, RunStore
+
+
+def make_trade(day, pnl):
+    return {
+        "entry_date": f"2021-01-{day:02d}T00:00:00",
+        "exit_date": f"2021-01-{day + 5:02d}T00:00:00",
+        "entry_price": 100.0,
+        "exit_price": 100.0 * (1 + pnl),
+        "pnl": pnl,
+        "bullish_prob": 0.7,
+        "features": {"rsi": 50.0 + day, "regime_stress": day % 2},
+    }
+
+
+EQUITY = [
+    {"date": "2021-01-01T00:00:00", "equity": 10_000.0, "buy_hold": 10_000.0},
+    {"date": "2021-01-04T00:00:00", "equity": 10_100.0, "buy_hold": 10_050.0},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RunStore(str(tmp_path / "runs.sqlite3"))
+
+
+def save(store, symbol="SPY", strategy="conservative", trades=(), sharpe=1.0, run_date="2021-02-01T00:00:00"):
+    return store.save_run(
+        symbol, strategy,
+        {"total_return": 0.01, "sharpe_ratio": sharpe},
+        {"total_return": 0.005},
+        EQUITY, list(trades),
+        winning_trades=sum(t["pnl"] > 0 for t in trades),
+        losing_trades=sum(t["pnl"] <= 0 for t in trades),
+        run_date=run_date,
+    )
+
+
+def test_saved_run_round_trips(store):
+    trades = [make_trade(4, 0.02), make_trade(11, -0.01)]
+    run_id = save(store, symbol="nvda", trades=trades)
+
+    run = store.get_run(run_id)
+    assert run["symbol"] == "NVDA"
+    assert run["status"] == RUN_COMPLETE
+    assert (run["num_trades"], run["winning_trades"], run["losing_trades"]) == (2, 1, 1)
+    assert run["metrics"] == {"total_return": 0.01, "sharpe_ratio": 1.0}
+    assert run["equity_curve"] == EQUITY
+    assert [{k: v for k, v in t.items() if k != "trade_index"} for t in run["trades"]] == trades
+
+    in_range = store.get_trades(run_id, start="2021-01-10", end="2021-01-31")
+    assert [t["trade_index"] for t in in_range] == [1]
+    assert store.get_run(run_id + 1) is None
+
+
+def test_list_runs_filters_and_orders_newest_first(store):
+    first = save(store, "SPY", "conservative", run_date="2021-02-01T00:00:00")
+    second = save(store, "SPY", "aggressive", run_date="2021-03-01T00:00:00")
+    third = save(store, "QQQ", "conservative", run_date="2021-04-01T00:00:00")
+
+    assert [r["run_id"] for r in store.list_runs()] == [third, second, first]
+    assert [r["run_id"] for r in store.list_runs(symbol="spy")] == [second, first]
+    assert [r["run_id"] for r in store.list_runs(strategy="conservative", since="2021-03-01")] == [third]
+    assert [r["run_id"] for r in store.list_runs(limit=1)] == [third]
+    assert store.list_runs()[0]["metrics"]["sharpe_ratio"] == 1.0
+
+
+def test_diff_runs_compares_metrics_and_trades(store):
+    a = save(store, trades=[make_trade(4, 0.02), make_trade(11, -0.01)], sharpe=1.0)
+    b = save(store, trades=[make_trade(11, -0.01), make_trade(18, 0.03)], sharpe=math.nan)
+
+    diff = store.diff_runs(a, b)
+    assert diff["metrics"]["total_return"]["delta"] == 0.0
+    # NaN is stored as NULL, so there is no delta rather than a NaN one
+    assert diff["metrics"]["sharpe_ratio"] == {"a": 1.0, "b": None, "delta": None}
+    assert diff["trades"]["common_entries"] == 1
+    assert diff["trades"]["only_in_a"] == ["2021-01-04T00:00:00"]
+    assert diff["trades"]["only_in_b"] == ["2021-01-18T00:00:00"]
+    assert store.diff_runs(a, b + 1) is None
+
+
+def test_chunked_runs_report_status(store):
+    done = store.start_run("SPY", "intraday")
+    store.append_equity(done, [("2021-01-01T09:30:00", 10_000.0, None)])
+    store.append_trades(done, [make_trade(4, 0.02)], start_index=0)
+    assert store.run_status(done) == RUN_RUNNING
+    store.finish_run(done, {"total_return": 0.02}, {}, 1, 1, 0)
+
+    failed = store.start_run("SPY", "intraday")
+    store.append_trades(failed, [make_trade(5, 0.01)], start_index=0)
+    store.fail_run(failed)
+
+    assert store.run_status(done) == RUN_COMPLETE
+    assert store.run_status(failed) == RUN_FAILED
+    assert [r["run_id"] for r in store.list_runs(status=RUN_COMPLETE)] == [done]
+    # Only complete runs feed cross-run queries
+    assert {t["run_id"] for t in store.all_trades()} == {done}
+    assert store.completed_runs_version() == (1, done)
@@ -0,0 +1,127 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from shared_cache import SharedArrayStore, frame_from_arrays, frame_to_arrays
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SharedArrayStore(root=str(tmp_path), ttl=None)
+
+
+def versions(store, namespace, key):
+    return [entry for entry in os.listdir(os.path.join(store.root, namespace))
+            if entry.startswith(f"{key}@")]
+
+
+def test_entries_attach_read_only_and_zero_copy(store):
+    values = np.arange(12, dtype=np.float32).reshape(3, 4)
+    store.publish("models", "AAPL", {"weights": values}, {"horizon": 5})
+
+    arrays, meta = store.get("models", "AAPL")
+    weights = arrays["weights"]
+
+    assert isinstance(weights, np.memmap)
+    assert not weights.flags.writeable
+    with pytest.raises(ValueError):
+        weights[0, 0] = 1.0
+    np.testing.assert_array_equal(weights, values)
+    assert weights.dtype == np.float32
+    assert meta["horizon"] == 5 and "created" in meta
+
+    # Another attach maps the same file rather than copying it
+    other, _ = store.get("models", "AAPL")
+    assert other["weights"].filename == weights.filename
+    assert store.get("models", "MSFT") is None
+
+
+def test_republish_swaps_the_pointer_and_removes_the_old_version(store):
+    store.publish("models", "AAPL", {"weights": np.zeros(4)})
+    old, _ = store.get("models", "AAPL")
+    store.publish("models", "AAPL", {"weights": np.ones(4)})
+
+    new, _ = store.get("models", "AAPL")
+    np.testing.assert_array_equal(new["weights"], np.ones(4))
+    assert len(versions(store, "models", "AAPL")) == 1
+    assert not os.path.exists(os.path.dirname(old["weights"].filename))
+    # A reader still mapping the removed version keeps its pages
+    np.testing.assert_array_equal(old["weights"], np.zeros(4))
+    assert not [entry for entry in os.listdir(os.path.join(store.root, "models")) if ".json." in entry]
+
+
+def test_readers_never_see_a_partial_entry_while_publishing(store):
+    # Every published entry holds two arrays filled with its own version number,
+    # so a mixed or half-written attach would show different values.
+    store.publish("models", "AAPL", {"a": np.zeros(1000), "b": np.zeros(1000)})
+    done = threading.Event()
+    seen, errors = [[] for _ in range(4)], []
+
+    def read(history):
+        while not done.is_set():
+            try:
+                entry = store.get("models", "AAPL")
+                if entry is None:
+                    # Pointer read just before its version was removed
+                    continue
+                arrays, _ = entry
+                a, b = np.array(arrays["a"]), np.array(arrays["b"])
+                if not (np.all(a == a[0]) and np.all(b == a[0])):
+                    errors.append((a[0], b[0]))
+                history.append(a[0])
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=read, args=(history,)) for history in seen]
+    for reader in readers:
+        reader.start()
+    for version in range(1, 60):
+        filled = np.full(1000, float(version))
+        store.publish("models", "AAPL", {"a": filled, "b": filled})
+    done.set()
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+    # The pointer only moves forward, so no reader ever goes back a version
+    assert all(history == sorted(history) for history in seen)
+    assert sum(len(history) for history in seen) > 0
+    arrays, _ = store.get("models", "AAPL")
+    assert arrays["a"][0] == 59.0
+    assert len(versions(store, "models", "AAPL")) == 1
+
+
+def test_get_or_create_builds_once(store):
+    calls = []
+
+    def build():
+        calls.append(1)
+        return {"values": np.arange(5)}, {"source": "test"}
+
+    first, meta = store.get_or_create("datasets", "AAPL", build)
+    second, _ = store.get_or_create("datasets", "AAPL", build)
+
+    assert calls == [1]
+    assert meta["source"] == "test"
+    np.testing.assert_array_equal(first["values"], second["values"])
+
+
+def test_expired_entries_are_not_attached(tmp_path):
+    store = SharedArrayStore(root=str(tmp_path), ttl=0)
+    store.publish("models", "AAPL", {"weights": np.zeros(2)})
+    assert store.get("models", "AAPL") is None
+    assert not store.is_fresh(0)
+
+
+def test_frames_round_trip_over_memmaps(store):
+    index = pd.date_range("2024-01-01", periods=6, freq="D", name="Date")
+    df = pd.DataFrame({"close": np.linspace(1, 2, 6), "volume": np.arange(6.0)}, index=index)
+
+    store.publish("datasets", "AAPL", *frame_to_arrays(df))
+    restored = frame_from_arrays(*store.get("datasets", "AAPL"))
+
+    pd.testing.assert_frame_equal(restored, df, check_freq=False)
+    assert not restored["close"].to_numpy().flags.writeable
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_builder import FEATURE_COLUMNS
+from trade_index import TradeSimilarityIndex, TradeTable
+
+
+def random_trades(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    entries = pd.bdate_range("2020-01-01", periods=n)
+    trades = []
+    for i, entry in enumerate(entries):
+        features = {name: float(value) for name, value in zip(FEATURE_COLUMNS, rng.normal(size=len(FEATURE_COLUMNS)))}
+        features["regime_stress"] = int(rng.integers(0, 2))
+        trades.append({
+            "entry_date": entry,
+            "exit_date": entry + pd.Timedelta(days=int(rng.integers(1, 20))),
+            "entry_price": float(rng.uniform(50, 150)),
+            "exit_price": float(rng.uniform(50, 150)),
+            "pnl": float(rng.normal(0, 0.05)),
+            "bullish_prob": float(rng.uniform(0.4, 0.8)),
+            "features": features,
+        })
+    return trades
+
+
+def value(trade, column):
+    return trade[column] if column in TradeTable.BASE_COLUMNS else trade["features"][column]
+
+
+def sorted_positions(trades, sort_by, descending=False, filters=None):
+    """
+    Reference: filter and sort the trade list directly. Descending is the
+    reverse of the stable ascending order, so ties come out last-first.
+    """
+    positions = [
+        i for i, trade in enumerate(trades)
+        if all(
+            (low is None or value(trade, column) >= low) and (high is None or value(trade, column) <= high)
+            for column, (low, high) in (filters or {}).items()
+        )
+    ]
+    positions.sort(key=lambda i: value(trades[i], sort_by))
+    return positions[::-1] if descending else positions
+
+
+TRADES = random_trades()
+TABLE = TradeTable(TRADES)
+
+
+@pytest.mark.parametrize("sort_by", ["pnl", "entry_date", "exit_price", "bullish_prob", "rsi"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_sorting_matches_list_sort(sort_by, descending):
+    total, page = TABLE.query(sort_by=sort_by, descending=descending, offset=0, limit=len(TRADES))
+
+    assert total == len(TRADES)
+    assert page.tolist() == sorted_positions(TRADES, sort_by, descending)
+
+
+@pytest.mark.parametrize("filters", [
+    {"pnl": (0.0, None)},
+    {"pnl": (-0.02, 0.02), "rsi": (None, 0.5)},
+    {"entry_date": (pd.Timestamp("2020-03-01"), pd.Timestamp("2020-06-30")), "bullish_prob": (0.5, 0.7)},
+    {"regime_stress": (1, 1), "atr": (-1.0, 1.0)},
+])
+@pytest.mark.parametrize("sort_by", ["pnl", "exit_date"])
+def test_filtered_pages_match_list_sort(filters, sort_by):
+    expected = sorted_positions(TRADES, sort_by, descending=True, filters=filters)
+
+    total, first = TABLE.query(sort_by=sort_by, descending=True, filters=filters, offset=0, limit=10)
+    _, second = TABLE.query(sort_by=sort_by, descending=True, filters=filters, offset=10, limit=10)
+
+    assert total == len(expected)
+    assert first.tolist() + second.tolist() == expected[:20]
+
+
+def test_unknown_columns_are_rejected():
+    with pytest.raises(ValueError):
+        TABLE.query(sort_by="nope")
+    with pytest.raises(ValueError):
+        TABLE.query(filters={"nope": (0, 1)})
+
+
+def brute_force_neighbours(index, vector, side, k, exclude=None):
+    """Reference: distance to every trade on one side, sorted."""
+    positions = [p for p in index.positions[side].tolist() if p != exclude]
+    distances = np.linalg.norm(index.vectors[positions] - vector, axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    return [positions[i] for i in order], distances[order]
+
+
+SIMILARITY = TradeSimilarityIndex(TRADES, refs=[f"t{i}" for i in range(len(TRADES))])
+
+
+@pytest.mark.parametrize("k", [1, 5, 500])
+def test_similarity_query_matches_brute_force(k):
+    rng = np.random.default_rng(1)
+    for _ in range(10):
+        features = dict(zip(FEATURE_COLUMNS, rng.normal(size=len(FEATURE_COLUMNS)).tolist()))
+        result = SIMILARITY.query(features, k=k)
+
+        for side in ("winning", "losing"):
+            positions, distances = brute_force_neighbours(SIMILARITY, SIMILARITY.standardize(features), side, k)
+            assert [m["position"] for m in result[side]] == positions
+            assert [m["ref"] for m in result[side]] == [f"t{p}" for p in positions]
+            np.testing.assert_allclose([m["distance"] for m in result[side]], distances)
+
+
+def test_query_position_excludes_the_trade_itself():
+    for position in (0, 17, len(TRADES) - 1):
+        result = SIMILARITY.query_position(position, k=5)
+        for side in ("winning", "losing"):
+            expected, _ = brute_force_neighbours(
+                SIMILARITY, SIMILARITY.vectors[position], side, 5, exclude=position
+            )
+            assert [m["position"] for m in result[side]] == expected
+
+
+def test_closest_pair_matches_brute_force():
+    winners = SIMILARITY.positions["winning"]
+    losers = SIMILARITY.positions["losing"]
+    distances = np.linalg.norm(
+        SIMILARITY.vectors[winners][:, None, :] - SIMILARITY.vectors[losers][None, :, :], axis=2
+    )
+    w, l = np.unravel_index(np.argmin(distances), distances.shape)
+
+    assert SIMILARITY.closest_pair() == (int(winners[w]), int(losers[l]))
+    assert TradeSimilarityIndex([t for t in TRADES if t["pnl"] > 0]).closest_pair() is None
+
+
+def test_similar_trades_of_unknown_run_is_404(client):
+    response = client.get("/api/trades/similar", params={"run_id": 10**9, "trade_index": 0})
+    assert response.status_code == 404
@@ -0,0 +1,226 @@
+import numpy as np
+from sklearn.neighbors import KDTree
+
+from dataset_builder import FEATURE_COLUMNS
+
+
+class TradeSimilarityIndex:
+    """
+    Nearest-neighbour lookup over trade entry features.
+
+    Feature vectors are standardized (z-scores over all indexed trades) so
+    RSI does not dominate ratios, and winners and losers get separate
+    KD-trees: a query returns the k closest of each without filtering.
+    Build is O(n log n); a single query is O(log n) on average.
+    """
+
+    def __init__(self, trades, refs=None, leaf_size=40):
+        """
+        Args:
+            trades: Trades with "features" and "pnl" (backtest or RunStore format)
+            refs: Optional identifiers returned instead of positions (same length as trades)
+        """
+        self.trades = trades
+        self.refs = refs if refs is not None else list(range(len(trades)))
+        self.ref_positions = {ref: i for i, ref in enumerate(self.refs)}
+
+        X = np.array(
+            [[t["features"].get(name, 0.0) for name in FEATURE_COLUMNS] for t in trades],
+            dtype=np.float64,
+        ).reshape(len(trades), len(FEATURE_COLUMNS))
+
+        self.mean = X.mean(axis=0) if len(trades) else np.zeros(len(FEATURE_COLUMNS))
+        std = X.std(axis=0) if len(trades) else np.ones(len(FEATURE_COLUMNS))
+        self.std = np.where(std == 0, 1.0, std)
+        self.vectors = (X - self.mean) / self.std
+
+        pnl = np.array([t["pnl"] for t in trades], dtype=np.float64)
+        self.positions = {
+            "winning": np.flatnonzero(pnl > 0),
+            "losing": np.flatnonzero(pnl <= 0),
+        }
+        self.trees = {
+            side: KDTree(self.vectors[pos], leaf_size=leaf_size) if len(pos) else None
+            for side, pos in self.positions.items()
+        }
+
+    def __len__(self):
+        return len(self.trades)
+
+    def standardize(self, features):
+        """Z-score a features dict (or FEATURE_COLUMNS-ordered array)."""
+        if isinstance(features, dict):
+            features = [features.get(name, 0.0) for name in FEATURE_COLUMNS]
+        return (np.asarray(features, dtype=np.float64) - self.mean) / self.std
+
+    def _query_side(self, side, vector, k, exclude):
+        tree = self.trees[side]
+        if tree is None:
+            return []
+
+        positions = self.positions[side]
+        # Ask for one extra so the query trade itself can be skipped
+        n = min(k + (1 if exclude is not None else 0), len(positions))
+        distances, idx = tree.query(vector.reshape(1, -1), k=n)
+
+        matches = []
+        for distance, i in zip(distances[0], idx[0]):
+            position = int(positions[i])
+            if position == exclude:
+                continue
+            matches.append({
+                "ref": self.refs[position],
+                "position": position,
+                "distance": float(distance),
+            })
+        return matches[:k]
+
+    def query(self, features, k=5, exclude=None):
+        """
+        k most similar winning and losing trades.
+
+        Args:
+            features: Entry features of the query trade
+            k: Neighbours per side
+            exclude: Position of the query trade in this index, if it is indexed
+        """
+        vector = self.standardize(features)
+        return {
+            "winning": self._query_side("winning", vector, k, exclude),
+            "losing": self._query_side("losing", vector, k, exclude),
+        }
+
+    def query_position(self, position, k=5):
+        """Neighbours of an indexed trade, excluding the trade itself."""
+        return self.query(self.vectors[position] * self.std + self.mean, k=k, exclude=position)
+
+    def closest_pair(self):
+        """
+        (winning_position, losing_position) of the most similar win/loss
+        pair, found with one batched query of every winner against the
+        losers' tree. None if either side is empty.
+        """
+        winners = self.positions["winning"]
+        tree = self.trees["losing"]
+        if tree is None or not len(winners):
+            return None
+
+        distances, idx = tree.query(self.vectors[winners], k=1)
+        best = int(np.argmin(distances[:, 0]))
+        return int(winners[best]), int(self.positions["losing"][idx[best, 0]])
+
+
+class TradeTable:
+    """
+    Column store of a run's trades with one precomputed sort order per
+    column, for paginated / sorted / range-filtered queries.
+
+    Sorting, or filtering on the sort column, is a searchsorted on the
+    precomputed order: O(log n + page size). Extra range filters narrow
+    the candidate set starting from the most selective one.
+    """
+
+    BASE_COLUMNS = ["entry_date", "exit_date", "entry_price", "exit_price", "pnl", "bullish_prob"]
+
+    def __init__(self, trades):
+        self.trades = trades
+        self.columns = {
+            "entry_date": np.array([t["entry_date"] for t in trades], dtype="datetime64[ns]"),
+            "exit_date": np.array([t["exit_date"] for t in trades], dtype="datetime64[ns]"),
+        }
+        for name in ("entry_price", "exit_price", "pnl", "bullish_prob"):
+            self.columns[name] = np.array([t[name] for t in trades], dtype=np.float64)
+        for name in FEATURE_COLUMNS:
+            self.columns[name] = np.array(
+                [t["features"].get(name, np.nan) for t in trades], dtype=np.float64
+            )
+
+        # Stable argsort per column, plus the column values in that order
+        self.order = {
+            name: np.argsort(values, kind="stable") for name, values in self.columns.items()
+        }
+        self.sorted_values = {
+            name: self.columns[name][order] for name, order in self.order.items()
+        }
+        self.rank = {}
+        for name, order in self.order.items():
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            self.rank[name] = rank
+
+    def __len__(self):
+        return len(self.trades)
+
+    def _coerce(self, column, value):
+        if column in ("entry_date", "exit_date"):
+            return np.datetime64(value, "ns")
+        return float(value)
+
+    def _range_positions(self, column, low, high):
+        """(start, stop) slice of order[column] whose values fall in [low, high]."""
+        values = self.sorted_values[column]
+        start = 0 if low is None else int(np.searchsorted(values, self._coerce(column, low), side="left"))
+        stop = len(values) if high is None else int(np.searchsorted(values, self._coerce(column, high), side="right"))
+        return start, max(start, stop)
+
+    def query(self, sort_by="entry_date", descending=False, filters=None, offset=0, limit=50):
+        """
+        Args:
+            sort_by: Any column (entry_date, pnl, bullish_prob, a feature, ...)
+            descending: Sort direction (the reverse of the ascending order, ties included)
+            filters: {column: (low, high)}, either bound may be None
+            offset, limit: Page window
+
+        Returns (total_matching, trade positions for the page).
+        """
+        if sort_by not in self.columns:
+            raise ValueError(f"Unknown sort column: {sort_by}")
+        filters = {k: v for k, v in (filters or {}).items() if v != (None, None)}
+        for column in filters:
+            if column not in self.columns:
+                raise ValueError(f"Unknown filter column: {column}")
+
+        order = self.order[sort_by]
+
+        # Range on the sort column itself is a contiguous slice of its order
+        start, stop = 0, len(order)
+        if sort_by in filters:
+            start, stop = self._range_positions(sort_by, *filters.pop(sort_by))
+
+        if not filters:
+            total = stop - start
+            if descending:
+                lo = max(stop - offset - limit, start)
+                hi = max(stop - offset, start)
+                page = order[lo:hi][::-1]
+            else:
+                page = order[start + offset:min(start + offset + limit, stop)]
+            return total, page
+
+        # Start from the narrowest other filter, then mask the rest
+        ranges = {c: self._range_positions(c, *bounds) for c, bounds in filters.items()}
+        narrowest = min(ranges, key=lambda c: ranges[c][1] - ranges[c][0])
+        lo, hi = ranges.pop(narrowest)
+        candidates = self.order[narrowest][lo:hi]
+
+        mask = np.ones(len(candidates), dtype=bool)
+        for column, bounds in filters.items():
+            if column == narrowest:
+                continue
+            values = self.columns[column][candidates]
+            low, high = bounds
+            if low is not None:
+                mask &= values >= self._coerce(column, low)
+            if high is not None:
+                mask &= values <= self._coerce(column, high)
+        candidates = candidates[mask]
+
+        # Keep only candidates inside the sort-column slice, in sort order
+        candidate_ranks = self.rank[sort_by][candidates]
+        candidate_ranks = candidate_ranks[(candidate_ranks >= start) & (candidate_ranks < stop)]
+        candidate_ranks.sort()
+        if descending:
+            candidate_ranks = candidate_ranks[::-1]
+
+        total = len(candidate_ranks)
+        return total, order[candidate_ranks[offset:offset + limit]]
@@ -1,26 +1,34 @@
+import hashlib
+
+import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report, roc_auc_score
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 
-from dataset_builder import build_dataset
+from dataset_builder import (
+    build_dataset,
+    horizon_columns,
+    CompactDataset,
+    FEATURE_COLUMNS,
+    HORIZONS,
+)
 
 
-FEATURE_COLUMNS = [
-    "return_5d",
-    "return_20d",
-    "ma_ratio",
-    "trend_slope_20d",
-    "rsi",
-    "atr",
-    "volatility_20d",
-    "regime_stress",
-    "relative_strength_spy",
-]
+TARGET_COLUMN = "target_trend"
 
+# Train on everything before this date, evaluate/backtest on the rest
+TEST_START = "2020-01-01"
 
-TARGET_COLUMN = "target_trend"
+
+def make_trend_pipeline():
+    """Unfitted scaling + logistic regression pipeline used for every model."""
+    return Pipeline([
+        ("scaler", StandardScaler()),
+        ("clf", LogisticRegression(max_iter=1000))
+    ])
 
 
 def train_trend_model(symbol="SPY", df=None):
@@ -29,14 +37,16 @@ def train_trend_model(symbol="SPY", df=None):
 
     Args:
         symbol: Stock ticker (default: SPY)
-        df: Pre-built dataset (optional, avoids redundant yfinance downloads)
+        df: Pre-built dataset or CompactDataset (optional, avoids redundant yfinance downloads)
     """
     if df is None:
         df = build_dataset(symbol)
+    elif isinstance(df, CompactDataset):
+        df = df.to_frame()
 
     # Time-based split
-    train_df = df[df.index < "2020-01-01"]
-    test_df = df[df.index >= "2020-01-01"]
+    train_df = df[df.index < TEST_START]
+    test_df = df[df.index >= TEST_START]
 
     X_train = train_df[FEATURE_COLUMNS]
     y_train = train_df[TARGET_COLUMN]
@@ -45,10 +55,7 @@ def train_trend_model(symbol="SPY", df=None):
     y_test = test_df[TARGET_COLUMN]
 
     # Pipeline = scaling + model
-    model = Pipeline([
-        ("scaler", StandardScaler()),
-        ("clf", LogisticRegression(max_iter=1000))
-    ])
+    model = make_trend_pipeline()
 
     model.fit(X_train, y_train)
 
@@ -63,5 +70,134 @@ def train_trend_model(symbol="SPY", df=None):
     return model
 
 
+def train_horizon_models(symbol="SPY", df=None, horizons=HORIZONS, n_jobs=-1):
+    """
+    Train one trend model per prediction horizon in a single pass.
+
+    The scaler is fitted once on the training rows and the whole feature
+    matrix is scaled once; every horizon's logistic regression is then fit
+    on that shared matrix, in parallel threads. Each returned pipeline
+    behaves exactly like train_trend_model's for the same horizon.
+
+    Args:
+        symbol: Stock ticker (default: SPY)
+        df: Frame from build_dataset(symbol, horizons=horizons) (optional)
+        horizons: Horizons in bars
+        n_jobs: joblib threads for the per-horizon fits (-1 = every core)
+
+    Returns:
+        {horizon: fitted pipeline}
+    """
+    if df is None:
+        df = build_dataset(symbol, horizons=horizons)
+
+    train_mask = df.index < TEST_START
+    X = df[FEATURE_COLUMNS]
+
+    scaler = StandardScaler().fit(X[train_mask])
+    X_scaled = scaler.transform(X)
+
+    def fit(horizon):
+        future_col, target_col, _, _ = horizon_columns(horizon)
+        # Longer horizons have no target yet for the newest rows
+        known = df[future_col].notna().to_numpy()
+        y = df[target_col].to_numpy()
+
+        train = train_mask & known
+        test = ~train_mask & known
+        clf = LogisticRegression(max_iter=1000).fit(X_scaled[train], y[train])
+        auc = roc_auc_score(y[test], clf.predict_proba(X_scaled[test])[:, 1])
+        return clf, auc
+
+    # lbfgs releases the GIL in its NumPy/SciPy kernels, so threads overlap
+    # and the scaled matrix is shared rather than pickled to processes
+    fitted = Parallel(n_jobs=n_jobs, prefer="threads")(delayed(fit)(h) for h in horizons)
+
+    print(f"\n=== HORIZON MODELS FOR {symbol} ===")
+    models = {}
+    for horizon, (clf, auc) in zip(horizons, fitted):
+        print(f"{horizon}d ROC AUC: {auc:.4f}")
+        models[horizon] = Pipeline([("scaler", scaler), ("clf", clf)])
+
+    return models
+
+
+def extract_linear_params(model):
+    """
+    Fold the fitted scaler into the logistic coefficients so inference is
+    one dot product: logit = X @ weights + bias.
+    """
+    scaler = model.named_steps["scaler"]
+    clf = model.named_steps["clf"]
+
+    scale = np.where(scaler.scale_ == 0, 1.0, scaler.scale_)
+    weights = clf.coef_[0] / scale
+    bias = clf.intercept_[0] - np.dot(weights, scaler.mean_)
+
+    return {
+        "weights": weights.astype(np.float64),
+        "bias": float(bias),
+    }
+
+
+def model_to_arrays(model):
+    """Fitted scaler + logistic parameters as plain arrays (for shared_cache)."""
+    scaler = model.named_steps["scaler"]
+    clf = model.named_steps["clf"]
+    return {
+        "scaler_mean": scaler.mean_,
+        "scaler_var": scaler.var_,
+        "scaler_scale": scaler.scale_,
+        "n_samples_seen": np.asarray(scaler.n_samples_seen_),
+        "coef": clf.coef_,
+        "intercept": clf.intercept_,
+        "classes": clf.classes_,
+    }
+
+
+def model_from_arrays(arrays):
+    """
+    Rebuild a fitted pipeline from model_to_arrays output without training.
+    predict_proba matches the original model exactly.
+    """
+    model = make_trend_pipeline()
+    scaler = model.named_steps["scaler"]
+    clf = model.named_steps["clf"]
+    feature_names = np.asarray(FEATURE_COLUMNS, dtype=object)
+
+    scaler.mean_ = np.array(arrays["scaler_mean"])
+    scaler.var_ = np.array(arrays["scaler_var"])
+    scaler.scale_ = np.array(arrays["scaler_scale"])
+    scaler.n_samples_seen_ = np.array(arrays["n_samples_seen"]).item()
+    scaler.n_features_in_ = len(FEATURE_COLUMNS)
+    scaler.feature_names_in_ = feature_names
+
+    clf.coef_ = np.array(arrays["coef"])
+    clf.intercept_ = np.array(arrays["intercept"])
+    clf.classes_ = np.array(arrays["classes"])
+    clf.n_features_in_ = len(FEATURE_COLUMNS)
+    clf.n_iter_ = np.zeros(1, dtype=np.int32)
+    return model
+
+
+def model_version(model):
+    """Short fingerprint of the fitted parameters, used as a cache key."""
+    params = extract_linear_params(model)
+    digest = hashlib.sha1(params["weights"].tobytes())
+    digest.update(np.float64(params["bias"]).tobytes())
+    return digest.hexdigest()[:12]
+
+
+def predict_bullish_prob(params, X):
+    """
+    Bullish probability from extract_linear_params output.
+
+    X may be a single feature row (1-D) or a matrix of rows (2-D), with
+    columns in FEATURE_COLUMNS order. Skips sklearn's input validation.
+    """
+    logit = np.asarray(X, dtype=np.float64) @ params["weights"] + params["bias"]
+    return 1.0 / (1.0 + np.exp(-logit))
+
+
 if __name__ == "__main__":
     train_trend_model()
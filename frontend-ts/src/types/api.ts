@@ -62,10 +62,36 @@ export interface FeatureImportance {
   name: string;
   coefficient: number;
   abs_importance: number;
+  permutation_importance: number;
+  permutation_std: number;
 }
 
 export interface FeatureImportanceResponse {
   features: FeatureImportance[];
+  symbol: string;
+  model_version: string;
+}
+
+export interface DatasetPreviewRow {
+  date: string;
+  close: number | null;
+  return_5d: number | null;
+  return_20d: number | null;
+  ma_ratio: number | null;
+  rsi: number | null;
+  volatility_20d: number | null;
+}
+
+export interface DatasetPreviewResponse {
+  // Full-dataset size and range; null when served from the trailing window
+  total_rows: number | null;
+  date_range: {
+    start: string;
+    end: string;
+  } | null;
+  symbol: string;
+  source: 'cache' | 'tail';
+  data: DatasetPreviewRow[];
 }
 
 export type TabType = 'overview' | 'trades' | 'features' | 'education';